@@ -0,0 +1,169 @@
+"""
+Client-side admission control for Claude calls.
+
+Every model call (main reply and background summarizer) passes through one
+AdmissionController per instance before it reaches Vertex:
+
+- a concurrency semaphore caps in-flight calls,
+- a token bucket caps estimated input+output tokens per minute,
+- callers that can't start at once wait in a bounded queue with a deadline.
+
+When the queue is already full, or the deadline passes while waiting, the
+caller gets OverloadedError right away instead of adding to a 429 storm.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ---------------- Admission Config ----------------
+CLAUDE_MAX_CONCURRENCY = int(os.environ.get("CLAUDE_MAX_CONCURRENCY", "8"))
+CLAUDE_TOKENS_PER_MINUTE = float(os.environ.get("CLAUDE_TOKENS_PER_MINUTE", "400000"))
+CLAUDE_MAX_QUEUE = int(os.environ.get("CLAUDE_MAX_QUEUE", "32"))
+CLAUDE_QUEUE_TIMEOUT = float(os.environ.get("CLAUDE_QUEUE_TIMEOUT", "10"))  # seconds
+
+
+class OverloadedError(Exception):
+    """The call was not admitted: queue full, or its queue deadline passed."""
+
+    def __init__(self, reason, retry_after=1.0):
+        super().__init__(f"model calls overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills at `rate_per_minute`, holds up to `capacity` tokens (one minute's worth by default)."""
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, tokens):
+        """Take `tokens` now if available; else return the seconds until they would be."""
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def adjust(self, tokens):
+        """Charge (positive) or refund (negative) tokens after the fact; may go negative."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - tokens)
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class Ticket:
+    """An admitted call. release() is idempotent."""
+
+    def __init__(self, controller, estimated_tokens, queue_latency):
+        self.controller = controller
+        self.estimated_tokens = estimated_tokens
+        self.queue_latency = queue_latency
+        self._released = False
+        self._lock = threading.Lock()
+
+    def settle(self, actual_tokens):
+        """Correct the token bucket with the call's real usage."""
+        if actual_tokens:
+            self.controller.bucket.adjust(actual_tokens - self.estimated_tokens)
+            self.estimated_tokens = actual_tokens
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.controller._semaphore.release()
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency=CLAUDE_MAX_CONCURRENCY, tokens_per_minute=CLAUDE_TOKENS_PER_MINUTE,
+                 max_queue=CLAUDE_MAX_QUEUE, queue_timeout=CLAUDE_QUEUE_TIMEOUT, clock=time.monotonic):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(tokens_per_minute, clock=clock)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self, estimated_tokens, timeout=None):
+        """
+        Wait for a concurrency slot and `estimated_tokens` of budget. Returns a
+        Ticket (with its queue_latency); raises OverloadedError if the queue
+        is full or `timeout` (default queue_timeout) passes first.
+        """
+        start = time.monotonic()
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise OverloadedError("queue_full")
+                self._waiting += 1
+            try:
+                got_slot = self._semaphore.acquire(timeout=max(deadline - time.monotonic(), 0))
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not got_slot:
+                with self._lock:
+                    self.rejected += 1
+                raise OverloadedError("queue_timeout")
+
+        while True:
+            wait = self.bucket.try_take(estimated_tokens)
+            if not wait:
+                break
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                self._semaphore.release()
+                with self._lock:
+                    self.rejected += 1
+                raise OverloadedError("token_rate", retry_after=round(wait, 1))
+            time.sleep(min(wait, remaining))
+
+        with self._lock:
+            self.admitted += 1
+        return Ticket(self, estimated_tokens, round(time.monotonic() - start, 3))
+
+    @contextmanager
+    def admit(self, estimated_tokens, metrics=None):
+        """acquire() as a context manager; adds queue_latency to `metrics`."""
+        ticket = self.acquire(estimated_tokens)
+        if metrics is not None:
+            metrics["queue_latency"] = ticket.queue_latency
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "waiting": self._waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "tokens_available": round(self.bucket.available),
+            }
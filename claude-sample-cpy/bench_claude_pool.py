@@ -0,0 +1,130 @@
+"""
+Benchmark: multi-region ClaudeRegionPool vs. a single-region client.
+
+Starts one local HTTP stand-in for the Vertex `rawPredict` endpoint per
+region, each with its own latency and 429 rate, and routes the same request
+stream through the pool. Prints which regions served the traffic, how often
+the pool failed over, and the failure rate a single-region client would have
+seen against the first (throttled) region.
+
+Usage:
+    python bench_claude_pool.py [--requests 200] [--hedging]
+                                [--region us-east5:0.10:0.4 ...]
+
+Each --region is name:latency_seconds:throttle_rate.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from anthropic import AnthropicVertex
+
+from claude_pool import ClaudeRegionPool
+
+MESSAGE_RESPONSE = json.dumps({
+    "id": "msg_stub",
+    "type": "message",
+    "role": "assistant",
+    "model": "stub",
+    "content": [{"type": "text", "text": "Esthetics Part Time Evening runs Monday-Thursday."}],
+    "stop_reason": "end_turn",
+    "stop_sequence": None,
+    "usage": {"input_tokens": 1200, "output_tokens": 40},
+}).encode("utf-8")
+THROTTLED_RESPONSE = json.dumps({
+    "type": "error",
+    "error": {"type": "rate_limit_error", "message": "Quota exceeded (stub)"},
+}).encode("utf-8")
+
+
+def make_handler(latency, throttle_rate):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            throttled = random.random() < throttle_rate
+            time.sleep(latency if not throttled else latency / 10)
+            body = THROTTLED_RESPONSE if throttled else MESSAGE_RESPONSE
+            self.send_response(429 if throttled else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_region(latency, throttle_rate):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency, throttle_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def stub_factory(base_urls):
+    def factory(region):
+        return AnthropicVertex(
+            region=region, project_id="stub-project", access_token="stub-token",
+            base_url=base_urls[region], max_retries=0,
+        )
+    return factory
+
+
+def run(pool, requests):
+    regions, latencies, failovers, errors = Counter(), [], 0, 0
+    for _ in range(requests):
+        metrics = {}
+        start = time.perf_counter()
+        try:
+            _, region = pool.create(
+                metrics=metrics, model="claude-3-7-sonnet@20250219", max_tokens=50,
+                messages=[{"role": "user", "content": "hi"}],
+            )
+            regions[region] += 1
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+        failovers += metrics.get("claude_failovers", 0)
+    return regions, latencies, failovers, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--hedging", action="store_true")
+    parser.add_argument("--region", action="append", default=None)
+    args = parser.parse_args()
+
+    specs = args.region or ["us-east5:0.10:0.4", "us-central1:0.20:0.02", "europe-west1:0.15:0.0"]
+    base_urls, servers = {}, []
+    for spec in specs:
+        name, latency, throttle = spec.split(":")
+        server, base_urls[name] = start_region(float(latency), float(throttle))
+        servers.append(server)
+    names = list(base_urls)
+
+    single = ClaudeRegionPool(regions=names[:1], client_factory=stub_factory(base_urls))
+    pool = ClaudeRegionPool(regions=names, client_factory=stub_factory(base_urls), hedging=args.hedging)
+
+    for label, p in (("single region", single), ("region pool", pool)):
+        regions, latencies, failovers, errors = run(p, args.requests)
+        latencies.sort()
+        print(f"{label:14} errors={errors:4d} failovers={failovers:4d} "
+              f"p50={statistics.median(latencies) * 1000:7.1f} ms "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms  served={dict(regions)}")
+    print("health:", json.dumps(pool.snapshot(), indent=2))
+
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: local BM25 retrieval vs. the remote Vertex `retrieveContexts` path.
+
+Usage:
+    python bench_local_rag.py local_rag.idx [--rounds 50] [--remote]
+
+--remote also times the managed endpoint through RagClient (needs application
+default credentials; GCP_PROJECT / RAG_REGION / RAG_CORPUS as in main.py).
+"""
+import argparse
+import os
+import statistics
+import time
+
+from local_rag import LocalRagIndex
+
+SAMPLE_QUERIES = [
+    "esthetics schedule",
+    "barbering price",
+    "when does the nails part time evening program start",
+    "makeup module dates",
+    "skin care spanish evening",
+    "cidesco admission requirements",
+    "how much is waxing",
+    "cosmetology full time day new jersey",
+]
+
+
+def time_queries(search, rounds):
+    latencies = []
+    for _ in range(rounds):
+        for q in SAMPLE_QUERIES:
+            start = time.perf_counter()
+            search(q)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+    print(f"{name:<14} n={len(ordered):<5} mean={statistics.mean(ordered) * 1000:9.3f}ms "
+          f"p50={statistics.median(ordered) * 1000:9.3f}ms p95={p95 * 1000:9.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local BM25 vs remote RAG latency")
+    parser.add_argument("index_path")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--remote", action="store_true")
+    args = parser.parse_args()
+
+    index = LocalRagIndex.load(args.index_path)
+    print(f"Index: {index.stats()}")
+    summarize("local bm25", time_queries(lambda q: index.search(q, args.top_k), args.rounds))
+
+    if args.remote:
+        from rag_client import RagClient
+
+        project_id = os.getenv("GCP_PROJECT", "christinevalmy")
+        rag_region = os.environ.get("RAG_REGION", "us-central1")
+        corpus = os.environ.get(
+            "RAG_CORPUS",
+            "projects/christinevalmy/locations/us-central1/ragCorpora/5685794529555251200"
+        )
+        client = RagClient(project_id=project_id, region=rag_region)
+        client.warm()
+        # The remote path is slow; a handful of rounds is enough for a comparison
+        remote_rounds = max(1, min(args.rounds, 3))
+        summarize("vertex remote", time_queries(
+            lambda q: client.retrieve_contexts(corpus, q, args.top_k), remote_rounds))
+        client.close()
@@ -0,0 +1,123 @@
+"""
+Benchmark: schedule/pricing data embedded in the prompt vs. looked up with tools.
+
+Builds the static system prompt in each PROMPT_DATA_MODE and estimates the
+input tokens of a turn that needs no data, of a turn that makes one tool
+call (which re-sends the prompt for a second round, plus the tool result),
+and of a turn carrying only the preselected schedule rows.
+Then runs the in-process tool loop against a stub client to time the lookups.
+
+Usage:
+    python bench_prompt_data_mode.py [--iterations 2000]
+"""
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+from schedule_selection import ScheduleSelector
+from schedule_tools import MAX_TOOL_ROUNDS, TOOLS, create_with_tools, get_course_start_dates, get_program_pricing, run_tool
+from systemprompt import build_static_sophia_prompt, get_contextual_sophia_prompt_parts
+from token_budget import estimate_tokens
+
+# Fixed cut-off so the lookups return rows whatever today's date is
+AFTER = "2025-09-01"
+SAMPLE_CALLS = [
+    ("get_course_start_dates", {"program": "esthetics", "after": AFTER}),
+    ("get_course_start_dates", {"program": "barbering", "campus": "new_jersey", "count": 3, "after": AFTER}),
+    ("get_course_start_dates", {"program": "skin care", "language": "spanish", "after": AFTER}),
+    ("get_course_start_dates", {"program": "makeup", "schedule_keyword": "weekend", "after": AFTER}),
+    ("get_program_pricing", {"program": "nails"}),
+    ("get_program_pricing", {"program": "cosmetology", "campus": "new_jersey"}),
+]
+
+
+class StubClaude:
+    """
+    Asks for one tool on the first round, answers with text on the second
+    (`insistent`: keeps asking for tools until tool_choice forbids them).
+    """
+
+    def __init__(self, tool_name, tool_input, insistent=False):
+        self.tool_name = tool_name
+        self.tool_input = tool_input
+        self.insistent = insistent
+
+    def create(self, messages, tools, tool_choice=None, **kwargs):
+        usage = SimpleNamespace(input_tokens=10, output_tokens=10)
+        answered = messages[-1]["role"] == "user" and isinstance(messages[-1]["content"], list) \
+            and messages[-1]["content"][0].get("type") == "tool_result"
+        if tool_choice == {"type": "none"} or (answered and not self.insistent):
+            return SimpleNamespace(stop_reason="end_turn", usage=usage,
+                                   content=[SimpleNamespace(type="text", text="Here are the dates.")])
+        tool_use = SimpleNamespace(type="tool_use", id="toolu_stub", name=self.tool_name, input=self.tool_input)
+        return SimpleNamespace(stop_reason="tool_use", usage=usage, content=[tool_use])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    history = [{"role": "user", "content": [{"text": "I'm interested in esthetics in NY"}]}]
+    _, dynamic_suffix = get_contextual_sophia_prompt_parts(history, "what are the start dates?", "")
+    dynamic_tokens = estimate_tokens(dynamic_suffix)
+    embedded = estimate_tokens(build_static_sophia_prompt("embedded"))
+    tools_static = estimate_tokens(build_static_sophia_prompt("tools"))
+    schema_tokens = estimate_tokens(json.dumps(TOOLS))
+    result_tokens = [estimate_tokens(run_tool(name, tool_input)[0]) for name, tool_input in SAMPLE_CALLS]
+    mean_result = sum(result_tokens) / len(result_tokens)
+
+    no_call = tools_static + schema_tokens + dynamic_tokens
+    one_call = 2 * no_call + mean_result + 50  # second round re-sends the prompt, plus tool_use/result overhead
+    print(f"static prefix   embedded={embedded:>7} tokens   tools={tools_static:>7} (+{schema_tokens} tool schemas)")
+    print(f"turn, no lookup embedded={embedded + dynamic_tokens:>7} tokens   tools={no_call:>7}"
+          f"  saved {1 - no_call / (embedded + dynamic_tokens):.0%}")
+    print(f"turn, 1 lookup  embedded={embedded + dynamic_tokens:>7} tokens   tools={one_call:>7.0f}"
+          f"  saved {1 - one_call / (embedded + dynamic_tokens):.0%}")
+    print(f"tool results    mean={mean_result:.0f} tokens  per call={result_tokens}")
+
+    selected_static = estimate_tokens(build_static_sophia_prompt("selected"))
+    selector = ScheduleSelector(today=lambda: AFTER)
+    for turn_history, query in (([], "hi"), (history, "what are the start dates?")):
+        section = selector.select(turn_history, query).section
+        selected = selected_static + dynamic_tokens + estimate_tokens(section)
+        print(f"selected rows   embedded={embedded + dynamic_tokens:>7} tokens   selected={selected:>7}"
+              f"  saved {1 - selected / (embedded + dynamic_tokens):.0%}  ({query!r})")
+
+    for name, tool_input in SAMPLE_CALLS:
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            run_tool(name, tool_input)
+        per_call_us = (time.perf_counter() - start) / args.iterations * 1e6
+        print(f"  {name:24} {json.dumps(tool_input):90} {per_call_us:8.1f} us")
+
+    # An unknown campus is an error for the model, not "no upcoming classes"
+    for name in ("get_course_start_dates", "get_program_pricing"):
+        text, is_error = run_tool(name, {"program": "esthetics", "campus": "paris"})
+        assert is_error, (name, text)
+
+    metrics = {}
+    resp, usage = create_with_tools(
+        StubClaude("get_course_start_dates", {"program": "esthetics", "after": AFTER}).create,
+        [{"role": "user", "content": "what are the start dates?"}], metrics,
+        system="stub", model="stub", max_tokens=100,
+    )
+    assert resp.stop_reason == "end_turn" and metrics["tool_rounds"] == 1, metrics
+    # Still asking for tools after MAX_TOOL_ROUNDS: the last round must answer in text
+    insistent_metrics = {}
+    resp, _ = create_with_tools(
+        StubClaude("get_course_start_dates", {"program": "esthetics", "after": AFTER}, insistent=True).create,
+        [{"role": "user", "content": "what are the start dates?"}], insistent_metrics,
+        system="stub", model="stub", max_tokens=100,
+    )
+    assert resp.stop_reason == "end_turn" and resp.content[0].text, insistent_metrics
+    assert insistent_metrics["tool_rounds"] == MAX_TOOL_ROUNDS, insistent_metrics
+    print("tool loop OK:", json.dumps(metrics["tool_calls"]), f"usage in={usage.input_tokens} out={usage.output_tokens}")
+
+    print("sample:", json.dumps(get_course_start_dates("esthetics", after=AFTER), ensure_ascii=False))
+    print("sample:", json.dumps(get_program_pricing("waxing"), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: full vs. stage/language/intent-pruned static prompt.
+
+Walks a few realistic conversations turn by turn (an English esthetics lead
+through to completion, a Spanish makeup/pricing thread, a CIDESCO question)
+and prints the static prompt tokens each turn would send in full and pruned,
+per PROMPT_DATA_MODE, plus the per-request cost of picking the variant.
+
+Usage:
+    python bench_prompt_pruning.py [--rounds 2000]
+"""
+import argparse
+import statistics
+import time
+
+from prompt_pruning import PromptPruner
+from prompt_templates import PromptTemplateEngine
+from systemprompt import detect_prompt_intents
+
+
+def m(role, text):
+    return {"role": role, "content": [{"text": text}]}
+
+
+CONVERSATIONS = {
+    "english lead": [
+        "hi",
+        "I'm interested in esthetics in New York",
+        "when do the evening classes start?",
+        "how much is the tuition?",
+        "yes I want to enroll",
+        "anisha b, ani@b.com, 678-9386850",
+        "nope",
+    ],
+    "spanish makeup": [
+        "hola",
+        "quiero información sobre el curso de maquillaje",
+        "¿cuánto cuesta?",
+        "¿tienen planes de pago?",
+        "sí perfecto quiero inscribirme",
+    ],
+    "cidesco": [
+        "what are the admission requirements for CIDESCO?",
+        "do I need a license?",
+    ],
+}
+
+
+def replay(conversation):
+    """(history, user_query) for every turn of a conversation, with stub assistant replies."""
+    history = []
+    for query in conversation:
+        yield list(history), query
+        history += [m("user", query), m("assistant", "Great question! What else would you like to know?")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = PromptTemplateEngine()
+    turns = [
+        (name, history, query, engine.analyze(history, query))
+        for name, conversation in CONVERSATIONS.items()
+        for history, query in replay(conversation)
+    ]
+
+    for data_mode in ("embedded", "tools", "selected"):
+        pruner = PromptPruner(data_mode)
+        full = pruner.full_tokens()
+        print(f"\n{data_mode}: full static prompt {full} tokens")
+        saved = []
+        for name, history, query, state in turns:
+            intents = detect_prompt_intents(history, query)
+            pruned = pruner.prune(state.stage, state.language, intents)
+            saved.append(1 - pruned.tokens / full)
+            print(f"  {name:<15} {query[:38]!r:42} {state.stage:<22} {','.join(sorted(intents)) or '-':<24} "
+                  f"{pruned.tokens:6} tokens ({saved[-1]:.0%} saved)")
+        print(f"  mean saved per turn: {statistics.mean(saved):.0%}")
+
+    pruner = PromptPruner()
+    latencies = []
+    for _ in range(args.rounds):
+        for _, history, query, state in turns:
+            start = time.perf_counter()
+            pruner.prune(state.stage, state.language, detect_prompt_intents(history, query))
+            latencies.append(time.perf_counter() - start)
+    print(f"\nintents + variant lookup: mean {statistics.mean(latencies) * 1e6:.1f}us "
+          f"p50 {statistics.median(latencies) * 1e6:.1f}us over {len(latencies)} turns")
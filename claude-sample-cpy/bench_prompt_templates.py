@@ -0,0 +1,91 @@
+"""
+Benchmark: per-request system-prompt assembly, legacy function vs. the
+precompiled PromptTemplateEngine.
+
+Times both over a mix of realistic turns (short and long histories, every
+stage, with and without RAG context) and measures allocations per request
+with tracemalloc. Outputs are checked byte-identical first.
+
+Usage:
+    python bench_prompt_templates.py [--rounds 200]
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from prompt_templates import PromptTemplateEngine
+from systemprompt import get_contextual_sophia_prompt_parts
+
+
+def m(role, text):
+    return {"role": role, "content": [{"text": text}]}
+
+
+CHATTER = [
+    m("user", "hi, I'm looking at beauty schools"),
+    m("assistant", "Welcome to Christine Valmy! Which program interests you: esthetics, nails, makeup or waxing?"),
+    m("user", "I'm interested in esthetics in New York"),
+    m("assistant", "Great choice! Our Esthetics program is 600 hours and runs full time or part time evenings."),
+    m("user", "what are the start dates for evenings?"),
+    m("assistant", "The next part time evening classes start on November 3rd and December 1st."),
+]
+CONTACT = [m("user", "anisha b, ani@b.com, 678-9386850")]
+RAG = "Esthetics Part Time Evening (English) 2026-11-03 to 2027-06-20, Mon-Thu\n\n---\nRegistration fee $100"
+
+SAMPLE_TURNS = [
+    ([], "hi", ""),
+    (CHATTER[:1], "hola, ¿cuánto cuesta el curso de uñas?", RAG),
+    (CHATTER, "do you have payment plans?", ""),
+    (CHATTER, "yes I want to enroll", RAG),
+    (CHATTER * 3, "what about the weekend schedule?", RAG),
+    (CHATTER + CONTACT, "ok", ""),
+    (CHATTER + CONTACT + [m("assistant", "Our enrollment advisor will contact you soon.")], "nope", ""),
+]
+
+
+def time_turns(build, rounds):
+    latencies = []
+    for _ in range(rounds):
+        for history, query, rag_context in SAMPLE_TURNS:
+            start = time.perf_counter()
+            build(history, query, rag_context)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def allocated_bytes(build, rounds):
+    """Mean peak bytes allocated while building one request's prompt."""
+    requests = rounds * len(SAMPLE_TURNS)
+    total = 0
+    for history, query, rag_context in SAMPLE_TURNS * rounds:
+        tracemalloc.start()
+        build(history, query, rag_context)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        total += peak
+    return total / requests
+
+
+def summarize(name, latencies, peak_bytes):
+    ordered = sorted(latencies)
+    p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+    print(f"{name:<9} n={len(ordered):<5} mean={statistics.mean(ordered) * 1e6:8.1f}us "
+          f"p50={statistics.median(ordered) * 1e6:8.1f}us p95={p95 * 1e6:8.1f}us "
+          f"peak alloc/request={peak_bytes / 1024:7.1f} KiB")
+    return statistics.mean(ordered)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = PromptTemplateEngine()
+    for history, query, rag_context in SAMPLE_TURNS:
+        assert engine.parts(history, query, rag_context) == get_contextual_sophia_prompt_parts(history, query, rag_context)
+
+    legacy = summarize("legacy", time_turns(get_contextual_sophia_prompt_parts, args.rounds),
+                       allocated_bytes(get_contextual_sophia_prompt_parts, 5))
+    compiled = summarize("compiled", time_turns(engine.parts, args.rounds), allocated_bytes(engine.parts, 5))
+    print(f"saved {1 - compiled / legacy:.0%} CPU per request ({(legacy - compiled) * 1e6:.1f}us)")
@@ -0,0 +1,142 @@
+"""
+Benchmark: pooled RagClient vs. building a session per call.
+
+Runs a local HTTP stand-in for `retrieveContexts` and measures per-request
+latency of both transports. The baseline mirrors the old behaviour of
+`smart_retrieve_from_rag`: fresh credentials (one token fetch) and a fresh
+AuthorizedSession (one new connection) for every request.
+
+Usage:
+    python bench_rag_client.py [--requests 200] [--token-latency 0.05]
+                               [--server-latency 0.0] [--certfile C --keyfile K]
+
+Pass a certificate/key pair to benchmark over TLS, which is where the
+per-call handshake cost shows up most clearly.
+"""
+import argparse
+import json
+import ssl
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.auth import credentials as ga_credentials
+from google.auth.transport.requests import AuthorizedSession
+
+from rag_client import RagClient
+
+CANNED_RESPONSE = json.dumps({
+    "contexts": {
+        "contexts": [
+            {"sourceUri": "gs://cv-rag/ny/New_York_Catalog_updated_eight.txt",
+             "text": "Esthetics Part Time Evening starts 2025-12-01 at the New York campus."},
+            {"sourceUri": "gs://cv-rag/nj/cv_enrollment_packet_NJ.txt",
+             "text": "Barbering Full Time Day is offered at the Wayne, NJ campus."},
+        ]
+    }
+}).encode("utf-8")
+
+
+class StubCredentials(ga_credentials.Credentials):
+    """Credentials whose refresh costs a configurable token-fetch latency."""
+
+    def __init__(self, token_latency):
+        super().__init__()
+        self.token_latency = token_latency
+
+    def refresh(self, request):
+        time.sleep(self.token_latency)
+        self.token = "stub-token"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+def make_handler(server_latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+        # Headers and body go out as two writes; with Nagle on, a reused
+        # connection stalls ~40ms on the client's delayed ACK every request
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if server_latency:
+                time.sleep(server_latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(CANNED_RESPONSE)))
+            self.end_headers()
+            self.wfile.write(CANNED_RESPONSE)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(server_latency, certfile=None, keyfile=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(server_latency))
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_session_per_call(base_url, n, token_latency, verify):
+    client = RagClient("bench", "local", base_url=base_url)  # only used for the URL
+    payload = {"query": {"text": "esthetics schedule", "similarity_top_k": 10}}
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        session = AuthorizedSession(StubCredentials(token_latency))
+        session.verify = verify
+        resp = session.post(client.url, json=payload, timeout=20)
+        resp.json()
+        session.close()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_pooled(base_url, n, token_latency, verify):
+    client = RagClient("bench", "local", base_url=base_url,
+                       credentials=StubCredentials(token_latency))
+    client.warm()
+    client._session.verify = verify
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        client.retrieve_contexts("projects/bench/ragCorpora/1", "esthetics schedule", 10)
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    return latencies
+
+
+def summarize(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<22} mean={statistics.mean(ordered) * 1000:7.2f}ms "
+          f"p50={statistics.median(ordered) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.05,
+                        help="simulated token fetch per fresh credential (seconds)")
+    parser.add_argument("--server-latency", type=float, default=0.0)
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.server_latency, args.certfile, args.keyfile)
+    verify = False if args.certfile else True  # self-signed stand-in certificates
+
+    print(f"{args.requests} requests against {base_url}")
+    summarize("session-per-call", bench_session_per_call(base_url, args.requests, args.token_latency, verify))
+    summarize("pooled RagClient", bench_pooled(base_url, args.requests, args.token_latency, verify))
+    server.shutdown()
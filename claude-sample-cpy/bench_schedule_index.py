@@ -0,0 +1,86 @@
+"""
+Benchmark: "next N start dates" queries on ScheduleIndex vs. scanning the
+nested schedule dicts (month -> category -> language -> classes) per query.
+
+Both answer the same queries; results are checked equal first (the scan
+drops duplicate rows the way the index does). Also prints the index build
+time, its column sizes and any consistency issues.
+
+Usage:
+    python bench_schedule_index.py [--rounds 2000]
+"""
+import argparse
+import statistics
+import time
+
+from data_store import data_store
+from schedule_index import ScheduleIndex, get_schedule_index, iter_schedule_rows
+
+SAMPLE_QUERIES = [
+    dict(category="Esthetics", keyword="evening", language="spanish", after="2025-09-01", count=2),
+    dict(category="Esthetics", keyword="evening", language="english", after="2025-09-01", count=2),
+    dict(category="Barbering", campus="new_jersey", after="2026-01-05", count=3),
+    dict(category="Skin Care", keyword="evening", language="spanish", after="2025-10-15", count=2),
+    dict(category="Teaching Training", after="2026-07-06", count=6),
+    dict(category="Makeup/Clinic", keyword="weekend", after="2025-09-01", count=2),
+    dict(category="Cosmetology", after="2027-01-01", count=2),
+]
+
+
+def scan_nested(category, after, count, campus=None, language="english", keyword=None):
+    """The baseline: walk every month of every schedule, filter, sort."""
+    found = {}
+    for row_campus, row_category, row_language, row in iter_schedule_rows(data_store.snapshot().datasets):
+        if (row_category.lower() == category.lower()
+                and (campus is None or row_campus == campus)
+                and row_language == language
+                and (keyword is None or keyword in row["program"].lower())
+                and row.get("start_date", "") > after):
+            found.setdefault((row["program"], row["start_date"]), {**row, "campus": row_campus})
+    rows = sorted(found.values(), key=lambda r: r["start_date"])[:count]
+    return [(r["program"], r["start_date"]) for r in rows]
+
+
+def query_index(category, after, count, campus=None, language="english", keyword=None):
+    index = get_schedule_index()
+    variants = index.variant_ids(category=category, campus=campus, language=language, keyword=keyword)
+    return [index.row(p) for p in index.next_starts(variants, after, count)]
+
+
+def time_queries(run, rounds):
+    latencies = []
+    for _ in range(rounds):
+        for query in SAMPLE_QUERIES:
+            start = time.perf_counter()
+            run(**query)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+    print(f"{name:<12} n={len(ordered):<6} mean={statistics.mean(ordered) * 1e6:8.1f}us "
+          f"p50={statistics.median(ordered) * 1e6:8.1f}us p95={p95 * 1e6:8.1f}us")
+    return statistics.mean(ordered)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    datasets = data_store.snapshot().datasets
+    start = time.perf_counter()
+    ScheduleIndex(iter_schedule_rows(datasets))
+    print(f"build        {(time.perf_counter() - start) * 1000:.2f}ms  {get_schedule_index().stats()}")
+    for issue in get_schedule_index().check():
+        print("issue:", issue)
+
+    for query in SAMPLE_QUERIES:
+        expected = scan_nested(**query)
+        assert [(r["program"], r["start_date"]) for r in query_index(**query)] == expected, query
+
+    scan = summarize("nested scan", time_queries(scan_nested, args.rounds))
+    index = summarize("index", time_queries(query_index, args.rounds))
+    print(f"index is {scan / index:.0f}x faster per query")
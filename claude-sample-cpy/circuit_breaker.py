@@ -0,0 +1,214 @@
+"""
+Sliding-window circuit breaker for slow or failing dependencies.
+
+Closed: calls go through while the error and slow-call rates over the last
+`window_seconds` are recorded. When either rate crosses its threshold (after
+`min_calls` calls), the circuit opens and calls fail fast for
+`open_seconds`. It then goes half-open: a limited number of probe calls are
+let through, and their outcome closes or re-opens the circuit. Only calls
+admitted as probes decide that; a slow call admitted while closed that
+finishes during half-open is ignored.
+
+State changes are logged after the lock is released, so a slow log write
+never holds up admission.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# ---------------- Breaker Config ----------------
+BREAKER_WINDOW_SECONDS = float(os.environ.get("RAG_BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.environ.get("RAG_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.environ.get("RAG_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("RAG_BREAKER_SLOW_CALL", "8"))
+BREAKER_SLOW_RATE = float(os.environ.get("RAG_BREAKER_SLOW_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("RAG_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("RAG_BREAKER_HALF_OPEN_PROBES", "1"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the dependency while the circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, window_seconds=BREAKER_WINDOW_SECONDS, min_calls=BREAKER_MIN_CALLS,
+                 error_rate_threshold=BREAKER_ERROR_RATE, slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+                 slow_rate_threshold=BREAKER_SLOW_RATE, open_seconds=BREAKER_OPEN_SECONDS,
+                 half_open_probes=BREAKER_HALF_OPEN_PROBES, logger=None, clock=time.monotonic):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.logger = logger
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (timestamp, failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+    # ---------------- State ----------------
+    @property
+    def state(self):
+        with self._lock:
+            event = self._maybe_half_open()
+            state = self._state
+        self._log(event)
+        return state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._probes_in_flight = 0
+            return self._transition(HALF_OPEN, "open_timeout_elapsed")
+        return None
+
+    def _transition(self, new_state, reason):
+        """Change state under the lock; returns the log entry for _log once it's released."""
+        old_state, self._state = self._state, new_state
+        if new_state == OPEN:
+            self._opened_at = self._clock()
+        event = {
+            "event": "circuit_breaker_state",
+            "breaker": self.name,
+            "from": old_state,
+            "to": new_state,
+            "reason": reason,
+            **self._rates()
+        }
+        if new_state == CLOSED:
+            self._calls.clear()
+        return event
+
+    def _log(self, event):
+        if event and self.logger:
+            self.logger.log_struct(event, severity="WARNING" if event["to"] == OPEN else "INFO")
+
+    def _prune(self):
+        horizon = self._clock() - self.window_seconds
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def _rates(self):
+        total = len(self._calls)
+        if not total:
+            return {"calls": 0, "error_rate": 0.0, "slow_rate": 0.0}
+        failed = sum(1 for _, f, _ in self._calls if f)
+        slow = sum(1 for _, _, s in self._calls if s)
+        return {"calls": total, "error_rate": round(failed / total, 3), "slow_rate": round(slow / total, 3)}
+
+    # ---------------- Admission & Outcomes ----------------
+    def allow(self):
+        """
+        The state the call is admitted in (CLOSED, or HALF_OPEN for a probe),
+        or None if it must fail fast. Pass it back to record().
+        """
+        with self._lock:
+            event = self._maybe_half_open()
+            admitted = None
+            if self._state == CLOSED:
+                admitted = CLOSED
+            elif self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                admitted = HALF_OPEN
+        self._log(event)
+        return admitted
+
+    def record(self, failed, latency, admitted=CLOSED):
+        """Record one call's outcome and update the circuit state."""
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            event = self._record(failed, slow, admitted)
+        self._log(event)
+
+    def _record(self, failed, slow, admitted):
+        if self._state == HALF_OPEN:
+            # Only probes decide; a call admitted before the circuit opened doesn't
+            if admitted != HALF_OPEN:
+                return None
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if failed or slow:
+                return self._transition(OPEN, "probe_failed" if failed else "probe_slow")
+            return self._transition(CLOSED, "probe_succeeded")
+
+        self._calls.append((self._clock(), failed, slow))
+        self._prune()
+        if self._state != CLOSED or len(self._calls) < self.min_calls:
+            return None
+        rates = self._rates()
+        if rates["error_rate"] >= self.error_rate_threshold:
+            return self._transition(OPEN, "error_rate")
+        if rates["slow_rate"] >= self.slow_rate_threshold:
+            return self._transition(OPEN, "slow_rate")
+        return None
+
+    def call(self, fn, *args, is_failure=lambda e: True, **kwargs):
+        """
+        Run fn through the breaker. Raises CircuitOpenError without calling fn
+        while open. `is_failure(exc)` decides whether an exception counts
+        against the dependency (e.g. client errors usually shouldn't).
+        """
+        admitted = self.allow()
+        if admitted is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record(is_failure(e), time.monotonic() - start, admitted)
+            raise
+        self.record(False, time.monotonic() - start, admitted)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            event = self._maybe_half_open()
+            self._prune()
+            snapshot = {"state": self._state, **self._rates()}
+        self._log(event)
+        return snapshot
+
+
+if __name__ == "__main__":
+    class LockCheckingLogger:
+        def __init__(self):
+            self.events = []
+
+        def log_struct(self, event, severity):
+            assert not breaker._lock.locked(), "logged while holding the lock"
+            self.events.append((event["to"], event["reason"]))
+
+    now = [0.0]
+    logger = LockCheckingLogger()
+    breaker = CircuitBreaker("test", min_calls=2, open_seconds=10, logger=logger, clock=lambda: now[0])
+
+    straggler = breaker.allow()  # admitted while closed, finishes later
+    assert straggler == CLOSED
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN and breaker.allow() is None
+    now[0] = 11
+    probe = breaker.allow()
+    assert probe == HALF_OPEN and breaker.allow() is None
+    # The straggler's success doesn't close the circuit; the probe's failure re-opens it
+    breaker.record(False, 0.1, straggler)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 0.1, probe)
+    assert breaker.state == OPEN
+    now[0] = 22
+    breaker.record(False, 0.1, breaker.allow())
+    assert breaker.state == CLOSED
+    assert logger.events == [
+        ("open", "error_rate"), ("half_open", "open_timeout_elapsed"), ("open", "probe_failed"),
+        ("half_open", "open_timeout_elapsed"), ("closed", "probe_succeeded"),
+    ], logger.events
+    print("OK", breaker.snapshot())
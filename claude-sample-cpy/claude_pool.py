@@ -0,0 +1,257 @@
+"""
+Multi-region pool of AnthropicVertex clients.
+
+Each configured region keeps a rolling health record (latency and the rate
+of retryable errors over the last CLAUDE_HEALTH_WINDOW seconds, plus a short
+cooldown after a 429). Requests go to the healthiest region and fail over to
+the next one on retryable errors (429, 5xx/529 overloaded, connection errors
+and timeouts). Optionally a slow call is hedged: if the first region hasn't
+answered within its recent p95, the same request is sent to the runner-up and
+the first success wins. Hedging doubles token spend for hedged calls, so it
+is off by default.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import anthropic
+from anthropic import AnthropicVertex
+
+from rag_client import LatencyHistogram
+
+# ---------------- Pool Config ----------------
+CLAUDE_REGIONS = [r.strip() for r in os.environ.get(
+    "CLAUDE_REGIONS", os.environ.get("FUNCTION_REGION", "us-east5")
+).split(",") if r.strip()]
+CLAUDE_HEALTH_WINDOW = float(os.environ.get("CLAUDE_HEALTH_WINDOW", "120"))    # seconds
+CLAUDE_ERROR_PENALTY = float(os.environ.get("CLAUDE_ERROR_PENALTY", "10"))     # score x (1 + penalty * error rate)
+CLAUDE_THROTTLE_COOLDOWN = float(os.environ.get("CLAUDE_THROTTLE_COOLDOWN", "20"))  # seconds after a 429
+CLAUDE_DEFAULT_LATENCY = float(os.environ.get("CLAUDE_DEFAULT_LATENCY", "3.0"))  # score of a region with no data
+CLAUDE_HEDGING = os.environ.get("CLAUDE_HEDGING", "0") == "1"
+CLAUDE_HEDGE_PERCENTILE = float(os.environ.get("CLAUDE_HEDGE_PERCENTILE", "95"))
+CLAUDE_HEDGE_MIN_SAMPLES = int(os.environ.get("CLAUDE_HEDGE_MIN_SAMPLES", "20"))
+CLAUDE_HEDGE_DEFAULT_DELAY = float(os.environ.get("CLAUDE_HEDGE_DEFAULT_DELAY", "8.0"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(exc):
+    """True for errors another region might not have (throttling, overload, transport)."""
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS
+
+
+def is_throttled(exc):
+    return getattr(exc, "status_code", None) == 429
+
+
+class RegionHealth:
+    """Rolling latency/error record for one region."""
+
+    def __init__(self, window_seconds=CLAUDE_HEALTH_WINDOW, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._calls = deque()  # (timestamp, latency, failed)
+        self.latency = LatencyHistogram()  # successful calls only, for hedge delays
+        self.cooldown_until = 0.0
+
+    def record(self, latency, failed, throttled=False):
+        now = self._clock()
+        self._calls.append((now, latency, failed))
+        if not failed:
+            self.latency.record(latency)
+        if throttled:
+            self.cooldown_until = now + CLAUDE_THROTTLE_COOLDOWN
+
+    def _prune(self):
+        horizon = self._clock() - self.window_seconds
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def cooling(self):
+        return self._clock() < self.cooldown_until
+
+    def stats(self):
+        self._prune()
+        calls = len(self._calls)
+        failures = sum(1 for _, _, failed in self._calls if failed)
+        ok_latencies = [latency for _, latency, failed in self._calls if not failed]
+        mean_latency = sum(ok_latencies) / len(ok_latencies) if ok_latencies else CLAUDE_DEFAULT_LATENCY
+        error_rate = failures / calls if calls else 0.0
+        return {
+            "calls": calls,
+            "error_rate": round(error_rate, 3),
+            "mean_latency": round(mean_latency, 3),
+            "score": round(mean_latency * (1 + CLAUDE_ERROR_PENALTY * error_rate), 3),
+            "cooling": self.cooling(),
+        }
+
+
+class ClaudeRegionPool:
+    def __init__(self, regions=None, project_id=None, client_factory=None, hedging=CLAUDE_HEDGING,
+                 hedge_percentile=CLAUDE_HEDGE_PERCENTILE, logger=None, clock=time.monotonic):
+        self.regions = list(regions or CLAUDE_REGIONS)
+        self.hedging = hedging and len(self.regions) > 1
+        self.hedge_percentile = hedge_percentile
+        self.logger = logger
+        if client_factory is None:
+            # With several regions, failover replaces the SDK's same-region retries
+            max_retries = 0 if len(self.regions) > 1 else 2
+            client_factory = lambda region: AnthropicVertex(
+                region=region, project_id=project_id, max_retries=max_retries
+            )
+        self.clients = {region: client_factory(region) for region in self.regions}
+        self.health = {region: RegionHealth(clock=clock) for region in self.regions}
+        self._lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=2 * len(self.regions), thread_name_prefix="claude-hedge"
+        ) if self.hedging else None
+
+    # ---------------- Health ----------------
+    def ranked_regions(self):
+        """Regions best first: not cooling down, then lowest score; config order breaks ties."""
+        with self._lock:
+            stats = {region: self.health[region].stats() for region in self.regions}
+        return sorted(self.regions, key=lambda r: (stats[r]["cooling"], stats[r]["score"], self.regions.index(r)))
+
+    def record(self, region, latency, exc=None):
+        """Record a call outcome. Non-retryable errors (bad requests) don't count against the region."""
+        failed = exc is not None and is_retryable(exc)
+        with self._lock:
+            self.health[region].record(latency, failed, throttled=exc is not None and is_throttled(exc))
+
+    def snapshot(self):
+        with self._lock:
+            return {region: self.health[region].stats() for region in self.regions}
+
+    def hedge_delay(self, region):
+        histogram = self.health[region].latency
+        if len(histogram) < CLAUDE_HEDGE_MIN_SAMPLES:
+            return CLAUDE_HEDGE_DEFAULT_DELAY
+        return histogram.percentile(self.hedge_percentile)
+
+    # ---------------- Calls ----------------
+    def _call(self, region, kwargs):
+        start = time.monotonic()
+        try:
+            resp = self.clients[region].messages.create(**kwargs)
+        except Exception as e:
+            self.record(region, time.monotonic() - start, e)
+            raise
+        self.record(region, time.monotonic() - start)
+        return resp
+
+    def _log_failover(self, region, exc, remaining):
+        if self.logger:
+            self.logger.log_struct({
+                "event": "claude_region_failover",
+                "region": region,
+                "error_type": type(exc).__name__,
+                "status": getattr(exc, "status_code", None),
+                "remaining_regions": remaining,
+            }, severity="WARNING")
+
+    def _failover(self, regions, kwargs, metrics):
+        last_error = None
+        for i, region in enumerate(regions):
+            try:
+                resp = self._call(region, kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                if i + 1 < len(regions):
+                    metrics["claude_failovers"] = metrics.get("claude_failovers", 0) + 1
+                    self._log_failover(region, e, regions[i + 1:])
+                continue
+            metrics["claude_region"] = region
+            return resp, region
+        raise last_error
+
+    def create(self, metrics=None, **kwargs):
+        """
+        messages.create against the healthiest region, failing over on
+        retryable errors (and hedging to the runner-up when enabled).
+        Returns (resp, region); fills claude_region/claude_failovers/
+        claude_hedged into `metrics` when given.
+        """
+        if metrics is None:
+            metrics = {}
+        regions = self.ranked_regions()
+        if not self.hedging:
+            return self._failover(regions, kwargs, metrics)
+
+        primary_region, hedge_region = regions[0], regions[1]
+        delay = self.hedge_delay(primary_region)
+        futures = {self._hedge_executor.submit(self._call, primary_region, kwargs): primary_region}
+        done, _ = wait(futures, timeout=delay)
+        metrics["claude_hedged"] = not done
+        if not done:
+            futures[self._hedge_executor.submit(self._call, hedge_region, kwargs)] = hedge_region
+
+        pending, last_error = set(futures), None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    resp = future.result()
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    last_error = e
+                    metrics["claude_failovers"] = metrics.get("claude_failovers", 0) + 1
+                    self._log_failover(futures[future], e, regions[len(futures):])
+                    continue
+                for other in pending:
+                    other.cancel()
+                metrics["claude_region"] = futures[future]
+                metrics["claude_hedge_won"] = futures[future] != primary_region
+                return resp, futures[future]
+
+        # Both raced regions failed: plain failover over the rest
+        if len(regions) > len(futures):
+            return self._failover(regions[len(futures):], kwargs, metrics)
+        raise last_error
+
+    @contextmanager
+    def stream(self, metrics=None, **kwargs):
+        """
+        messages.stream against the healthiest region. Failover happens only
+        while opening the stream (before any text is sent to the client).
+        Yields (stream, region).
+        """
+        if metrics is None:
+            metrics = {}
+        regions = self.ranked_regions()
+        last_error = None
+        for i, region in enumerate(regions):
+            manager = self.clients[region].messages.stream(**kwargs)
+            start = time.monotonic()
+            try:
+                stream = manager.__enter__()
+            except Exception as e:
+                self.record(region, time.monotonic() - start, e)
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                if i + 1 < len(regions):
+                    metrics["claude_failovers"] = metrics.get("claude_failovers", 0) + 1
+                    self._log_failover(region, e, regions[i + 1:])
+                continue
+
+            metrics["claude_region"] = region
+            try:
+                yield stream, region
+            except BaseException as e:
+                manager.__exit__(type(e), e, e.__traceback__)
+                if isinstance(e, Exception):
+                    self.record(region, time.monotonic() - start, e)
+                raise
+            manager.__exit__(None, None, None)
+            self.record(region, time.monotonic() - start)
+            return
+        raise last_error
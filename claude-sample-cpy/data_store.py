@@ -0,0 +1,281 @@
+"""
+Schedule and pricing data, loaded from versioned JSON files.
+
+The course schedules and price lists used to be Python literals inside
+systemprompt.py, so every update meant a redeploy and the interpreter parsed
+them on every cold start. They now live in DATA_DIR, one file per dataset:
+
+    {"dataset": "pricing_for_new_york", "kind": "pricing", "version": 3, "data": {...}}
+
+DataStore reads and validates them on first use. After that it re-stats the
+files at most every DATA_RELOAD_INTERVAL seconds; when any mtime or size
+changed it loads and validates all of them into a new DataSnapshot with the
+next generation. The swap is a single assignment, so a request sees either
+the old data or the new data, never a mix. A reload that fails validation
+keeps the previous snapshot serving.
+
+Anything computed from the data (static prompt, schedule index, schedule
+digests) is cached on the snapshot with snapshot.derive(key, build): built
+once per generation and dropped together with the old snapshot.
+
+DATA_DIR can point at a mounted volume (e.g. a Cloud Storage bucket) so the
+files can be updated without a deploy.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(__file__), "data"))
+DATA_RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", "30"))  # seconds between mtime checks
+
+# Dataset name -> kind (selects the validator)
+DATASETS = {
+    "course_schedule_new_york": "schedule",
+    "course_schedule_for_new_york_makeup": "schedule",
+    "course_schedule_for_new_jersey": "schedule",
+    "pricing_for_new_york": "pricing",
+    "pricing_for_new_jersey": "pricing",
+}
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class DataValidationError(ValueError):
+    """A data file is missing, unreadable or doesn't match its schema."""
+
+
+def _expect(condition, path, message):
+    if not condition:
+        raise DataValidationError(f"{path}: {message}")
+
+
+def _expect_str_fields(obj, fields, path, optional=False):
+    for field in fields:
+        if optional and field not in obj:
+            continue
+        _expect(isinstance(obj.get(field), str), f"{path}.{field}", "expected a string")
+
+
+def validate_schedule(data, path):
+    """A year {"year", "months": [{"name", "categories": {category: {language: [class]}}}]} or a list of years."""
+    years = [data] if isinstance(data, dict) else data
+    _expect(isinstance(years, list) and years, path, "expected a year object or a non-empty list of them")
+    for y, year in enumerate(years):
+        year_path = f"{path}[{y}]"
+        _expect(isinstance(year, dict) and isinstance(year.get("year"), int), year_path, "expected {\"year\": int, ...}")
+        _expect(isinstance(year.get("months"), list), f"{year_path}.months", "expected a list")
+        for m, month in enumerate(year["months"]):
+            month_path = f"{year_path}.months[{m}]"
+            _expect(isinstance(month, dict), month_path, "expected an object")
+            _expect_str_fields(month, ("name",), month_path)
+            _expect(isinstance(month.get("categories"), dict), f"{month_path}.categories", "expected an object")
+            for category, by_language in month["categories"].items():
+                category_path = f"{month_path}.categories.{category}"
+                _expect(isinstance(by_language, dict), category_path, "expected {language: [class]}")
+                for language, classes in by_language.items():
+                    _expect(isinstance(classes, list), f"{category_path}.{language}", "expected a list")
+                    for c, row in enumerate(classes):
+                        row_path = f"{category_path}.{language}[{c}]"
+                        _expect(isinstance(row, dict), row_path, "expected an object")
+                        _expect_str_fields(row, ("program", "start_date"), row_path)
+                        _expect_str_fields(row, ("end_date", "weekday", "label"), row_path, optional=True)
+                        for field in ("start_date", "end_date"):
+                            value = row.get(field) or ""
+                            _expect(not value or _ISO_DATE.match(value), f"{row_path}.{field}", f"not a YYYY-MM-DD date: {value!r}")
+                        _expect("seats" not in row or isinstance(row["seats"], int), f"{row_path}.seats", "expected an int")
+
+
+def validate_pricing(data, path):
+    """{"location", "year", "programs": [{"category", "hours", "total_cost", "breakdown": {fee: str | [str]}}]}."""
+    _expect(isinstance(data, dict), path, "expected an object")
+    _expect_str_fields(data, ("location",), path)
+    _expect(isinstance(data.get("year"), int), f"{path}.year", "expected an int")
+    _expect(isinstance(data.get("programs"), list) and data["programs"], f"{path}.programs", "expected a non-empty list")
+    for p, program in enumerate(data["programs"]):
+        program_path = f"{path}.programs[{p}]"
+        _expect(isinstance(program, dict), program_path, "expected an object")
+        _expect_str_fields(program, ("category", "total_cost"), program_path)
+        _expect(isinstance(program.get("hours"), int), f"{program_path}.hours", "expected an int")
+        _expect(isinstance(program.get("breakdown"), dict), f"{program_path}.breakdown", "expected an object")
+        for fee, amount in program["breakdown"].items():
+            _expect(
+                isinstance(amount, str) or (isinstance(amount, list) and all(isinstance(a, str) for a in amount)),
+                f"{program_path}.breakdown.{fee}", "expected a string or a list of strings",
+            )
+
+
+VALIDATORS = {"schedule": validate_schedule, "pricing": validate_pricing}
+
+
+def load_dataset(path, name, kind):
+    """(version, data) from one data file, validated."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            document = json.load(f)
+    except (OSError, ValueError) as e:
+        raise DataValidationError(f"{name}: {e}") from e
+    _expect(isinstance(document, dict), name, "expected {\"dataset\", \"kind\", \"version\", \"data\"}")
+    _expect(document.get("dataset") == name, f"{name}.dataset", f"file holds {document.get('dataset')!r}")
+    _expect(document.get("kind") == kind, f"{name}.kind", f"expected {kind!r}, got {document.get('kind')!r}")
+    _expect("version" in document, f"{name}.version", "missing")
+    VALIDATORS[kind](document.get("data"), f"{name}.data")
+    return document["version"], document["data"]
+
+
+class DataSnapshot:
+    """One generation of every dataset, plus what has been derived from it."""
+
+    def __init__(self, generation, datasets, versions, signature):
+        self.generation = generation
+        self.datasets = datasets
+        self.versions = versions
+        self.signature = signature
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derive(self, key, build):
+        """build(self), computed once for this snapshot and cached under `key`."""
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+
+class DataStore:
+    """Lazily loaded, mtime-checked, atomically swapped datasets."""
+
+    def __init__(self, data_dir=DATA_DIR, datasets=DATASETS, check_interval=DATA_RELOAD_INTERVAL, clock=time.monotonic):
+        self.data_dir = data_dir
+        self.datasets = datasets
+        self.check_interval = check_interval
+        self._clock = clock
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._failed_signature = None
+        self.last_error = None
+
+    def path(self, name):
+        return os.path.join(self.data_dir, f"{name}.json")
+
+    def add_listener(self, listener):
+        """listener(snapshot, error) after every load attempt; error is None on success."""
+        self._listeners.append(listener)
+
+    def _signature(self):
+        signature = []
+        for name in self.datasets:
+            try:
+                st = os.stat(self.path(name))
+                signature.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((name, None, None))
+        return tuple(signature)
+
+    def _load(self, signature):
+        datasets, versions = {}, {}
+        for name, kind in self.datasets.items():
+            versions[name], datasets[name] = load_dataset(self.path(name), name, kind)
+        generation = self._snapshot.generation + 1 if self._snapshot else 1
+        return DataSnapshot(generation, datasets, versions, signature)
+
+    def reload(self, force=False):
+        """
+        Re-stat the files now and load them if they changed (or `force`).
+        Returns True when a new snapshot was swapped in. Raises
+        DataValidationError only when there is no snapshot to keep serving.
+        """
+        with self._lock:
+            self._checked_at = self._clock()
+            signature = self._signature()
+            current = self._snapshot
+            # Unchanged, or the same files that already failed validation
+            if current is not None and not force and signature in (current.signature, self._failed_signature):
+                return False
+            try:
+                snapshot = self._load(signature)
+            except DataValidationError as e:
+                self.last_error = str(e)
+                self._failed_signature = signature
+                error, snapshot = e, current
+            else:
+                error = None
+                self.last_error = None
+                self._snapshot = snapshot
+        for listener in self._listeners:
+            listener(snapshot, error)
+        if error is not None and current is None:
+            raise error
+        return error is None
+
+    def snapshot(self):
+        """The current DataSnapshot, loading on first use and re-checking every check_interval."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload()
+            return self._snapshot
+        if self._clock() - self._checked_at >= self.check_interval and not self._lock.locked():
+            self.reload()
+            return self._snapshot
+        return snapshot
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "data_generation": snapshot.generation if snapshot else 0,
+            "data_versions": dict(snapshot.versions) if snapshot else {},
+            "data_last_error": self.last_error,
+        }
+
+
+# Shared by systemprompt, schedule_index, schedule_tools and schedule_selection
+data_store = DataStore()
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    start = time.perf_counter()
+    snapshot = data_store.snapshot()
+    print(f"loaded {len(snapshot.datasets)} datasets in {(time.perf_counter() - start) * 1000:.1f}ms", data_store.status())
+
+    # Hot reload against a scratch copy: a valid edit bumps the generation and
+    # drops derived values; an invalid one keeps the old snapshot serving
+    scratch = tempfile.mkdtemp()
+    try:
+        for name in DATASETS:
+            shutil.copy(data_store.path(name), scratch)
+        store = DataStore(data_dir=scratch, check_interval=0)
+        first = store.snapshot()
+        assert first.derive("calls", lambda s: object()) is first.derive("calls", lambda s: object())
+
+        path = store.path("pricing_for_new_york")
+        with open(path, encoding="utf-8") as f:
+            document = json.load(f)
+        document["version"] += 1
+        document["data"]["programs"][0]["total_cost"] = "$1"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        second = store.snapshot()
+        assert second.generation == first.generation + 1
+        assert second.datasets["pricing_for_new_york"]["programs"][0]["total_cost"] == "$1"
+        assert "calls" not in second._derived
+
+        document["data"]["programs"][0]["hours"] = "many"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 2_000_000))
+        assert store.snapshot() is second and "hours" in store.last_error
+        print("OK: reload on change, derived caches dropped, invalid file rejected:", store.last_error)
+    finally:
+        shutil.rmtree(scratch)
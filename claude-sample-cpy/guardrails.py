@@ -0,0 +1,199 @@
+"""
+Deterministic guardrail replies for FAFSA/federal aid, the diploma/GED
+requirement and the school-contact policy.
+
+The prompt mandates a fixed English/Spanish reply for each of these intents.
+GuardrailEngine matches them with one compiled pattern (English and Spanish
+phrasings of every rule) before retrieval and Claude run, and returns the
+mandated reply directly. Rules are listed in priority order; when several
+match, the first rule wins. A rule's exceptions drop its match when the user
+is declining the topic ("I don't need financial aid") rather than asking.
+"""
+import re
+import threading
+from collections import namedtuple
+
+from retrieval_policy import EMAIL_RE, PHONE_RE
+from systemprompt import (
+    CONTACT_REQUEST_RESPONSES,
+    DIPLOMA_RESPONSES,
+    FAFSA_RESPONSES,
+    GUARDRAIL_SHORT_CIRCUIT,
+    detect_enrollment_info_collected,
+    detect_language,
+)
+
+# patterns, exceptions: {"english": [...], "spanish": [...]}
+GuardrailRule = namedtuple("GuardrailRule", "name patterns responses exceptions", defaults=(None,))
+GuardrailHit = namedtuple("GuardrailHit", "rule language matched response")
+
+GUARDRAIL_RULES = [
+    GuardrailRule("fafsa", {
+        "english": [
+            r"\bfafsa\b", r"\bf\.a\.f\.s\.a\b", r"\bfederal (student )?(financial )?aid\b", r"\bfederal (student )?loans?\b",
+            r"\bfinancial aid\b", r"\bpell grants?\b", r"\bfsa id\b", r"\bschool code\b", r"\b042337\b", r"\btitle iv\b",
+        ],
+        "spanish": [
+            r"\bayuda (financiera )?federal\b", r"\bayuda financiera\b", r"\bpr[eé]stamos? federal(es)?\b", r"\bbeca pell\b",
+            r"\bc[oó]digo (de la )?escuela\b",
+        ],
+    }, FAFSA_RESPONSES, {
+        "english": [
+            r"\b(don'?t|dont|do not|won'?t|wont|will not|no longer) (need|want|use|apply for|qualify for)( any| the| to use)? "
+            r"(fafsa|federal|financial|pell|loans?)\b",
+        ],
+        "spanish": [
+            r"\bno (necesito|quiero|voy a usar|uso)( la| el)? (ayuda|fafsa|beca|pr[eé]stamo)",
+        ],
+    }),
+    GuardrailRule("diploma", {
+        "english": [
+            r"\bability[- ]to[- ]benefit\b", r"\batb\b",
+            r"\bwithout (a |my |an? )?(high school )?(diploma|ged|hs diploma)\b",
+            r"\b(don'?t|dont|do not|never) (have|got|finish(ed)?|get) (a |my |an? |the )?(high school( diploma)?|diploma|ged)\b",
+            r"\b(didn'?t|did not|never) (finish|complete|graduate)( from)? (high school|school)\b",
+            r"\bno (high school )?(diploma|ged)\b",
+            r"\b(need|require|required|requirement)s? (a |an |the )?(high school )?(diploma|ged)\b",
+            r"\b(diploma|ged) (is )?(required|necessary|needed|mandatory)\b",
+        ],
+        "spanish": [
+            r"\bsin (el |un |mi )?(diploma|ged|t[ií]tulo)\b",
+            r"\bno tengo (el |un |mi )?(diploma|ged|t[ií]tulo)\b",
+            r"\bno (termin[eé]|complet[eé]) (la )?(secundaria|high school|preparatoria|escuela)\b",
+            r"\b(necesito|se necesita|requiere|requisito)( de)? (el |un )?(diploma|ged)\b",
+        ],
+    }, DIPLOMA_RESPONSES, {
+        # Has one, just not at hand
+        "english": [
+            r"\b(diploma|ged|it) (with|on) me\b",
+            r"\bbut i (do )?(have|got) (one|it|a diploma|my diploma|a ged|my ged)\b",
+        ],
+        "spanish": [
+            r"\bpero (s[ií] )?(lo|la) tengo\b", r"\b(diploma|ged) conmigo\b",
+        ],
+    }),
+    GuardrailRule("contact_policy", {
+        # The school must be what's asked for: "the number of hours" or
+        # "the email I should use" are ordinary questions
+        "english": [
+            r"\b(what'?s|whats|what is|give me|send me|share) (your|the school'?s?) (phone|telephone|number|email|e-mail|contact)\b",
+            r"\b(what'?s|whats|what is|give me|send me|share) the (phone|telephone) number\b",
+            r"\b(school'?s?|your) (phone|telephone)( number)?\b",
+            r"\bhow (can|do|could|should) i (contact|reach|call|email|e-mail|get in touch with) "
+            r"(you|the school|someone|somebody|admissions|an advisor)\b",
+            r"\bcan i (call|phone|email|e-mail|contact) (you|the school|admissions|an advisor)\b(?! back| later)",
+            r"\b(speak|talk) (to|with) (someone|somebody|a person|a human|a real person|an advisor|a representative|an agent|staff)\b",
+            r"\bcontact (the school|you|an advisor|admissions)\b",
+        ],
+        "spanish": [
+            r"\bn[uú]mero de (tel[eé]fono )?(de )?(la escuela|ustedes)\b",
+            r"\b(su|tu) (n[uú]mero de )?tel[eé]fono\b",
+            r"\bc[oó]mo (me comunico|los contacto|puedo (contactar|comunicarme|llamar))\b",
+            r"\b(hablar|comunicarme) con (alguien|una persona|un asesor|un representante)\b",
+            r"\bpuedo llamar(les|los)?\b",
+        ],
+    }, CONTACT_REQUEST_RESPONSES),
+]
+
+
+class GuardrailEngine:
+    """Matches guardrail intents and counts hits per rule."""
+
+    def __init__(self, rules=GUARDRAIL_RULES, enabled=GUARDRAIL_SHORT_CIRCUIT):
+        self.rules = {rule.name: rule for rule in rules}
+        self.enabled = enabled
+        self._priority = [rule.name for rule in rules]
+        # One alternation with a named group per (rule, language)
+        self._pattern = re.compile(
+            "|".join(
+                f"(?P<{rule.name}__{language}>{'|'.join(patterns)})"
+                for rule in rules
+                for language, patterns in rule.patterns.items()
+            ),
+            re.IGNORECASE,
+        )
+        self._exceptions = {
+            rule.name: re.compile("|".join(p for patterns in rule.exceptions.values() for p in patterns), re.IGNORECASE)
+            for rule in rules
+            if rule.exceptions
+        }
+        self._lock = threading.Lock()
+        self.hits = {rule.name: 0 for rule in rules}
+
+    def match(self, user_query, history):
+        """Return a GuardrailHit for this turn, or None."""
+        if not self.enabled or not user_query:
+            return None
+        matches = {}
+        for m in self._pattern.finditer(user_query):
+            rule_name, language = m.lastgroup.split("__")
+            matches.setdefault(rule_name, (language, m.group(0)))
+        for rule_name in list(matches):
+            if rule_name in self._exceptions and self._exceptions[rule_name].search(user_query):
+                del matches[rule_name]
+        # The user is giving (or already gave) their details: asking for the
+        # school's number is left to the model instead of asking for them again
+        if "contact_policy" in matches and (
+            EMAIL_RE.search(user_query) or PHONE_RE.search(user_query) or detect_enrollment_info_collected(history)
+        ):
+            del matches["contact_policy"]
+        if not matches:
+            return None
+
+        rule_name = min(matches, key=self._priority.index)
+        pattern_language, matched = matches[rule_name]
+        # A Spanish-only phrase settles the language; English patterns also
+        # match Spanglish ("el FAFSA"), so those defer to the detector
+        if pattern_language == "spanish" or detect_language(user_query, history) == "spanish":
+            language = "spanish"
+        else:
+            language = "english"
+        with self._lock:
+            self.hits[rule_name] += 1
+        return GuardrailHit(rule_name, language, matched, self.rules[rule_name].responses[language])
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.hits)
+
+
+if __name__ == "__main__":
+    import time
+
+    engine = GuardrailEngine(enabled=True)
+    contact = [{"role": "user", "content": [{"text": "anisha b, ani@b.com, 678-9386850"}]}]
+    cases = [
+        ("Can I use FAFSA for the esthetics program?", [], "fafsa"),
+        ("¿Aceptan ayuda financiera federal?", [], "fafsa"),
+        ("what's your school code", [], "fafsa"),
+        ("I'm 25 and I don't have a high school diploma, can I still enroll?", [], "diploma"),
+        ("does the ability to benefit program apply?", [], "diploma"),
+        ("Puedo inscribirme sin diploma?", [], "diploma"),
+        ("¿Puedo usar el FAFSA?", [], "fafsa"),
+        ("What's the school's phone number?", [], "contact_policy"),
+        ("I want to speak to someone", [], "contact_policy"),
+        ("¿Cuál es su número de teléfono?", [], "contact_policy"),
+        ("can I talk to an advisor", contact, None),
+        ("When does the nails program start?", [], None),
+        ("I have my GED, what programs do you offer?", [], None),
+        ("anisha b, ani@b.com, 678-9386850", [], None),
+        ("please have someone contact me, ani@b.com", [], None),
+        # Ordinary questions and declines that only share words with a rule
+        ("What is the number of hours for the nails program?", [], None),
+        ("whats the number of classes per week?", [], None),
+        ("What's the email I should use for the application?", [], None),
+        ("can i call you back later, I am driving", [], None),
+        ("I don't have my GED with me right now but I have one", [], None),
+        ("I dont need financial aid, I will pay cash", [], None),
+        ("No necesito ayuda financiera, voy a pagar en efectivo", [], None),
+        ("How can I contact the school?", [], "contact_policy"),
+        ("I don't have a GED", [], "diploma"),
+    ]
+    for query, history, expected in cases:
+        start = time.perf_counter()
+        hit = engine.match(query, history)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        rule = hit.rule if hit else None
+        assert rule == expected, (query, rule, expected)
+        print(f"{query!r:72} {str(rule):15} {hit.language if hit else '':8} {elapsed_us:7.1f} us")
+    print("OK", engine.snapshot())
@@ -0,0 +1,233 @@
+"""
+Local BM25 retrieval over a mirrored snapshot of the RAG corpus.
+
+The index is an inverted index in CSR layout: one `array` of document ids and
+one of term frequencies for all postings, addressed through per-term offsets,
+so even a large corpus stays a few compact buffers instead of millions of
+Python objects. `search` returns dicts shaped like Vertex `retrieveContexts`
+contexts ({"sourceUri", "text", "score"}), so `smart_retrieve_from_rag` can
+post-process both backends the same way.
+
+Build an index from a directory of corpus files:
+    python local_rag.py build ./corpus local_rag.idx --source-prefix gs://cv-rag-corpus/
+
+Query it:
+    python local_rag.py query local_rag.idx "esthetics evening schedule"
+"""
+import argparse
+import heapq
+import math
+import os
+import pickle
+import re
+import time
+from array import array
+
+INDEX_FORMAT_VERSION = 1
+CORPUS_EXTENSIONS = (".txt", ".md", ".json", ".csv")
+
+# Chunking mirrors the managed corpus defaults closely enough for ranking
+CHUNK_WORDS = 300
+CHUNK_OVERLAP = 50
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in is it its me my of on or our
+so that the their them then there these they this to was we what when where which
+who will with you your
+el la los las de del y o en un una que por para con es son se su sus al lo
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split a document into overlapping word windows."""
+    words = text.split()
+    if len(words) <= chunk_words:
+        return [" ".join(words)] if words else []
+    step = max(chunk_words - overlap, 1)
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words) - overlap, step)]
+
+
+class LocalRagIndex:
+    """BM25 inverted index with array-backed postings."""
+
+    def __init__(self, vocab, term_offsets, postings_docs, postings_tfs,
+                 doc_lengths, texts, sources):
+        self.vocab = vocab                  # term -> term id
+        self.term_offsets = term_offsets    # array('I'), len(vocab) + 1
+        self.postings_docs = postings_docs  # array('I'), doc ids grouped by term
+        self.postings_tfs = postings_tfs    # array('H'), tf for each posting
+        self.doc_lengths = doc_lengths      # array('I'), tokens per chunk
+        self.texts = texts
+        self.sources = sources
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    # ---------------- Build ----------------
+    @classmethod
+    def build(cls, documents):
+        """
+        Build an index from an iterable of (source_label, text) pairs.
+        Each document is chunked; every chunk is one retrievable unit.
+        """
+        term_postings = {}
+        doc_lengths = array("I")
+        texts, sources = [], []
+
+        for source, text in documents:
+            for chunk in chunk_text(text):
+                doc_id = len(texts)
+                tokens = tokenize(chunk)
+                counts = {}
+                for tok in tokens:
+                    counts[tok] = counts.get(tok, 0) + 1
+                for tok, tf in counts.items():
+                    term_postings.setdefault(tok, []).append((doc_id, min(tf, 0xFFFF)))
+                doc_lengths.append(len(tokens))
+                texts.append(chunk)
+                sources.append(source)
+
+        vocab = {}
+        term_offsets = array("I", [0])
+        postings_docs = array("I")
+        postings_tfs = array("H")
+        for term in sorted(term_postings):
+            vocab[term] = len(vocab)
+            for doc_id, tf in term_postings[term]:
+                postings_docs.append(doc_id)
+                postings_tfs.append(tf)
+            term_offsets.append(len(postings_docs))
+
+        return cls(vocab, term_offsets, postings_docs, postings_tfs, doc_lengths, texts, sources)
+
+    @classmethod
+    def build_from_directory(cls, corpus_dir, source_prefix=""):
+        """
+        Index every corpus file under `corpus_dir`. Source labels are
+        `source_prefix` + relative path, so a prefix like gs://bucket/ keeps
+        the same folder labels `_folder_from_uri` derives for Vertex results.
+        """
+        def _documents():
+            for root, _, files in os.walk(corpus_dir):
+                for name in sorted(files):
+                    if not name.lower().endswith(CORPUS_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, name)
+                    rel = os.path.relpath(path, corpus_dir).replace(os.sep, "/")
+                    with open(path, encoding="utf-8", errors="replace") as f:
+                        yield source_prefix + rel, f.read()
+
+        return cls.build(_documents())
+
+    # ---------------- Persistence ----------------
+    def save(self, path):
+        state = {
+            "version": INDEX_FORMAT_VERSION,
+            "vocab": self.vocab,
+            "term_offsets": self.term_offsets,
+            "postings_docs": self.postings_docs,
+            "postings_tfs": self.postings_tfs,
+            "doc_lengths": self.doc_lengths,
+            "texts": self.texts,
+            "sources": self.sources,
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported local RAG index version: {state.get('version')}")
+        return cls(state["vocab"], state["term_offsets"], state["postings_docs"],
+                   state["postings_tfs"], state["doc_lengths"], state["texts"], state["sources"])
+
+    # ---------------- Search ----------------
+    def search(self, query_text, top_k=10):
+        """
+        Return the top_k chunks for the query, best first, as
+        retrieveContexts-shaped dicts.
+        """
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+
+        scores = {}
+        avgdl = self.avg_doc_length or 1.0
+        for term in set(tokenize(query_text)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for i in range(start, end):
+                doc_id = self.postings_docs[i]
+                tf = self.postings_tfs[i]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+        return [
+            {"sourceUri": self.sources[doc_id], "text": self.texts[doc_id], "score": round(score, 4)}
+            for doc_id, score in best
+        ]
+
+    def stats(self):
+        return {
+            "chunks": len(self.texts),
+            "terms": len(self.vocab),
+            "postings": len(self.postings_docs),
+            "postings_bytes": (self.postings_docs.itemsize * len(self.postings_docs)
+                               + self.postings_tfs.itemsize * len(self.postings_tfs)),
+        }
+
+
+def load_index_if_present(path):
+    """Load the index at `path`, or return None if it has not been built."""
+    if path and os.path.exists(path):
+        return LocalRagIndex.load(path)
+    return None
+
+
+# ---------------- CLI ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the local BM25 RAG index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = sub.add_parser("build", help="index a directory of corpus files")
+    build_cmd.add_argument("corpus_dir")
+    build_cmd.add_argument("index_path")
+    build_cmd.add_argument("--source-prefix", default="",
+                           help="prepended to relative paths, e.g. gs://<bucket>/")
+
+    query_cmd = sub.add_parser("query", help="run one query against an index")
+    query_cmd.add_argument("index_path")
+    query_cmd.add_argument("query")
+    query_cmd.add_argument("--top-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = LocalRagIndex.build_from_directory(args.corpus_dir, args.source_prefix)
+        index.save(args.index_path)
+        print(f"Indexed {index.stats()} in {time.perf_counter() - start:.2f}s -> {args.index_path}")
+    else:
+        index = LocalRagIndex.load(args.index_path)
+        start = time.perf_counter()
+        results = index.search(args.query, args.top_k)
+        elapsed = (time.perf_counter() - start) * 1000
+        for r in results:
+            print(f"{r['score']:8.3f}  {r['sourceUri']}  {r['text'][:100]!r}")
+        print(f"{len(results)} results in {elapsed:.2f}ms")
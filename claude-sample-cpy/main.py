@@ -2,8 +2,9 @@ import os
 import time
 import re
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from flask import Request, jsonify, make_response
+from flask import Request, Response, jsonify, make_response, stream_with_context
 import functions_framework
 from markdown import markdown as md_to_html
 from selectolax.parser import HTMLParser
@@ -11,23 +12,43 @@ from datetime import datetime
 
 
 # Import your updated system prompt functions
-from systemprompt import get_system_prompt_for_request, detect_enrollment_completion_state, extract_contact_info
+from systemprompt import PROMPT_DATA_MODE, detect_enrollment_completion_state, extract_contact_info, detect_conversation_locations, detect_prompt_intents
 from vertexai import init
-from anthropic import AnthropicVertex
+from claude_pool import ClaudeRegionPool
+from admission import AdmissionController, OverloadedError
 from google.cloud import logging as cloud_logging
 from google.cloud import bigquery
 
-# NEW: auth for REST call to RAG
-import google.auth
-from google.auth.transport.requests import AuthorizedSession
+# Pooled, credential-caching transport for REST calls to RAG
+from rag_client import RagClient, RagRetrievalError
+from rag_cache import RetrievalCache
+from local_rag import load_index_if_present
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from structured_context import build_structured_contexts
+from retrieval_policy import REUSE, RETRIEVE, SKIP, RetrievalDecisionStats, ThreadSnippetStore, classify_retrieval_need
+from rag_postprocess import chunk_text, dedupe_chunks, filter_chunks_by_campus, pack_snippets, rerank_chunks
 from vertexai.preview.generative_models import GenerativeModel
 from vertexai import init as vertex_init
+from token_budget import estimate_tokens, message_tokens, pack_history
+from model_routing import ModelLatencyStats, route_model
+from streaming import PlaintextBlockStream, sse_event
+from summary_store import RollingSummarizer, get_summary_store
+from prompt_cache import build_system_blocks, cache_usage, prefix_fingerprint, system_prompt_length
+from scripted_responses import CLOSING_SCRIPTS, ScriptedReplyStats, scripted_reply
+from guardrails import GuardrailEngine
+from prompt_templates import PromptTemplateEngine
+from prompt_pruning import PROMPT_PRUNING_ENABLED, PromptPruner
+from data_store import data_store
+from schedule_index import get_schedule_index
+from schedule_selection import SCHEDULE_SELECTION_ENABLED, ScheduleSelector, selection_metrics
+from schedule_tools import (
+    MAX_TOOL_ROUNDS, TOOLS_ENABLED, add_usage, continue_with_tool_results, create_with_tools, tool_round_params,
+)
 
 # ---------------- Optimized Config ----------------
 PROJECT_ID = os.getenv("GCP_PROJECT", "christinevalmy")
 REGION = os.environ.get("FUNCTION_REGION", "us-east5")
 RAG_REGION = os.environ.get("RAG_REGION", "us-central1")
-MODEL = os.environ.get("MODEL", "claude-3-7-sonnet@20250219")  # Using stable, fast model
 CORPUS_RESOURCE = os.environ.get(
     "RAG_CORPUS",
     "projects/christinevalmy/locations/us-central1/ragCorpora/5685794529555251200"#8070450532247928832
@@ -35,33 +56,103 @@ CORPUS_RESOURCE = os.environ.get(
 
 # Optimized for better context + speed balance
 USE_SUMMARIZER = True
-MAX_TURNS = 15  # Increased for better context retention
-RAG_TOP_K = 10   # Reduced for speed while maintaining quality
+# History is packed newest-first into a per-stage input-token budget; what
+# doesn't fit goes to the rolling summary (see build_optimized_history)
+HISTORY_MAX_MESSAGES = int(os.environ.get("HISTORY_MAX_MESSAGES", "60"))  # hard cap on what app accepts
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "6000"))
+HISTORY_STAGE_BUDGETS = {
+    "completion": 800,
+    "post_enrollment": 2500,
+    "enrollment_ready": 3000,
+    "enrollment_collection": 3000,
+}
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", "10"))   # Reduced for speed while maintaining quality
+RAG_MAX_SNIPPETS = int(os.environ.get("RAG_MAX_SNIPPETS", "5"))  # upper bound on chunks sent to Claude
 RAG_SNIPPET_LENGTH = 2500  # Shorter snippets for faster processing
+# Token budget for context_str; defaults to the old 3 x RAG_SNIPPET_LENGTH chars
+RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", str(estimate_tokens("x" * 3 * RAG_SNIPPET_LENGTH))))
+# Retrieval backend: "vertex" (managed RAG), "local" (BM25 over a corpus
+# snapshot, see local_rag.py) or "auto" (vertex, falling back to local on errors)
+RAG_BACKEND = os.environ.get("RAG_BACKEND", "auto")
+LOCAL_RAG_INDEX = os.environ.get("LOCAL_RAG_INDEX", os.path.join(os.path.dirname(__file__), "local_rag.idx"))
+# Shared secret that lets the corpus import job drop cached retrieval results
+RAG_CACHE_ADMIN_TOKEN = os.environ.get("RAG_CACHE_ADMIN_TOKEN")
 
 # ---------------- Init ----------------
 init(project=PROJECT_ID, location=REGION)
-anthropic_client = AnthropicVertex(region=REGION, project_id=PROJECT_ID)
-# anthropic_client = get_client(region=REGION, project_id=PROJECT_ID)
-
-# def get_client(region=REGION, project_id=PROJECT_ID):
-#     # call all models health-check
-#     # return the active model
-#     try:
-#         return AnthropicVertex(region=REGION, project_id=PROJECT_ID)
-#     except:
-#         pass
-
 vertex_init(project=PROJECT_ID, location="us-central1")
 flash_model = GenerativeModel("claude-3-7-sonnet@20250219")
 
 logging_client = cloud_logging.Client()
 logger = logging_client.logger("claude-conversations")
+
+# Claude clients across CLAUDE_REGIONS (defaults to REGION), health-scored with failover
+claude_pool = ClaudeRegionPool(project_id=PROJECT_ID, logger=logger)
+# Every Claude call is admitted here first: concurrency cap, token rate, bounded queue
+admission = AdmissionController()
+
+# One retrieval client per instance: keep-alive pool + background token refresh
+rag_client = RagClient(project_id=PROJECT_ID, region=RAG_REGION, logger=logger)
+# Per-instance TTL/LRU cache of retrieveContexts results
+rag_cache = RetrievalCache()
+# Rolling per-model latency, logged with each call to tune the routing table
+model_latency = ModelLatencyStats()
+# Fails retrieval fast while Vertex RAG is degraded, see fetch_rag_contexts
+rag_breaker = CircuitBreaker("vertex_rag", logger=logger)
+# Retrieval-necessity decisions per stage, and each thread's last snippets for reuse
+retrieval_stats = RetrievalDecisionStats()
+thread_snippets = ThreadSnippetStore()
+scripted_stats = ScriptedReplyStats()
+guardrails = GuardrailEngine()
+prompt_templates = PromptTemplateEngine()
+prompt_pruner = PromptPruner()
+schedule_selector = ScheduleSelector()
+
+
+def log_data_load(snapshot, error):
+    """Log each schedule/pricing data load, with rows that look wrong (duplicates, end before start, weekday mismatch)."""
+    if error is not None:
+        logger.log_struct({
+            "event": "data_reload_failed",
+            "error": str(error),
+            "serving_generation": snapshot.generation if snapshot else None,
+        }, severity="WARNING")
+        return
+    index = get_schedule_index(snapshot)
+    issues = index.check()
+    logger.log_struct({
+        "event": "data_loaded",
+        "data_generation": snapshot.generation,
+        "data_versions": snapshot.versions,
+        **index.stats(),
+        "issues": [issue._asdict() for issue in issues],
+    }, severity="WARNING" if issues else "INFO")
+
+
+data_store.add_listener(log_data_load)
+# Load and validate the data files now rather than on the first request
+data_store.snapshot()
+# Local BM25 index over a mirrored corpus snapshot (None if not built/deployed)
+local_rag_index = load_index_if_present(LOCAL_RAG_INDEX) if RAG_BACKEND in ("local", "auto") else None
 bq_client = bigquery.Client()
 BQ_TABLE = f"{PROJECT_ID}.assistant_logs.claude_conversations"
 
 # Thread pool for async operations
 executor = ThreadPoolExecutor(max_workers=3)
+# Separate pool for request-path work (retrieval, history summarization) so it
+# never queues behind background BigQuery inserts
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "16"))
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+# Rolling-summary updates are multi-second Claude calls: their own small pool,
+# with a cap on queued updates so a burst can't pile up behind it (a skipped
+# update is folded in on the thread's next turn)
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "2"))
+SUMMARY_MAX_PENDING = int(os.environ.get("SUMMARY_MAX_PENDING", "32"))
+summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
+summary_slots = threading.BoundedSemaphore(SUMMARY_MAX_PENDING)
+
+# Fetch the RAG token at cold start instead of on the first user message
+executor.submit(rag_client.warm)
 
 def log_to_bigquery(row: dict):
     """Insert a row into BigQuery asynchronously."""
@@ -96,193 +187,295 @@ def md_to_plaintext(md: str) -> str:
     body = tree.body or tree.root
     return body.text(separator="\n").replace("\\u2019", "'").replace("\\u2014", "—").strip()
 
-# --------- Optimized Completion Detection ----------------
-def ultra_fast_completion_check(user_query, history):
+# --------- Smart RAG Retrieval ----------------
+def invalidate_rag_cache(corpus_resource=None):
     """
-    Ultra-fast completion detection with minimal processing
+    Drop cached retrieval results, e.g. after re-importing files into the corpus.
     """
-    user_query_lower = user_query.lower().strip()
-    
-    # Remove topic prefix if present
-    if user_query_lower.startswith("[topic:"):
-        user_query_lower = user_query_lower.split("]", 1)[1].strip() if "]" in user_query_lower else user_query_lower
-    
-    # Quick completion signals (expanded list)
-    completion_signals = {
-        "thanks", "thank you", "nope", "no", "sounds good", "that's correct", 
-        "im good", "i'm good", "that's all", "nothing else", "looks good", 
-        "perfect", "ok", "okay", "cool", "great", "awesome", "yep", "yes that's correct"
-    }
-    
-    # Fast exact match check
-    if user_query_lower in completion_signals:
-        # Quick scan for contact info in last 8 messages (much faster than full history)
-        recent_messages = history[-8:] if len(history) > 8 else history
-        recent_text = " ".join([
-            msg.get("content", [{}])[0].get("text", "")[:200]  # Only check first 200 chars
-            for msg in recent_messages if msg.get("content")
-        ])
-        
-        # Fast contact detection
-        has_email = "@" in recent_text
-        has_digits = sum(1 for c in recent_text if c.isdigit()) >= 7
-        has_enrollment = "enrollment" in recent_text.lower()
-        
-        return has_email and has_digits and has_enrollment
-    
-    return False
+    removed = rag_cache.invalidate(corpus_resource)
+    logger.log_struct({"event": "rag_cache_invalidated", "corpus": corpus_resource, "removed": removed}, severity="INFO")
+    return removed
 
-# --------- Smart RAG Retrieval ----------------
-def smart_retrieve_from_rag(query_text: str, conversation_stage: str = "active"):
+def _is_rag_dependency_failure(e: Exception):
+    """Client errors (bad request, permissions) don't mean Vertex RAG is degraded."""
+    if isinstance(e, RagRetrievalError):
+        return e.status == 429 or e.status >= 500
+    return True
+
+def fetch_rag_contexts(query_text: str, top_k: int, metrics: dict, history=None):
     """
-    Intelligent RAG retrieval based on conversation stage
+    Return raw retrieval contexts from the configured backend, cache first.
+    Local BM25 results are cheap and are not cached. While the Vertex RAG
+    circuit is open, context comes from the local index (if deployed) plus
+    the in-repo schedule and pricing data.
+    """
+    if RAG_BACKEND == "local" and local_rag_index is not None:
+        metrics["rag_backend"] = "local"
+        return local_rag_index.search(query_text, top_k)
+
+    items = rag_cache.get(query_text, top_k, CORPUS_RESOURCE)
+    metrics["rag_cache_hit"] = items is not None
+    metrics["rag_backend"] = "vertex"
+    if items is None:
+        try:
+            items = rag_breaker.call(
+                rag_client.retrieve_contexts_hedged, CORPUS_RESOURCE, query_text, top_k, metrics,
+                is_failure=_is_rag_dependency_failure
+            )
+        except CircuitOpenError:
+            metrics["rag_backend"] = "structured_fallback"
+            items = local_rag_index.search(query_text, top_k) if local_rag_index is not None else []
+            return items + build_structured_contexts(query_text, history)
+        except Exception as e:
+            if local_rag_index is None:
+                raise
+            # Managed endpoint slow or down: keep answering from the local snapshot
+            logger.log_struct({"event": "rag_local_fallback", "detail": str(e)}, severity="WARNING")
+            metrics["rag_backend"] = "local_fallback"
+            return local_rag_index.search(query_text, top_k)
+        finally:
+            metrics["rag_circuit"] = rag_breaker.snapshot()
+        rag_cache.set(query_text, top_k, CORPUS_RESOURCE, items)
+    metrics["rag_cache"] = rag_cache.stats()
+    return items
+
+def fetch_rag_contexts_safely(query_text: str, top_k: int, metrics: dict, history=None):
+    """
+    fetch_rag_contexts that logs failures and returns no contexts instead of raising.
+    """
+    try:
+        return fetch_rag_contexts(query_text, top_k, metrics, history)
+    except RagRetrievalError as e:
+        logger.log_struct(
+            {"event": "retrieval_error", "status": e.status},
+            severity="WARNING"
+        )
+        return []
+    except Exception as e:
+        logger.log_struct({"event": "rag_error", "detail": str(e)}, severity="WARNING")
+        return []
+
+def rag_top_k_for_stage(conversation_stage: str):
+    """
+    Number of retrieved contexts worth considering for a conversation stage
     """
-    # Skip RAG for certain completion scenarios
-    if conversation_stage == "completion":
-        return [], []
-    
     # Reduce RAG calls for post-enrollment stages
     if conversation_stage in ["post_enrollment", "enrollment_collection"]:
-        top_k = 3
-    else:
-        top_k = RAG_TOP_K
-    
-    try:
-        creds, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
-        session = AuthorizedSession(creds)
+        return 3
+    return RAG_TOP_K
+
+def select_rag_snippets(items, query_text: str, top_k: int, metrics=None, history=None):
+    """
+    Drop chunks from the wrong campus for the program being discussed, rerank
+    the rest by weighted query/program/date terms, drop near-duplicates and
+    pack the best into RAG_CONTEXT_TOKEN_BUDGET as the snippets and sources
+    sent to Claude
+    """
+    locations = detect_conversation_locations(query_text, history)
+    candidates, campus_removed = filter_chunks_by_campus(items[:top_k], locations)
+    ranked = rerank_chunks(candidates, query_text, keep=len(candidates))
+    ranked, duplicates = dedupe_chunks(ranked)
+    packed, context_tokens = pack_snippets(ranked, RAG_CONTEXT_TOKEN_BUDGET, RAG_MAX_SNIPPETS)
+
+    snippets, sources = [], []
+    for text, c in packed:
+        snippets.append(text)
+        src = c.get("sourceUri") or c.get("sourceDisplayName") or "unknown_source"
+        folder = _folder_from_uri(src)
+        sources.append({"label": src, **({"folder": folder} if folder else {})})
 
-        url = (
-            f"https://{RAG_REGION}-aiplatform.googleapis.com/v1beta1/"
-            f"projects/{PROJECT_ID}/locations/{RAG_REGION}:retrieveContexts"
+    if metrics is not None:
+        metrics["rag_candidates"] = len(items[:top_k])
+        metrics["rag_scores"] = [score for score, _ in ranked[:len(packed)]]
+        metrics["rag_campus"] = sorted(locations)
+        metrics["rag_campus_removed"] = campus_removed
+        metrics["rag_duplicates_removed"] = len(duplicates)
+        # Tokens the duplicates would have cost had they been packed instead
+        metrics["rag_tokens_saved"] = min(
+            sum(estimate_tokens(chunk_text(c)) for _, c in duplicates), RAG_CONTEXT_TOKEN_BUDGET
         )
-        payload = {
-            "vertex_rag_store": {
-                "rag_resources": {
-                    "rag_corpus": CORPUS_RESOURCE
-                }
-            },
-            "query": {
-                "text": query_text,
-                "similarity_top_k": top_k
-            }
-        }
+        metrics["rag_context_tokens"] = context_tokens
+        metrics["rag_context_budget"] = RAG_CONTEXT_TOKEN_BUDGET
 
-        resp = session.post(url, json=payload, timeout=20)  # Reduced timeout
-        if resp.status_code != 200:
-            logger.log_struct(
-                {"event": "retrieval_error", "status": resp.status_code},
-                severity="WARNING"
-            )
-            return [], []
-
-        data = resp.json() or {}
-        items = data.get("contexts", {}).get("contexts", [])
-        snippets, sources = [], []
-
-        # Smart relevance filtering with schedule priority
-        relevance_keywords = [
-            query_text.lower(), 'esthetic', 'nail', 'wax', 'makeup', 'barbering',
-            'program', 'course', 'schedule', 'start date', 'start dates', 'when',
-            'price', 'tuition', 'admission', 'enrollment', 'financial aid',
-            '2025', 'january', 'february', 'march', 'april', 'may', 'june',
-            'july', 'august', 'september', 'october', 'november', 'december'
-        ]
-
-        for c in items[:top_k]:
-            text = (c.get("chunk") or {}).get("text") or c.get("text") or ""
-            if text.strip():
-                # Quick relevance check
-                text_lower = text.lower()
-                if any(keyword in text_lower for keyword in relevance_keywords):
-                    snippets.append(text.strip()[:RAG_SNIPPET_LENGTH])
-            
-            src = c.get("sourceUri") or c.get("sourceDisplayName") or "unknown_source"
-            folder = _folder_from_uri(src)
-            sources.append({"label": src, **({"folder": folder} if folder else {})})
+    return snippets, sources
 
-        return snippets[:3], sources[:3]  # Limit to top 3 for speed
+def smart_retrieve_from_rag(query_text: str, conversation_stage: str = "active", metrics=None, history=None):
+    """
+    Intelligent RAG retrieval based on conversation stage.
+    If a `metrics` dict is passed, retrieval details (cache stats) are added to it.
+    """
+    if metrics is None:
+        metrics = {}
 
-    except Exception as e:
-        logger.log_struct({"event": "rag_error", "detail": str(e)}, severity="WARNING")
+    # Skip RAG for certain completion scenarios
+    if conversation_stage == "completion":
         return [], []
+    
+    top_k = rag_top_k_for_stage(conversation_stage)
+    items = fetch_rag_contexts_safely(query_text, top_k, metrics, history)
+    return select_rag_snippets(items, query_text, top_k, metrics, history)
 
 # --------- Optimized History Management ----------------
-def build_optimized_history(raw_history, base_prompt: str, conversation_stage: str = "active"):
+HISTORY_KEYWORDS = [
+    'esthetic', 'nail', 'wax', 'makeup', 'program', 'course',
+    'new york', 'new jersey', 'ny', 'nj', 
+    'full time', 'part time', 'evening', 'weekend',
+    'price', 'cost', 'tuition', 'financial aid',
+    'name', 'email', 'phone', 'contact', '@', 'enrollment'
+]
+
+def summarize_messages(previous_summary, new_messages):
     """
-    Smart history management based on conversation stage (Claude-only version).
-    Uses Claude for summarization instead of Gemini.
+    Fold newly aged-out messages into a thread's summary with Claude.
+    Only called in the background, see update_thread_summary.
     """
-    if conversation_stage == "completion":
-        # Minimal history for completion
-        recent = raw_history[-3:]
-    else:
-        # Full history management for active conversation
-        older = raw_history[:-MAX_TURNS]
-        recent = raw_history[-MAX_TURNS:]
+    # Smarter conversation filtering for summarization
+    key_exchanges = []
+    for m in new_messages:
+        if m.get("content"):
+            text = m['content'][0]['text']
+            # Prioritize enrollment-relevant content
+            if any(keyword in text.lower() for keyword in HISTORY_KEYWORDS):
+                key_exchanges.append(f"{m['role']}: {text[:300]}")  # Limit length
 
-    messages = []
+    if not key_exchanges:
+        return previous_summary or ""
 
-    # Only summarize if we have significant older history
-    if conversation_stage != "completion" and older and len(older) > 3:
-        try:
-            # Smarter conversation filtering for summarization
-            key_exchanges = []
-            for m in older:
-                if m.get("content"):
-                    text = m['content'][0]['text']
-                    # Prioritize enrollment-relevant content
-                    if any(keyword in text.lower() for keyword in [
-                        'esthetic', 'nail', 'wax', 'makeup', 'program', 'course',
-                        'new york', 'new jersey', 'ny', 'nj', 
-                        'full time', 'part time', 'evening', 'weekend',
-                        'price', 'cost', 'tuition', 'financial aid',
-                        'name', 'email', 'phone', 'contact', '@', 'enrollment'
-                    ]):
-                        key_exchanges.append(f"{m['role']}: {text[:300]}")  # Limit length
-            
-            if key_exchanges:
-                convo_text = "\n".join(key_exchanges[-6:])  # Last 6 relevant exchanges
-                prompt = f"""
-                Summarize key enrollment details in 2 sentences:
+    convo_text = "\n".join(key_exchanges)
+    prompt = f"""
+                Update the summary of key enrollment details in 2 sentences:
                 - Program interest and location
                 - Contact info status
                 
-                Conversation:
+                Previous summary:
+                {previous_summary or "None"}
+                
+                New conversation:
                 {convo_text}
                 """
 
-                # ✅ Claude call instead of Gemini
-                resp = anthropic_client.messages.create(
-                    model=MODEL,  # e.g. "claude-3-7-sonnet@20250219"
-                    system="You are a helpful assistant that summarizes conversations.",
-                    messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-                    max_tokens=200,
-                    temperature=0.1
-                )
-                summary_text = resp.content[0].text.strip()
+    route_name, params = get_optimized_claude_params(None, 0, task="summarize")
+    with admission.admit(estimate_tokens(prompt) + params["max_tokens"]) as ticket:
+        start = time.time()
+        resp, region = claude_pool.create(
+            system="You are a helpful assistant that summarizes conversations.",
+            messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+            **params
+        )
+        latency = round(time.time() - start, 3)
+        ticket.settle(usage_tokens(resp.usage))
+    logger.log_struct({
+        "event": "model_call",
+        "model_route": route_name,
+        "model": params["model"],
+        "region": region,
+        "latency": latency,
+        **model_latency.record(params["model"], latency)
+    }, severity="INFO")
+    return resp.content[0].text.strip()
 
-                messages.append({
-                    "role": "user",
-                    "content": [{"type": "text", "text": f"Context: {summary_text}"}]
-                })
-        except Exception as e:
-            logger.log_struct({"event": "claude_summary_error", "detail": str(e)}, severity="WARNING")
-            # Fallback: include simple key terms
-            key_terms = set()
-            for m in older[-5:]:  # Only check last 5 for speed
-                if m.get("content"):
-                    text = m['content'][0]['text'].lower()
-                    if 'esthetic' in text: key_terms.add('esthetics')
-                    if 'nail' in text: key_terms.add('nails')
-                    if 'new york' in text or 'ny' in text: key_terms.add('NY campus')
-                    if 'new jersey' in text or 'nj' in text: key_terms.add('NJ campus')
-                    if '@' in text: key_terms.add('email provided')
-            
-            if key_terms:
-                messages.append({
-                    "role": "user",
-                    "content": [{"type": "text", "text": f"Context: {', '.join(key_terms)}"}]
-                })
+def usage_tokens(usage):
+    """Input (cached or not) plus output tokens of a finished call."""
+    counts = cache_usage(usage)
+    return counts["actual_input_tokens"] + counts["output_tokens"]
+
+def key_terms_context(older):
+    """Cheap stand-in for a summary: key terms from the last few older messages."""
+    key_terms = set()
+    for m in older[-5:]:  # Only check last 5 for speed
+        if m.get("content"):
+            text = m['content'][0]['text'].lower()
+            if 'esthetic' in text: key_terms.add('esthetics')
+            if 'nail' in text: key_terms.add('nails')
+            if 'new york' in text or 'ny' in text: key_terms.add('NY campus')
+            if 'new jersey' in text or 'nj' in text: key_terms.add('NJ campus')
+            if '@' in text: key_terms.add('email provided')
+    return ', '.join(key_terms)
+
+# Per-thread rolling summaries (SUMMARY_STORE=memory|sqlite), updated off the request path
+thread_summaries = RollingSummarizer(get_summary_store(), summarize_messages)
+
+def history_budget_for_stage(stage):
+    """Input-token budget for verbatim history in this stage."""
+    return HISTORY_STAGE_BUDGETS.get(stage, HISTORY_TOKEN_BUDGET)
+
+def split_history(raw_history, conversation_stage):
+    """(older, recent, recent_tokens) for the stage's history budget."""
+    if conversation_stage == "completion":
+        # Minimal history for completion
+        return pack_history(raw_history, history_budget_for_stage(conversation_stage), max_messages=3)
+    return pack_history(raw_history, history_budget_for_stage(conversation_stage))
+
+def update_thread_summary(thread_id, raw_history, conversation_stage):
+    """Background job: fold this thread's newly aged-out messages into its stored summary."""
+    older, recent, _ = split_history(raw_history, conversation_stage)
+    if len(older) <= 3:
+        return
+    start = time.time()
+    try:
+        folded = thread_summaries.update(thread_id, older, recent)
+        if folded:
+            logger.log_struct({
+                "event": "summary_updated",
+                "thread_id": thread_id,
+                "messages_folded": folded,
+                "latency": round(time.time() - start, 3)
+            }, severity="INFO")
+    except Exception as e:
+        logger.log_struct({"event": "claude_summary_error", "thread_id": thread_id, "detail": str(e)}, severity="WARNING")
+
+def schedule_summary_update(thread_id, history, user_query, answer_text, conversation_stage):
+    """
+    Queue the summary update after the response. This turn's exchange is
+    appended so the summary already covers what ages out on the next turn.
+    """
+    if not USE_SUMMARIZER or conversation_stage == "completion":
+        return
+    next_history = history + [
+        {"role": "user", "content": [{"type": "text", "text": user_query}]},
+        {"role": "assistant", "content": [{"type": "text", "text": answer_text}]},
+    ]
+    if not summary_slots.acquire(blocking=False):
+        logger.log_struct({"event": "summary_update_skipped", "thread_id": thread_id,
+                           "max_pending": SUMMARY_MAX_PENDING}, severity="WARNING")
+        return
+    future = summary_executor.submit(update_thread_summary, thread_id, next_history, conversation_stage)
+    future.add_done_callback(lambda _: summary_slots.release())
+
+def build_optimized_history(raw_history, base_prompt: str, conversation_stage: str = "active", thread_id=None, metrics=None):
+    """
+    Smart history management based on conversation stage.
+    The newest messages that fit the stage's token budget are sent verbatim.
+    Older ones are represented by the thread's stored rolling summary (no
+    model call here); aged-out messages the summary doesn't cover yet are
+    reduced to key terms.
+    """
+    metrics = metrics if metrics is not None else {}
+    older, recent, recent_tokens = split_history(raw_history, conversation_stage)
+    metrics["history_budget"] = history_budget_for_stage(conversation_stage)
+    metrics["history_tokens"] = recent_tokens
+    metrics["history_messages"] = len(recent)
+    metrics["history_older"] = len(older)
+
+    messages = []
+
+    # Only summarize if we have significant older history
+    if conversation_stage != "completion" and len(older) > 3:
+        summary_text, pending = thread_summaries.read(thread_id, older, recent)
+        metrics["summary_hit"] = bool(summary_text)
+        metrics["summary_pending"] = len(pending)
+        if summary_text:
+            messages.append({
+                "role": "user",
+                "content": [{"type": "text", "text": f"Context: {summary_text}"}]
+            })
+        # Summary missing or one turn behind: key terms for what it doesn't cover
+        key_terms = key_terms_context(pending)
+        if key_terms:
+            messages.append({
+                "role": "user",
+                "content": [{"type": "text", "text": f"Context: {key_terms}"}]
+            })
 
     # Add recent conversation turns
     for m in recent:
@@ -298,7 +491,6 @@ def build_optimized_history(raw_history, base_prompt: str, conversation_stage: s
 
     return messages
 
-# --------- Conversation State Analysis ----------------
 def analyze_conversation_state(history, user_query):
     """
     Fast conversation state analysis
@@ -336,27 +528,132 @@ def analyze_conversation_state(history, user_query):
         return "active"  # Fallback to active state
 
 # --------- Optimized Claude Parameters ----------------
-def get_optimized_claude_params(conversation_stage, user_query_length):
+def get_optimized_claude_params(conversation_stage, user_query_length, task="reply"):
+    """
+    Model and parameters for a Claude call, chosen by task ("reply",
+    "summarize") and conversation stage from the routing table in
+    model_routing.py. Returns (route_name, params) with params["model"] set.
     """
-    Dynamic Claude parameters based on conversation state and query complexity
+    return route_model(task, conversation_stage, user_query_length)
+
+# --------- Concurrent Request Pipeline ----------------
+DATE_VALIDATION_SUFFIX = "\n\nCRITICAL DATE VALIDATION: Today's date is {today}. MANDATORY REQUIREMENTS: 1) VERIFY every date from RAG context is after today before displaying, 2) Show EXACTLY TWO upcoming future start dates only, 3) Check conversation history to avoid repeating identical schedule information, 4) If RAG lacks future dates, request current information. NEVER guess or assume dates."
+
+def _timed(fn, *args):
+    """Run fn(*args) and return (result, elapsed seconds)."""
+    start = time.time()
+    result = fn(*args)
+    return result, round(time.time() - start, 3)
+
+def run_request_pipeline(history, user_query: str, on_stage=None, thread_id=None, conversation_stage=None, latency_stage=0.0):
     """
-    base_params = {
-        "temperature": 0.2,
-        "top_p": 0.8
+    Prepare everything the main Claude call needs, overlapping the network waits.
+
+    The stage is analyzed first (a few ms of string checks) so the retrieval
+    classifier can skip retrieval, or reuse the thread's previous snippets,
+    on turns that need no new knowledge. Otherwise retrieval starts right
+    away and runs alongside history building. Both are joined before the system prompt is
+    finalized. `on_stage(stage)` is called as soon as the stage is known; a
+    stage the caller already analyzed can be passed in.
+    """
+    start_pipeline = time.time()
+    rag_metrics = {}
+
+    if conversation_stage is None:
+        conversation_stage, latency_stage = _timed(analyze_conversation_state, history, user_query)
+
+    decision, reason = classify_retrieval_need(conversation_stage, user_query)
+    reused = thread_snippets.get(thread_id) if decision == REUSE else None
+    if decision == REUSE and reused is None:
+        decision, reason = SKIP, f"{reason}_nothing_to_reuse"
+    rag_metrics["rag_decision"] = decision
+    rag_metrics["rag_decision_reason"] = reason
+    rag_metrics["rag_stage_decisions"] = retrieval_stats.record(conversation_stage, decision)
+
+    rag_future = None
+    if decision == RETRIEVE:
+        top_k = rag_top_k_for_stage(conversation_stage)
+        rag_future = pipeline_executor.submit(_timed, fetch_rag_contexts_safely, user_query, top_k, rag_metrics, history)
+
+    if on_stage:
+        on_stage(conversation_stage)
+
+    base_prompt = f"User question: {user_query}"
+    history_metrics = {}
+    history_future = pipeline_executor.submit(_timed, build_optimized_history, history, base_prompt, conversation_stage, thread_id, history_metrics)
+
+    # Join retrieval
+    start_rag_wait = time.time()
+    if rag_future is not None:
+        items, latency_retrieve = rag_future.result()
+        snippets, sources = select_rag_snippets(items, user_query, top_k, rag_metrics, history)
+        thread_snippets.set(thread_id, snippets, sources)
+    elif reused is not None:
+        snippets, sources = reused
+        latency_retrieve = 0.0
+    else:
+        snippets, sources, latency_retrieve = [], [], 0.0
+    latency_rag_wait = round(time.time() - start_rag_wait, 3)
+
+    context_str = "\n\n---\n".join(snippets)
+
+    # Get optimized system prompt with RAG context integrated
+    start_prompt = time.time()
+    prompt_state = prompt_templates.analyze(history, user_query)
+    prompt_intents = detect_prompt_intents(history, user_query)
+    pruned = prompt_pruner.prune(prompt_state.stage, prompt_state.language, prompt_intents)
+    # Only the sections this stage, language and question need; the full prefix otherwise
+    static_prefix = pruned.prefix if PROMPT_PRUNING_ENABLED else prompt_templates.static_prefix
+    pruning_metrics = prompt_pruner.metrics(pruned, prompt_intents)
+    dynamic_suffix = prompt_templates.render(prompt_state, history, context_str)
+    schedule_metrics = {}
+    if SCHEDULE_SELECTION_ENABLED:
+        # Only the upcoming rows for this conversation, not whole schedule dicts
+        selection = schedule_selector.select(history, user_query, prompt_state.language)
+        schedule_metrics = selection_metrics(selection, static_prefix, dynamic_suffix)
+        dynamic_suffix += selection.section
+    dynamic_suffix += DATE_VALIDATION_SUFFIX.format(today=datetime.now().strftime('%Y-%m-%d'))
+    # Static prefix first and marked cacheable; everything per-turn after it
+    system_prompt = build_system_blocks(static_prefix, dynamic_suffix)
+    latency_prompt = round(time.time() - start_prompt, 3)
+
+    # Join history building
+    start_history_wait = time.time()
+    messages, latency_history = history_future.result()
+    latency_history_wait = round(time.time() - start_history_wait, 3)
+    history_metrics.update(schedule_metrics)
+    history_metrics.update(pruning_metrics)
+
+    # Local estimate, logged next to the actual usage to calibrate CHARS_PER_TOKEN
+    history_metrics["estimated_input_tokens"] = (
+        sum(estimate_tokens(block["text"]) for block in system_prompt)
+        + sum(message_tokens(m) for m in messages)
+    )
+
+    latency_pipeline = round(time.time() - start_pipeline, 3)
+    sequential = latency_stage + latency_retrieve + latency_history + latency_prompt
+
+    return {
+        "conversation_stage": conversation_stage,
+        "snippets": snippets,
+        "sources": sources,
+        "system_prompt": system_prompt,
+        "prompt_prefix_hash": prefix_fingerprint(static_prefix),
+        "messages": messages,
+        "rag_metrics": rag_metrics,
+        "history_metrics": history_metrics,
+        "timings": {
+            "stage_latency": latency_stage,
+            "rag_latency": latency_retrieve,
+            "rag_wait_latency": latency_rag_wait,
+            "history_latency": latency_history,
+            "history_wait_latency": latency_history_wait,
+            "prompt_latency": latency_prompt,
+            "pipeline_latency": latency_pipeline,
+            # Time saved versus running the phases one after the other
+            "pipeline_overlap": round(max(sequential - latency_pipeline, 0.0), 3)
+        }
     }
-    
-    if conversation_stage == "completion":
-        return {**base_params, "max_tokens": 100, "temperature": 0.1}
-    elif conversation_stage == "post_enrollment":
-        return {**base_params, "max_tokens": 200, "temperature": 0.2}
-    elif conversation_stage == "enrollment_collection":
-        return {**base_params, "max_tokens": 300, "temperature": 0.2}
-    elif conversation_stage in ["pricing", "payment_options"]:
-        return {**base_params, "max_tokens": 400, "temperature": 0.2}
-    elif user_query_length < 20:  # Short queries
-        return {**base_params, "max_tokens": 250}
-    else:  # Longer, complex queries
-        return {**base_params, "max_tokens": 350}
 
 # ---------------- Main HTTP Entry ----------------
 @functions_framework.http
@@ -365,10 +662,18 @@ def app(request: Request):
     
     try:
         data = request.get_json(silent=True) or {}
+
+        # Corpus re-imported: {"action": "invalidate_rag_cache", "admin_token": ..., "corpus": optional}
+        if data.get("action") == "invalidate_rag_cache":
+            if not RAG_CACHE_ADMIN_TOKEN or data.get("admin_token") != RAG_CACHE_ADMIN_TOKEN:
+                return make_response(jsonify(error="forbidden"), 403)
+            removed = invalidate_rag_cache(data.get("corpus"))
+            return make_response(jsonify(invalidated=removed), 200)
+
         user_id = data.get("user_id", "unknown")
         thread_id = data.get("thread_id", "unknown")
         user_agent = data.get("user_agent", "unknown")
-        history = (data.get("history") or [])[-30:]  # Limit history window for performance
+        history = (data.get("history") or [])[-HISTORY_MAX_MESSAGES:]  # Token budget trims further, see pack_history
 
         user_query = (data.get("query") or data.get("message") or data.get("text") or "").strip()
         
@@ -376,95 +681,288 @@ def app(request: Request):
         if user_query.startswith("[TOPIC:"):
             user_query = user_query.split("]", 1)[1].strip() if "]" in user_query else user_query
         
-        # Ultra-fast completion check
-        if ultra_fast_completion_check(user_query, history):
-            completion_message = "Perfect! Thank you for your interest in Christine Valmy International School. Our enrollment advisor will reach out to you soon. We look forward to welcoming you to the Christine Valmy family!"
-            
+        def _log_user_message(conversation_stage):
             logger.log_struct({
-                "event": "ultra_fast_completion",
+                "event": "user_message",
                 "user_id": user_id,
                 "thread_id": thread_id,
                 "message": user_query,
-                "user_agent": user_agent,           
-                "total_latency": round(time.time() - start_total, 3)
+                "conversation_stage": conversation_stage,
+                "user_agent": user_agent,  
+                "role": "user"
             }, severity="INFO")
-            
+
+            # Async BigQuery logging for user message
+            log_to_bigquery({
+                "user_id": user_id,
+                "thread_id": thread_id,
+                "role": "user",
+                "message": user_query,
+                "model": None,
+                "user_agent": user_agent,
+                "latency_sec": None
+            })
+
+        def _local_reply(event, model_name, reply_text, conversation_stage, should_complete, performance):
+            """Answer without retrieval or Claude (guardrail and scripted replies)."""
+            _log_user_message(conversation_stage)
+            total_latency = round(time.time() - start_total, 3)
+
+            logger.log_struct({
+                "event": event,
+                "user_id": user_id,
+                "thread_id": thread_id,
+                "message": reply_text,
+                "role": "assistant",
+                "model": model_name,
+                "user_agent": user_agent,
+                "conversation_stage": conversation_stage,
+                "performance": {
+                    "total_latency": total_latency,
+                    **performance
+                }
+            }, severity="INFO")
+
             # Async BigQuery logging
             log_to_bigquery({
                 "user_id": user_id,
                 "thread_id": thread_id,
                 "role": "assistant",
-                "message": completion_message,
-                "model": "ultra_fast_completion",
-                "user_agent": user_agent,  
-                "latency_sec": 0.05
+                "message": reply_text,
+                "model": model_name,
+                "user_agent": user_agent,
+                "latency_sec": 0
             })
-            
+            if not should_complete:
+                schedule_summary_update(thread_id, history, user_query, reply_text, conversation_stage)
+
+            if data.get("stream"):
+                return Response(
+                    sse_event("delta", {"text": reply_text}) + sse_event("done", {
+                        "model": model_name,
+                        "rag_corpus": CORPUS_RESOURCE,
+                        "rag_sources": [],
+                        "conversation_stage": conversation_stage,
+                        "should_complete_conversation": should_complete,
+                        "total_latency": total_latency
+                    }),
+                    mimetype="text/event-stream"
+                )
+
             return make_response(jsonify(
-                response=completion_message,
+                response=reply_text,
                 latency_retrieve=0,
-                model="ultra_fast_completion",
-                latency_sec=0.05,
+                model=model_name,
+                latency_sec=0,
                 rag_corpus=CORPUS_RESOURCE,
                 rag_snippets=[],
                 latency_after_claude=0,
                 rag_sources=[],
-                should_complete_conversation=True,
-                total_latency=round(time.time() - start_total, 3)
+                conversation_stage=conversation_stage,
+                should_complete_conversation=should_complete,
+                total_latency=total_latency
             ), 200)
 
-        # Analyze conversation state
-        conversation_stage = analyze_conversation_state(history, user_query)
-        
-        logger.log_struct({
-            "event": "user_message",
-            "user_id": user_id,
-            "thread_id": thread_id,
-            "message": user_query,
-            "conversation_stage": conversation_stage,
-            "user_agent": user_agent,  
-            "role": "user"
-        }, severity="INFO")
+        # Stage first: guardrail and scripted turns are answered without retrieval or Claude
+        conversation_stage, latency_stage = _timed(analyze_conversation_state, history, user_query)
 
-        # Async BigQuery logging for user message
-        log_to_bigquery({
-            "user_id": user_id,
-            "thread_id": thread_id,
-            "role": "user",
-            "message": user_query,
-            "model": None,
-            "user_agent": user_agent,
-            "latency_sec": None
-        })
-        
-        # Smart RAG retrieval
-        start_rag = time.time()
-        snippets, sources = smart_retrieve_from_rag(user_query, conversation_stage)
-        context_str = "\n\n---\n".join(snippets)
-        latency_retrieve = round(time.time() - start_rag, 3)
-        
-        # Get optimized system prompt with RAG context integrated
-        start_prompt = time.time()
-        system_prompt = get_system_prompt_for_request(history, user_query, context_str)
-        system_prompt += f"\n\nCRITICAL DATE VALIDATION: Today's date is {datetime.now().strftime('%Y-%m-%d')}. MANDATORY REQUIREMENTS: 1) VERIFY every date from RAG context is after today before displaying, 2) Show EXACTLY TWO upcoming future start dates only, 3) Check conversation history to avoid repeating identical schedule information, 4) If RAG lacks future dates, request current information. NEVER guess or assume dates."
-        latency_prompt = round(time.time() - start_prompt, 3)
-        
-        # Build optimized message history (no longer need RAG context in user message)
-        base_prompt = f"User question: {user_query}"
-        messages = build_optimized_history(history, base_prompt, conversation_stage)
+        # Mandated FAFSA / diploma / contact-policy replies take priority over everything
+        guardrail = guardrails.match(user_query, history)
+        if guardrail is not None:
+            return _local_reply(
+                "guardrail_hit", f"guardrail:{guardrail.rule}", guardrail.response, conversation_stage, False,
+                {
+                    "stage_latency": latency_stage,
+                    "guardrail_rule": guardrail.rule,
+                    "guardrail_language": guardrail.language,
+                    "guardrail_matched": guardrail.matched,
+                    "guardrail_hits": guardrails.snapshot()
+                }
+            )
 
-        # Get optimized Claude parameters
-        claude_params = get_optimized_claude_params(conversation_stage, len(user_query))
-        
-        # Call Claude with optimized parameters
-        start_claude = time.time()
-        resp = anthropic_client.messages.create(
-            model=MODEL,
-            system=system_prompt,
-            messages=messages,
-            **claude_params
+        scripted = scripted_reply(conversation_stage, history, user_query)
+        bypass = scripted_stats.record(conversation_stage, scripted is not None)
+        if scripted is not None:
+            script_name, reply_text = scripted
+            return _local_reply(
+                "scripted_reply", f"scripted:{script_name}", reply_text, conversation_stage,
+                script_name in CLOSING_SCRIPTS,
+                {"stage_latency": latency_stage, "script": script_name, **bypass}
+            )
+
+        # Stage analysis, RAG retrieval, system prompt and history, overlapped
+        prepared = run_request_pipeline(
+            history, user_query, on_stage=_log_user_message, thread_id=thread_id,
+            conversation_stage=conversation_stage, latency_stage=latency_stage
         )
-        latency_claude = round(time.time() - start_claude, 3)
+        conversation_stage = prepared["conversation_stage"]
+        snippets, sources = prepared["snippets"], prepared["sources"]
+        system_prompt = prepared["system_prompt"]
+        prefix_hash = prepared["prompt_prefix_hash"]
+        messages = prepared["messages"]
+        rag_metrics = prepared["rag_metrics"]
+        history_metrics = prepared["history_metrics"]
+        timings = prepared["timings"]
+        latency_retrieve = timings["rag_latency"]
+        latency_prompt = timings["prompt_latency"]
+
+        # Route to a model and parameters for this stage
+        model_route, claude_params = get_optimized_claude_params(conversation_stage, len(user_query))
+        model = claude_params["model"]
+        claude_metrics = {}
+        # Schedule/pricing lookups (PROMPT_DATA_MODE=tools)
+        estimated_call_tokens = history_metrics["estimated_input_tokens"] + claude_params["max_tokens"]
+        
+        # Opt-in streaming: {"stream": true} answers with server-sent events
+        if data.get("stream"):
+            # Admit before the 200 goes out, so overload can still answer 503
+            ticket = admission.acquire(estimated_call_tokens)
+            claude_metrics["queue_latency"] = ticket.queue_latency
+
+            def _stream_events():
+                start_claude = time.time()
+                time_to_first_token = None
+                blocks = PlaintextBlockStream(md_to_plaintext)
+                usage = None
+                round_messages = messages
+                try:
+                    # One round unless Claude asks for schedule/pricing tools
+                    for round_number in range(MAX_TOOL_ROUNDS + 1):
+                        with claude_pool.stream(
+                            metrics=claude_metrics,
+                            system=system_prompt,
+                            messages=round_messages,
+                            **(tool_round_params(round_number) if TOOLS_ENABLED else {}),
+                            **claude_params
+                        ) as (stream, _region):
+                            for delta in stream.text_stream:
+                                if time_to_first_token is None:
+                                    time_to_first_token = round(time.time() - start_claude, 3)
+                                text = blocks.feed(delta)
+                                if text:
+                                    yield sse_event("delta", {"text": text})
+                            final = stream.get_final_message()
+                        usage = add_usage(usage, final.usage)
+                        if final.stop_reason != "tool_use" or round_number == MAX_TOOL_ROUNDS:
+                            break
+                        # Text before the tool call ("Let me check...") is its own block
+                        text = blocks.flush()
+                        if text:
+                            yield sse_event("delta", {"text": text})
+                        round_messages = continue_with_tool_results(round_messages, final, claude_metrics)
+                    if TOOLS_ENABLED:
+                        claude_metrics["tool_rounds"] = round_number
+                    ticket.release()
+                    ticket.settle(usage_tokens(usage))
+                    latency_claude = round(time.time() - start_claude, 3)
+                    text = blocks.flush()
+                    if text:
+                        yield sse_event("delta", {"text": text})
+                except Exception as e:
+                    logger.log_struct({
+                        "event": "error",
+                        "error_type": type(e).__name__,
+                        "detail": str(e),
+                        "stream": True,
+                        "total_latency": round(time.time() - start_total, 3)
+                    }, severity="ERROR")
+                    yield sse_event("error", {"error": type(e).__name__, "detail": str(e)})
+                    return
+                finally:
+                    ticket.release()
+
+                answer_text = blocks.text
+                total_latency = round(time.time() - start_total, 3)
+                logger.log_struct({
+                    "event": "assistant_reply",
+                    "user_id": user_id,
+                    "thread_id": thread_id,
+                    "message": answer_text,
+                    "role": "assistant",
+                    "model": model,
+                    "user_agent": user_agent,
+                    "conversation_stage": conversation_stage,
+                    "stream": True,
+                    "performance": {
+                        "total_latency": total_latency,
+                        "rag_latency": latency_retrieve,
+                        "prompt_latency": latency_prompt,
+                        "claude_latency": latency_claude,
+                        "time_to_first_token": time_to_first_token,
+                        "model_route": model_route,
+                        **model_latency.record(model, latency_claude),
+                        **claude_metrics,
+                        "system_prompt_length": system_prompt_length(system_prompt),
+                        "prompt_prefix_hash": prefix_hash,
+                        "prompt_data_mode": PROMPT_DATA_MODE,
+                        "message_count": len(messages),
+                        **cache_usage(usage),
+                        "rag_snippets": len(snippets),
+                        **timings,
+                        **rag_metrics,
+                        **history_metrics
+                    }
+                }, severity="INFO")
+
+                log_to_bigquery({
+                    "user_id": user_id,
+                    "thread_id": thread_id,
+                    "role": "assistant",
+                    "message": answer_text,
+                    "model": model,
+                    "user_agent": user_agent,
+                    "latency_sec": latency_claude
+                })
+                schedule_summary_update(thread_id, history, user_query, answer_text, conversation_stage)
+
+                yield sse_event("done", {
+                    "model": model,
+                    "rag_corpus": CORPUS_RESOURCE,
+                    "rag_sources": sources,
+                    "conversation_stage": conversation_stage,
+                    "total_latency": total_latency,
+                    "performance_metrics": {
+                        "rag_latency": latency_retrieve,
+                        "prompt_latency": latency_prompt,
+                        "claude_latency": latency_claude,
+                        "time_to_first_token": time_to_first_token,
+                        "queue_latency": claude_metrics.get("queue_latency", 0),
+                        "rag_tokens_saved": rag_metrics.get("rag_tokens_saved", 0),
+                        "rag_backend": rag_metrics.get("rag_backend"),
+                        "rag_circuit": rag_metrics.get("rag_circuit")
+                    }
+                })
+
+            response = Response(
+                stream_with_context(_stream_events()),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+            # Also frees the slot if the client disconnects before the stream starts
+            response.call_on_close(ticket.release)
+            return response
+
+        # Call Claude with optimized parameters, once admitted
+        with admission.admit(estimated_call_tokens, claude_metrics) as ticket:
+            start_claude = time.time()
+            if TOOLS_ENABLED:
+                resp, usage = create_with_tools(
+                    lambda **kwargs: claude_pool.create(metrics=claude_metrics, **kwargs)[0],
+                    messages,
+                    claude_metrics,
+                    system=system_prompt,
+                    **claude_params
+                )
+            else:
+                resp, _region = claude_pool.create(
+                    metrics=claude_metrics,
+                    system=system_prompt,
+                    messages=messages,
+                    **claude_params
+                )
+                usage = resp.usage
+            latency_claude = round(time.time() - start_claude, 3)
+            ticket.settle(usage_tokens(usage))
         
         # Process response
         start_processing = time.time()
@@ -481,7 +979,7 @@ def app(request: Request):
             "thread_id": thread_id,
             "message": answer_text,
             "role": "assistant",
-            "model": MODEL,
+            "model": model,
             "user_agent": user_agent,
             "conversation_stage": conversation_stage,
             "performance": {
@@ -490,9 +988,18 @@ def app(request: Request):
                 "prompt_latency": latency_prompt,
                 "claude_latency": latency_claude,
                 "processing_latency": latency_processing,
-                "system_prompt_length": len(system_prompt),
+                "model_route": model_route,
+                **model_latency.record(model, latency_claude),
+                **claude_metrics,
+                "system_prompt_length": system_prompt_length(system_prompt),
+                "prompt_prefix_hash": prefix_hash,
+                "prompt_data_mode": PROMPT_DATA_MODE,
                 "message_count": len(messages),
-                "rag_snippets": len(snippets)
+                **cache_usage(usage),
+                "rag_snippets": len(snippets),
+                **timings,
+                **rag_metrics,
+                **history_metrics
             }
         }, severity="INFO")
 
@@ -502,15 +1009,18 @@ def app(request: Request):
             "thread_id": thread_id,
             "role": "assistant",
             "message": answer_text,
-            "model": MODEL,
+            "model": model,
             "user_agent": user_agent,
             "latency_sec": latency_claude
         })
 
+        # Roll this turn into the thread summary once the response is out
+        schedule_summary_update(thread_id, history, user_query, answer_text, conversation_stage)
+
         return make_response(jsonify(
             response=answer_text,
             latency_retrieve=latency_retrieve,
-            model=MODEL,
+            model=model,
             latency_sec=latency_claude,
             rag_corpus=CORPUS_RESOURCE,
             rag_snippets=snippets,
@@ -522,10 +1032,31 @@ def app(request: Request):
                 "rag_latency": latency_retrieve,
                 "prompt_latency": latency_prompt,
                 "claude_latency": latency_claude,
-                "processing_latency": latency_processing
+                "queue_latency": claude_metrics.get("queue_latency", 0),
+                "processing_latency": latency_processing,
+                "rag_tokens_saved": rag_metrics.get("rag_tokens_saved", 0),
+                "rag_backend": rag_metrics.get("rag_backend"),
+                "rag_circuit": rag_metrics.get("rag_circuit")
             }
         ), 200)
 
+    except OverloadedError as e:
+        total_latency = round(time.time() - start_total, 3)
+        logger.log_struct({
+            "event": "overloaded",
+            "reason": e.reason,
+            "admission": admission.snapshot(),
+            "total_latency": total_latency
+        }, severity="WARNING")
+        response = make_response(jsonify(
+            error="overloaded",
+            detail="Sophia is receiving a lot of messages right now. Please try again in a moment.",
+            reason=e.reason,
+            total_latency=total_latency
+        ), 503)
+        response.headers["Retry-After"] = str(max(1, round(e.retry_after)))
+        return response
+
     except Exception as e:
         total_latency = round(time.time() - start_total, 3)
         logger.log_struct({
@@ -535,7 +1066,7 @@ def app(request: Request):
             "total_latency": total_latency
         }, severity="ERROR")
         return make_response(jsonify(
-            error=type(e).__name(), 
+            error=type(e).__name__,
             detail=str(e),
             total_latency=total_latency
         ), 500)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Per-stage model routing.
+
+Every Claude call is described by a task ("reply", "summarize") and the
+conversation stage. ROUTING_TABLE maps those to a model and its parameters,
+so cheap turns (the fixed completion message, post-enrollment small talk,
+background summaries) can go to a smaller, faster model while knowledge-heavy
+stages stay on the main one. The table can be overridden without a deploy
+via MODEL_ROUTES (JSON: {"task:stage": {...}}), and per-model latency is
+tracked so it can be tuned against real traffic.
+"""
+import json
+import os
+import threading
+
+from rag_client import LatencyHistogram
+
+MODEL = os.environ.get("MODEL", "claude-3-7-sonnet@20250219")
+FAST_MODEL = os.environ.get("FAST_MODEL", "claude-3-5-haiku@20241022")
+
+BASE_PARAMS = {"temperature": 0.2, "top_p": 0.8}
+
+# (task, stage) -> route; "*" matches any stage. "max_tokens_short" applies
+# to queries under SHORT_QUERY_CHARS.
+SHORT_QUERY_CHARS = 20
+ROUTING_TABLE = {
+    ("reply", "completion"): {"model": FAST_MODEL, "max_tokens": 100, "temperature": 0.1},
+    ("reply", "post_enrollment"): {"model": FAST_MODEL, "max_tokens": 200, "temperature": 0.2},
+    ("reply", "enrollment_collection"): {"model": MODEL, "max_tokens": 300, "temperature": 0.2},
+    ("reply", "pricing"): {"model": MODEL, "max_tokens": 400, "temperature": 0.2},
+    ("reply", "payment_options"): {"model": MODEL, "max_tokens": 400, "temperature": 0.2},
+    ("reply", "*"): {"model": MODEL, "max_tokens": 350, "max_tokens_short": 250},
+    ("summarize", "*"): {"model": FAST_MODEL, "max_tokens": 200, "temperature": 0.1, "top_p": None},
+}
+
+
+def _load_overrides(raw=os.environ.get("MODEL_ROUTES")):
+    if not raw:
+        return {}
+    return {tuple(key.split(":", 1)): route for key, route in json.loads(raw).items()}
+
+
+ROUTING_TABLE.update(_load_overrides())
+
+
+def route_model(task, conversation_stage, user_query_length=0):
+    """
+    Resolve (task, stage) to (route_name, params) where params carries
+    "model" plus the messages.create parameters.
+    """
+    key = (task, conversation_stage)
+    if key not in ROUTING_TABLE:
+        key = (task, "*")
+    route = dict(ROUTING_TABLE[key])
+    short_max_tokens = route.pop("max_tokens_short", None)
+    if short_max_tokens and user_query_length < SHORT_QUERY_CHARS:
+        route["max_tokens"] = short_max_tokens
+    params = {**BASE_PARAMS, **route}
+    # None in the table removes a base parameter
+    params = {name: value for name, value in params.items() if value is not None}
+    return f"{key[0]}:{key[1]}", params
+
+
+class ModelLatencyStats:
+    """Rolling per-model latency histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, model, latency):
+        """Record a call's latency; return that model's current p50/p95."""
+        with self._lock:
+            histogram = self._histograms.setdefault(model, LatencyHistogram())
+        histogram.record(latency)
+        return {"model_p50": histogram.percentile(50), "model_p95": histogram.percentile(95)}
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {
+            model: {"calls": len(h), "p50": h.percentile(50), "p95": h.percentile(95)}
+            for model, h in histograms.items()
+        }
@@ -0,0 +1,207 @@
+"""
+Stage-, language- and intent-scoped pruning of the static prompt.
+
+Every turn used to carry the whole static prompt: the CIDESCO and makeup
+rules, the pricing catalog hierarchy, the schedule validation checklists,
+both languages' mandated replies and, in "embedded" mode, several copies of
+the schedule/pricing data. systemprompt.STATIC_PROMPT_SECTIONS tags each
+section with the stages, languages and intents it applies to; PromptPruner
+joins only the sections that apply to a turn's (stage, language, intents).
+
+Each variant is built once per data generation and checked against
+MANDATORY_RULES, the rules that must be in the prompt whenever their
+condition holds. A variant missing one is replaced by the full static
+prompt. Every distinct variant is its own cached prefix, so the prompt cache
+holds one entry per variant in use instead of one in total.
+
+PROMPT_PRUNING=true sends the pruned prefix; either way main.py logs the
+full and pruned token counts. Run this module for the regression sweep over
+every data mode, stage, language and intent combination (once more with
+GUARDRAIL_SHORT_CIRCUIT=false for the full guardrail blocks).
+"""
+import os
+from collections import namedtuple
+
+from data_store import data_store
+from systemprompt import (
+    DIPLOMA_RESPONSES,
+    DISCOVERY_STAGES,
+    FAFSA_RESPONSES,
+    GUARDRAIL_SHORT_CIRCUIT,
+    PROMPT_DATA_MODE,
+    PROMPT_LANGUAGES,
+    get_prompt_sections,
+    get_static_sophia_prompt,
+    join_prompt_sections,
+    section_applies,
+)
+from token_budget import estimate_tokens
+
+PROMPT_PRUNING_ENABLED = os.environ.get("PROMPT_PRUNING", "false").lower() == "true"
+
+# markers: lowercase substrings that must all be in the prompt when applies(stage, language, intents)
+MandatoryRule = namedtuple("MandatoryRule", "name markers applies")
+# sections: names of the joined sections; missing: rules the pruned variant lacked (then prefix is the full prompt)
+PrunedPrompt = namedtuple("PrunedPrompt", "prefix sections tokens missing")
+
+
+def _always(stage, language, intents):
+    return True
+
+
+def _discussing_programs(stage, language, intents):
+    return stage in DISCOVERY_STAGES or bool(intents)
+
+
+def _discussing_schedules(stage, language, intents):
+    return stage == "interested" or "schedule" in intents
+
+
+def _discussing_prices(stage, language, intents):
+    return stage in ("pricing", "payment_options") or not intents.isdisjoint(("pricing", "payment"))
+
+
+MANDATORY_RULES = [
+    MandatoryRule("fafsa_block", ("fafsa", "school code"), _always),
+    MandatoryRule("diploma_requirement", ("ability-to-benefit", "ged"), _always),
+    MandatoryRule("language_match", ("respond only in english", "respond only in spanish"), _always),
+    MandatoryRule("contact_policy", ("never give out school phone numbers",), _always),
+    MandatoryRule("no_contact_preferences", ("never ask about preferred contact times",), _always),
+    MandatoryRule("pricing_only_when_asked", ("forbidden from including or mentioning tuition",), _always),
+    MandatoryRule("future_dates_only", ("never suggest dates before or equal to **today's date**",), _always),
+    MandatoryRule("weekly_payments_only", ("weekly payment plans only",), _always),
+    MandatoryRule("no_discounts", ("no discounts for full payments",), _always),
+    MandatoryRule("va_not_scholarship", ("not a scholarship",), _always),
+    MandatoryRule("campus_filtering", ("new jersey only programs", "new york only programs"), _discussing_programs),
+    MandatoryRule("schedule_validation", ("select the two soonest future dates", "course runs [days] [time]"),
+                  _discussing_schedules),
+    MandatoryRule("campus_pricing_catalogs", ("never** provide ny pricing for nj-only programs",), _discussing_prices),
+    MandatoryRule("makeup_hours_clarification", ("make up hours",), lambda stage, language, intents: "makeup" in intents),
+    MandatoryRule("cidesco_requirements", ("cidesco program admission requirements",),
+                  lambda stage, language, intents: "cidesco" in intents),
+]
+if not GUARDRAIL_SHORT_CIRCUIT:
+    # The full guardrail blocks carry the mandated replies, in the conversation's language
+    MANDATORY_RULES += [
+        MandatoryRule(f"{name}_reply_{language}", (responses[language].lower(),),
+                      lambda stage, conversation_language, intents, language=language: conversation_language == language)
+        for name, responses in (("fafsa", FAFSA_RESPONSES), ("diploma", DIPLOMA_RESPONSES))
+        for language in PROMPT_LANGUAGES
+    ]
+
+
+def missing_mandatory_rules(prompt, stage, language, intents):
+    """Names of the rules this turn needs that `prompt` doesn't state."""
+    text = prompt.lower()
+    return [
+        rule.name for rule in MANDATORY_RULES
+        if rule.applies(stage, language, intents) and not all(marker in text for marker in rule.markers)
+    ]
+
+
+class PromptPruner:
+    """Static prompt variants per (stage, language, intents), built once per data generation."""
+
+    def __init__(self, data_mode=PROMPT_DATA_MODE, store=data_store):
+        self.data_mode = data_mode
+        self._store = store
+
+    def _variant(self, snapshot, names):
+        # Shared by every (stage, language, intents) that selects the same sections
+        def build(snap):
+            sections = [s for s in get_prompt_sections(self.data_mode, snap) if s.name in names]
+            prefix = join_prompt_sections(sections)
+            return prefix, estimate_tokens(prefix)
+        return snapshot.derive(("prompt_variant", self.data_mode, names), build)
+
+    def _build(self, snapshot, stage, language, intents):
+        sections = get_prompt_sections(self.data_mode, snapshot)
+        names = tuple(s.name for s in sections if section_applies(s, stage, language, intents))
+        prefix, tokens = self._variant(snapshot, names)
+        missing = missing_mandatory_rules(prefix, stage, language, intents)
+        if missing:
+            # Never drop a rule the turn needs: send everything
+            names = tuple(s.name for s in sections)
+            prefix, tokens = self._variant(snapshot, names)
+        return PrunedPrompt(prefix, names, tokens, missing)
+
+    def prune(self, stage, language, intents=frozenset()):
+        """PrunedPrompt with only the sections that apply to this turn."""
+        intents = frozenset(intents)
+        return self._store.snapshot().derive(
+            ("pruned_prompt", self.data_mode, stage, language, intents),
+            lambda snap: self._build(snap, stage, language, intents),
+        )
+
+    def full_tokens(self):
+        """Token estimate of the unpruned static prompt."""
+        return self._store.snapshot().derive(
+            ("static_tokens", self.data_mode),
+            lambda snap: estimate_tokens(get_static_sophia_prompt(self.data_mode, snap)),
+        )
+
+    def metrics(self, pruned, intents, applied=PROMPT_PRUNING_ENABLED):
+        """Log fields: static prompt tokens in full vs. pruned for this turn, and whether pruning was applied."""
+        full = self.full_tokens()
+        metrics = {
+            "prompt_pruning": applied,
+            "prompt_intents": sorted(intents),
+            "prompt_sections": len(pruned.sections),
+            "static_tokens_full": full,
+            "static_tokens_pruned": pruned.tokens,
+            "static_tokens_saved": full - pruned.tokens,
+        }
+        if pruned.missing:
+            metrics["prompt_pruning_missing_rules"] = pruned.missing
+        return metrics
+
+
+if __name__ == "__main__":
+    from itertools import combinations
+
+    from systemprompt import PROMPT_INTENTS, PROMPT_STAGES, detect_prompt_intents
+
+    def m(role, text):
+        return {"role": role, "content": [{"text": text}]}
+
+    # Intent detection
+    assert detect_prompt_intents([], "hi") == frozenset()
+    assert detect_prompt_intents([], "when does the evening class start?") == {"schedule"}
+    assert detect_prompt_intents([], "¿cuánto cuesta el curso?") == {"pricing"}
+    assert detect_prompt_intents([m("user", "do you have payment plans?")], "ok") == {"payment"}
+    assert detect_prompt_intents([m("user", "tell me about makeup"), m("user", "hmm"), m("user", "ok")], "thanks") == {"makeup"}
+    assert detect_prompt_intents([m("user", "CIDESCO requirements?")], "and the application?") == {"cidesco"}
+    print("OK: intent detection")
+
+    intent_sets = [frozenset(c) for n in range(len(PROMPT_INTENTS) + 1) for c in combinations(PROMPT_INTENTS, n)]
+    for data_mode in ("embedded", "tools", "selected"):
+        pruner = PromptPruner(data_mode)
+        full = pruner.full_tokens()
+        checked = 0
+        for stage in PROMPT_STAGES:
+            for language in PROMPT_LANGUAGES:
+                for intents in intent_sets:
+                    pruned = pruner.prune(stage, language, intents)
+                    assert not pruned.missing, (data_mode, stage, language, sorted(intents), pruned.missing)
+                    assert missing_mandatory_rules(pruned.prefix, stage, language, intents) == []
+                    if not GUARDRAIL_SHORT_CIRCUIT:
+                        other = "spanish" if language == "english" else "english"
+                        assert FAFSA_RESPONSES[other] not in pruned.prefix, (stage, language)
+                    checked += 1
+        # Only the tagged sections go; a phone number typed in enrollment_ready doesn't need the pricing hierarchy
+        ready = pruner.prune("enrollment_ready", "english")
+        assert "pricing_catalogs" not in ready.sections and "location_filtering" not in ready.sections
+        assert "pricing_catalogs" in pruner.prune("enrollment_ready", "english", {"pricing"}).sections
+        assert pruner.prune("interested", "spanish", {"schedule"}) is pruner.prune("interested", "spanish", {"schedule"})
+        print(f"OK: {data_mode}: mandatory rules present in all {checked} variants; static prompt {full} tokens, "
+              "pruned per stage (no intents): " + ", ".join(
+                  f"{stage} {pruner.prune(stage, 'english').tokens}" for stage in PROMPT_STAGES))
+
+    # A variant missing a rule falls back to the full prompt (fresh store: variants are cached per snapshot)
+    from data_store import DataStore
+
+    MANDATORY_RULES.append(MandatoryRule("test_rule", ("make up hours",), _always))
+    fallback = PromptPruner("tools", store=DataStore()).prune("completion", "english")
+    MANDATORY_RULES.pop()
+    assert fallback.missing == ["test_rule"] and fallback.prefix == get_static_sophia_prompt("tools")
+    print("OK: missing rule falls back to the full static prompt")
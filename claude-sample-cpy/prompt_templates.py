@@ -0,0 +1,211 @@
+"""
+Precompiled system-prompt templates.
+
+get_contextual_sophia_prompt_parts() re-formats every section and re-scans
+the history five times (language, location, completion state, contact
+details twice) on each turn. PromptTemplateEngine renders the same
+dynamic suffix, byte for byte, from pieces prepared ahead of time:
+
+- per process: the stage sections that only depend on (stage, language,
+  location confirmed), the location status and the contact-request block;
+- per day: the header and RAG rules, which carry today's date;
+- per turn: one join of the history, one contact-detail extraction, and a
+  "".join of the prepared pieces with the few per-user fields.
+
+The static prefix is get_static_sophia_prompt(), built once per data generation.
+Run this module to check the output against the legacy function.
+"""
+import time
+from collections import namedtuple
+
+from systemprompt import (
+    COMPLETION_MESSAGES,
+    COMPLETION_STAGE_TEMPLATE,
+    CONTACT_INFO_MISSING,
+    CONTACT_INFO_TEMPLATE,
+    ENROLLMENT_COLLECTION_OVERRIDE_SECTION,
+    ENROLLMENT_READY_STAGE_TEMPLATE,
+    INITIAL_STAGE_SECTIONS,
+    INTEREST_STAGE_SECTIONS,
+    LOCATION_STATUS,
+    LOCATION_STATUS_HEADER,
+    PAYMENT_OPTIONS_STAGE_SECTION,
+    POST_ENROLLMENT_STAGE_TEMPLATE,
+    PRICING_STAGE_SECTION,
+    PROMPT_HEADER_TEMPLATE,
+    RAG_KNOWLEDGE_HEADER,
+    RAG_RULES_TEMPLATE,
+    check_location_confirmed,
+    detect_enrollment_completion_state,
+    detect_language,
+    determine_prompt_stage,
+    extract_contact_info,
+    get_conversation_text,
+    get_enrollment_collection_prompt,
+    get_enrollment_contact_prompt,
+    get_static_sophia_prompt,
+)
+
+LANGUAGES = ("english", "spanish")
+
+# What one turn's suffix depends on; contact = (first_name, last_name, email, phone)
+PromptState = namedtuple("PromptState", "stage language location_confirmed contact contact_request")
+
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+
+def _stage_section(stage, language, location_confirmed):
+    """Stage text for stages with no per-user fields, or None."""
+    if stage == "completion":
+        return COMPLETION_STAGE_TEMPLATE.format(completion_msg=COMPLETION_MESSAGES[language])
+    if stage == "pricing":
+        return PRICING_STAGE_SECTION
+    if stage == "payment_options":
+        return PAYMENT_OPTIONS_STAGE_SECTION
+    if stage == "interested":
+        return INTEREST_STAGE_SECTIONS[location_confirmed]
+    if stage == "initial":
+        return INITIAL_STAGE_SECTIONS[location_confirmed]
+    return None
+
+
+class PromptTemplateEngine:
+    """Renders the per-turn system-prompt suffix from precompiled segments."""
+
+    def __init__(self, static_prefix=None, today=_today):
+        self._static_prefix = static_prefix
+        self._today = today
+        self._stage_sections = {
+            (stage, language, confirmed): _stage_section(stage, language, confirmed)
+            for stage in ("completion", "pricing", "payment_options", "interested", "initial")
+            for language in LANGUAGES
+            for confirmed in (True, False)
+        }
+        self._location = {confirmed: LOCATION_STATUS_HEADER + LOCATION_STATUS[confirmed] for confirmed in (True, False)}
+        self._contact_request = {language: get_enrollment_contact_prompt(language) for language in LANGUAGES}
+        self._daily = (None, {})
+
+    @property
+    def static_prefix(self):
+        """The fixed prefix if one was given, else the current data's static prompt."""
+        return self._static_prefix if self._static_prefix is not None else get_static_sophia_prompt()
+
+    def _daily_segments(self):
+        """{language: (header, rag_rules)} for today, rebuilt when the date changes."""
+        day, segments = self._daily
+        today = self._today()
+        if day != today:
+            segments = {
+                language: (
+                    PROMPT_HEADER_TEMPLATE.format(today=today, language_upper=language.upper(), language=language),
+                    RAG_RULES_TEMPLATE.format(today=today, language=language),
+                )
+                for language in LANGUAGES
+            }
+            # One tuple assignment, so concurrent requests never see a half-built day
+            self._daily = (today, segments)
+        return segments
+
+    def analyze(self, history, user_query):
+        """Everything the suffix depends on, from a single pass over the history."""
+        raw_text = get_conversation_text(history)
+        conversation_text = raw_text.lower()
+        has_contact_info, completion_signal, enrollment_shared = detect_enrollment_completion_state(
+            history, user_query, conversation_text
+        )
+        contact = extract_contact_info(history, raw_text)
+        stage = determine_prompt_stage(
+            history, user_query, has_contact_info, completion_signal, enrollment_shared,
+            all(contact), conversation_text,
+        )
+        return PromptState(
+            stage=stage,
+            language=detect_language(user_query, history, conversation_text),
+            location_confirmed=check_location_confirmed(history, conversation_text),
+            contact=contact,
+            contact_request=has_contact_info and completion_signal and enrollment_shared,
+        )
+
+    def render(self, state, history, rag_context=""):
+        """The dynamic suffix for an analyzed turn."""
+        header, rag_rules = self._daily_segments()[state.language]
+        first_name, last_name, email, phone = state.contact
+        pieces = [header]
+
+        if any(state.contact):
+            pieces.append(CONTACT_INFO_TEMPLATE.format(
+                first_name=first_name or 'Not provided',
+                last_name=last_name or 'Not provided',
+                email=email or 'Not provided',
+                phone=phone or 'Not provided',
+            ))
+        else:
+            pieces.append(CONTACT_INFO_MISSING)
+        pieces.append(self._location[state.location_confirmed])
+        if state.contact_request:
+            pieces.append(self._contact_request[state.language])
+
+        section = self._stage_sections.get((state.stage, state.language, state.location_confirmed))
+        if section is not None:
+            pieces.append(section)
+        elif state.stage == "post_enrollment":
+            pieces.append(POST_ENROLLMENT_STAGE_TEMPLATE.format(first_name=first_name, last_name=last_name))
+        elif state.stage == "enrollment_ready":
+            pieces.append(ENROLLMENT_READY_STAGE_TEMPLATE.format(
+                first_name=first_name, last_name=last_name, email=email, phone=phone
+            ))
+        else:
+            pieces.append(get_enrollment_collection_prompt(
+                state.language, first_name, last_name, email, phone, state.location_confirmed, history
+            ))
+            pieces.append(ENROLLMENT_COLLECTION_OVERRIDE_SECTION)
+
+        if rag_context.strip():
+            pieces += [RAG_KNOWLEDGE_HEADER, rag_context, rag_rules]
+        return "".join(pieces)
+
+    def parts(self, history=None, user_query="", rag_context=""):
+        """(static_prefix, dynamic_suffix), same as get_system_prompt_parts_for_request."""
+        history = history or []
+        return self.static_prefix, self.render(self.analyze(history, user_query), history, rag_context)
+
+
+if __name__ == "__main__":
+    from systemprompt import MAX_ENROLLMENT_ATTEMPTS, get_contextual_sophia_prompt_parts
+
+    def m(role, text):
+        return {"role": role, "content": [{"text": text}]}
+
+    contact = [m("user", "anisha b, ani@b.com, 678-9386850")]
+    histories = {
+        "empty": [],
+        "interested_ny": [m("user", "I'm interested in esthetics in New York")],
+        "interested": [m("user", "tell me about the makeup program")],
+        "spanish": [m("user", "hola, quiero información sobre el curso de uñas")],
+        "contact": [m("user", "I want to enroll in nails")] + contact,
+        "shared": contact + [m("assistant", "Our enrollment advisor will contact you soon.")],
+        "attempts": [m("user", "interested in barbering")] + [m("assistant", "I need to collect some details")] * MAX_ENROLLMENT_ATTEMPTS,
+        "partial": [m("user", "interested in waxing, my email is a@b.co")],
+    }
+    queries = ["hi", "yes", "nope", "how much is it?", "do you have payment plans?",
+               "sí perfecto quiero inscribirme", "¿cuánto cuesta?", "start dates in NJ?"]
+    rag_contexts = ["", "Esthetics Full Time Day {start} 2026-11-02", "   "]
+
+    engine = PromptTemplateEngine()
+    stages = set()
+    for history in histories.values():
+        for query in queries:
+            for rag_context in rag_contexts:
+                expected = get_contextual_sophia_prompt_parts(history, query, rag_context)
+                assert engine.parts(history, query, rag_context) == expected, (history, query, rag_context)
+                stages.add(engine.analyze(history, query).stage)
+    print(f"OK: byte-identical over {len(histories) * len(queries) * len(rag_contexts)} turns, stages={sorted(stages)}")
+
+    # The date-dependent segments follow the clock
+    days = iter(["2030-01-01", "2030-01-01", "2030-01-02"])
+    dated = PromptTemplateEngine(today=lambda: next(days))
+    suffixes = [dated.parts([], "hi", "ctx")[1] for _ in range(3)]
+    assert suffixes[0] == suffixes[1] and "2030-01-01" in suffixes[0] and "2030-01-02" in suffixes[2]
+    print("OK: daily segments rebuilt on date change")
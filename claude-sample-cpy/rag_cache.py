@@ -0,0 +1,128 @@
+"""
+In-process TTL/LRU cache for RAG retrieval results.
+
+Most traffic repeats a handful of questions ("esthetics schedule", widget
+[TOPIC: ...] buttons), so retrieveContexts results are cached per instance,
+keyed on the normalized query text, top_k and the corpus resource.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# ---------------- Cache Config ----------------
+RAG_CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE", "512"))     # max cached queries
+RAG_CACHE_TTL = float(os.environ.get("RAG_CACHE_TTL", "900"))     # seconds
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_query(query_text):
+    """
+    Normalize a query for cache keying: NFKC-normalized, lowercase,
+    punctuation dropped and whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFKC", query_text or "").lower()
+    return " ".join(_WORD_RE.findall(text))
+
+
+class TTLLRUCache:
+    """
+    Size-bounded LRU cache whose entries also expire after `ttl` seconds.
+    Thread-safe; keeps hit/miss/eviction/expiration counters.
+    """
+
+    def __init__(self, maxsize=RAG_CACHE_SIZE, ttl=RAG_CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only the keys for which predicate(key) is true."""
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+            else:
+                doomed = [k for k in self._data if predicate(k)]
+                for k in doomed:
+                    del self._data[k]
+                removed = len(doomed)
+            return removed
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._data),
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class RetrievalCache:
+    """TTLLRUCache specialised for retrieveContexts results."""
+
+    def __init__(self, maxsize=RAG_CACHE_SIZE, ttl=RAG_CACHE_TTL):
+        self._cache = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def key(query_text, top_k, corpus_resource):
+        return (normalize_query(query_text), top_k, corpus_resource)
+
+    def get(self, query_text, top_k, corpus_resource):
+        return self._cache.get(self.key(query_text, top_k, corpus_resource))
+
+    def set(self, query_text, top_k, corpus_resource, items):
+        # Never cache empty results: they usually mean a degraded endpoint
+        if items:
+            self._cache.set(self.key(query_text, top_k, corpus_resource), items)
+
+    def invalidate(self, corpus_resource=None):
+        """
+        Invalidate cached results after a corpus update. With a corpus
+        resource only that corpus is dropped; otherwise everything is.
+        """
+        if corpus_resource is None:
+            return self._cache.invalidate()
+        return self._cache.invalidate(lambda k: k[2] == corpus_resource)
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,300 @@
+"""
+Long-lived transport for Vertex RAG `retrieveContexts` calls.
+
+One AuthorizedSession is shared by every request: its keep-alive connection
+pool avoids a TLS handshake per user message, and a background thread keeps
+the cached credentials fresh so no request ever waits on a token fetch.
+Slow responses are hedged: if the first request hasn't answered within the
+recent p95 latency, an identical second request races it.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession, Request as AuthRequest
+from requests.adapters import HTTPAdapter
+
+# ---------------- Transport Config ----------------
+RAG_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+RAG_POOL_SIZE = int(os.environ.get("RAG_POOL_SIZE", "8"))  # keep-alive connections per host
+RAG_CONNECT_TIMEOUT = float(os.environ.get("RAG_CONNECT_TIMEOUT", "3.05"))
+RAG_READ_TIMEOUT = float(os.environ.get("RAG_READ_TIMEOUT", "20"))
+RAG_TOKEN_REFRESH_MARGIN = int(os.environ.get("RAG_TOKEN_REFRESH_MARGIN", "300"))  # seconds before expiry
+
+# ---------------- Hedging Config ----------------
+RAG_HEDGING = os.environ.get("RAG_HEDGING", "1") == "1"
+RAG_HEDGE_PERCENTILE = float(os.environ.get("RAG_HEDGE_PERCENTILE", "95"))
+RAG_HEDGE_WINDOW = int(os.environ.get("RAG_HEDGE_WINDOW", "500"))          # latency samples kept
+RAG_HEDGE_MIN_SAMPLES = int(os.environ.get("RAG_HEDGE_MIN_SAMPLES", "20"))  # before trusting the percentile
+RAG_HEDGE_DEFAULT_DELAY = float(os.environ.get("RAG_HEDGE_DEFAULT_DELAY", "2.0"))
+RAG_HEDGE_MIN_DELAY = float(os.environ.get("RAG_HEDGE_MIN_DELAY", "0.25"))
+RAG_HEDGE_MAX_DELAY = float(os.environ.get("RAG_HEDGE_MAX_DELAY", "6.0"))
+
+# Log-spaced latency buckets from 10 ms to ~60 s
+LATENCY_BUCKETS = [round(0.01 * 1.25 ** i, 4) for i in range(40)]
+
+
+class RagRetrievalError(Exception):
+    """Raised when retrieveContexts answers with a non-200 status."""
+
+    def __init__(self, status, detail=""):
+        super().__init__(f"retrieveContexts returned {status}: {detail[:200]}")
+        self.status = status
+
+
+class LatencyHistogram:
+    """
+    Rolling latency histogram over the last `window` samples.
+
+    Samples are counted into fixed log-spaced buckets; the oldest sample's
+    bucket is decremented as new ones arrive, so percentiles are O(buckets)
+    and always reflect recent traffic.
+    """
+
+    def __init__(self, window=RAG_HEDGE_WINDOW, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._recent = deque()
+        self.window = window
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        bucket = bisect.bisect_left(self.bounds, latency)
+        with self._lock:
+            self._counts[bucket] += 1
+            self._recent.append(bucket)
+            if len(self._recent) > self.window:
+                self._counts[self._recent.popleft()] -= 1
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile, or None if empty."""
+        with self._lock:
+            total = len(self._recent)
+            if not total:
+                return None
+            rank = max(1, int(round(total * pct / 100.0)))
+            seen = 0
+            for bucket, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return self.bounds[min(bucket, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def __len__(self):
+        return len(self._recent)
+
+
+class RagClient:
+    """
+    Pooled, credential-caching client for the Vertex RAG REST API.
+
+    The session and credentials are created lazily on first use, so importing
+    this module (or building the client at cold start) never blocks on auth.
+    """
+
+    def __init__(self, project_id, region, pool_size=RAG_POOL_SIZE,
+                 connect_timeout=RAG_CONNECT_TIMEOUT, read_timeout=RAG_READ_TIMEOUT,
+                 refresh_margin=RAG_TOKEN_REFRESH_MARGIN, credentials=None,
+                 base_url=None, logger=None, hedging=RAG_HEDGING,
+                 hedge_percentile=RAG_HEDGE_PERCENTILE):
+        self.project_id = project_id
+        self.region = region
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.refresh_margin = refresh_margin
+        self.base_url = base_url or f"https://{region}-aiplatform.googleapis.com"
+        self.logger = logger
+
+        self._credentials = credentials
+        self._session = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.latency = LatencyHistogram()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix="rag-hedge")
+        self._counter_lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def url(self):
+        return (
+            f"{self.base_url}/v1beta1/"
+            f"projects/{self.project_id}/locations/{self.region}:retrieveContexts"
+        )
+
+    # ---------------- Session & Credentials ----------------
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    if self._credentials is None:
+                        self._credentials, _ = google.auth.default(scopes=RAG_SCOPES)
+                    self._refresh_credentials()
+
+                    session = AuthorizedSession(self._credentials)
+                    adapter = HTTPAdapter(
+                        pool_connections=1,  # a single host: {region}-aiplatform.googleapis.com
+                        pool_maxsize=self.pool_size,
+                        max_retries=0
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                    self._start_refresher()
+        return self._session
+
+    def _refresh_credentials(self):
+        """Refresh the cached credentials if they are missing or about to expire."""
+        with self._refresh_lock:
+            creds = self._credentials
+            if creds.valid and self._seconds_to_expiry() > self.refresh_margin:
+                return
+            creds.refresh(AuthRequest())
+
+    def _seconds_to_expiry(self):
+        expiry = getattr(self._credentials, "expiry", None)
+        if expiry is None:
+            return float("inf")
+        # google-auth keeps expiry as a naive UTC datetime
+        return (expiry - datetime.utcnow()).total_seconds()
+
+    def _start_refresher(self):
+        def _loop():
+            while not self._stop.is_set():
+                wait = self._seconds_to_expiry() - self.refresh_margin
+                wait = min(max(wait, 1.0), self.refresh_margin or 60.0)
+                if self._stop.wait(wait):
+                    return
+                try:
+                    self._refresh_credentials()
+                except Exception as e:
+                    if self.logger:
+                        self.logger.log_struct(
+                            {"event": "rag_token_refresh_error", "detail": str(e)},
+                            severity="WARNING"
+                        )
+
+        self._refresher = threading.Thread(target=_loop, name="rag-token-refresh", daemon=True)
+        self._refresher.start()
+
+    def warm(self):
+        """Create the session and fetch a token ahead of the first request."""
+        self._get_session()
+
+    def close(self):
+        self._stop.set()
+        self._hedge_executor.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    # ---------------- Retrieval ----------------
+    def retrieve_contexts(self, corpus_resource, query_text, top_k):
+        """
+        Call retrieveContexts and return the raw list of context dicts.
+        Raises RagRetrievalError for non-200 answers.
+        """
+        payload = {
+            "vertex_rag_store": {
+                "rag_resources": {
+                    "rag_corpus": corpus_resource
+                }
+            },
+            "query": {
+                "text": query_text,
+                "similarity_top_k": top_k
+            }
+        }
+
+        resp = self._get_session().post(self.url, json=payload, timeout=self.timeout)
+        if resp.status_code != 200:
+            raise RagRetrievalError(resp.status_code, resp.text or "")
+
+        data = resp.json() or {}
+        return data.get("contexts", {}).get("contexts", [])
+
+    # ---------------- Hedged Retrieval ----------------
+    def hedge_delay(self):
+        """Current hedge delay: the recent latency percentile, clamped."""
+        if len(self.latency) < RAG_HEDGE_MIN_SAMPLES:
+            return RAG_HEDGE_DEFAULT_DELAY
+        delay = self.latency.percentile(self.hedge_percentile)
+        return min(max(delay, RAG_HEDGE_MIN_DELAY), RAG_HEDGE_MAX_DELAY)
+
+    def _timed_retrieve(self, corpus_resource, query_text, top_k):
+        start = time.monotonic()
+        items = self.retrieve_contexts(corpus_resource, query_text, top_k)
+        # Only successful answers feed the histogram; fast errors would skew it
+        self.latency.record(time.monotonic() - start)
+        return items
+
+    def retrieve_contexts_hedged(self, corpus_resource, query_text, top_k, metrics=None):
+        """
+        retrieve_contexts with request hedging. If the first request hasn't
+        answered within hedge_delay(), an identical second request is sent and
+        whichever succeeds first wins. The loser is cancelled if it hasn't
+        started; an in-flight HTTP call can't be aborted, so it finishes in
+        the background and its answer is discarded. Adds hedge details to
+        `metrics` when given.
+        """
+        if metrics is None:
+            metrics = {}
+        with self._counter_lock:
+            self.requests += 1
+
+        if not self.hedging:
+            return self._timed_retrieve(corpus_resource, query_text, top_k)
+
+        delay = self.hedge_delay()
+        primary = self._hedge_executor.submit(self._timed_retrieve, corpus_resource, query_text, top_k)
+        pending = {primary}
+        hedge = None
+        done, _ = wait(pending, timeout=delay)
+        if not done:
+            hedge = self._hedge_executor.submit(self._timed_retrieve, corpus_resource, query_text, top_k)
+            pending.add(hedge)
+            with self._counter_lock:
+                self.hedges += 1
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    items = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                for other in pending:
+                    other.cancel()
+                hedge_won = future is hedge
+                if hedge_won:
+                    with self._counter_lock:
+                        self.hedge_wins += 1
+                metrics.update(self._hedge_metrics(delay, hedge is not None, hedge_won))
+                return items
+
+        metrics.update(self._hedge_metrics(delay, hedge is not None, False))
+        raise error
+
+    def _hedge_metrics(self, delay, hedged, hedge_won):
+        with self._counter_lock:
+            requests, hedges, wins = self.requests, self.hedges, self.hedge_wins
+        return {
+            "rag_hedge_delay": round(delay, 3),
+            "rag_hedged": hedged,
+            "rag_hedge_won": hedge_won,
+            "rag_hedge_rate": round(hedges / requests, 3) if requests else 0.0,
+            "rag_hedge_win_rate": round(wins / hedges, 3) if hedges else 0.0
+        }
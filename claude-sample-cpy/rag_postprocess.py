@@ -0,0 +1,232 @@
+"""
+Post-processing for retrieved RAG chunks before they reach the prompt.
+
+`filter_chunks_by_campus` drops chunks from the wrong campus for the program
+being discussed. `rerank_chunks` replaces the old keyword any() filter: every
+chunk is scanned once with a compiled multi-pattern matcher, scored by the
+weighted query, program and date terms it contains, and the best N are kept
+regardless of their position in the corpus results. `dedupe_chunks` drops
+near-duplicates (the same catalog paragraph in several source files) and
+`pack_snippets` fills an explicit token budget with what's left.
+"""
+import heapq
+import math
+import re
+import zlib
+from functools import lru_cache
+
+from token_budget import estimate_tokens, truncate_to_tokens
+
+# ---------------- Term Weights ----------------
+PROGRAM_TERMS = [
+    "esthetic", "esthetics", "aesthetic", "aesthetics", "nail", "nails", "wax", "waxing",
+    "makeup", "make up", "barber", "barbering", "skin care", "skincare", "cosmetology",
+    "manicure", "teacher training", "teaching training", "cidesco",
+    "estetica", "estética", "uñas", "maquillaje", "depilacion", "depilación", "barberia", "barbería",
+    "cosmetologia", "cosmetología",
+]
+TOPIC_TERMS = [
+    "program", "programs", "course", "courses", "schedule", "schedules", "start date",
+    "start dates", "price", "tuition", "cost", "fee", "fees", "admission", "admissions",
+    "requirements", "enrollment", "financial aid", "full time", "part time", "evening",
+    "weekend", "spanish", "curso", "horario", "precio", "costo", "inscripcion", "inscripción",
+]
+DATE_TERMS = [
+    "2025", "2026", "2027", "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+
+QUERY_PHRASE_WEIGHT = 6.0
+QUERY_TERM_WEIGHT = 4.0
+PROGRAM_WEIGHT = 3.0
+TOPIC_WEIGHT = 2.0
+DATE_WEIGHT = 1.0
+RANK_PRIOR_WEIGHT = 1.0  # small bonus for the retriever's own ordering
+
+BASE_TERM_WEIGHTS = {
+    **{t: DATE_WEIGHT for t in DATE_TERMS},
+    **{t: TOPIC_WEIGHT for t in TOPIC_TERMS},
+    **{t: PROGRAM_WEIGHT for t in PROGRAM_TERMS},
+}
+
+QUERY_STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from have how i if in is it me my of on
+or our please so tell that the there this to was we what when where which who will
+with you your about any get know like want need
+el la los las de del y o en un una que por para con es son se su al lo me mi quiero
+""".split())
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def chunk_text(item):
+    """Text of a retrieveContexts item (or local index result)."""
+    return (item.get("chunk") or {}).get("text") or item.get("text") or ""
+
+
+@lru_cache(maxsize=1024)
+def compile_scorer(query_text):
+    """
+    Build (matcher, weights) for a query: the static program/topic/date terms
+    plus the query's own terms, compiled into one alternation so each chunk is
+    scanned once. Cached per query text.
+    """
+    weights = dict(BASE_TERM_WEIGHTS)
+    query_lower = " ".join(_WORD_RE.findall(query_text.lower()))
+    for term in query_lower.split():
+        if term not in QUERY_STOPWORDS and len(term) > 1:
+            weights[term] = max(weights.get(term, 0.0), QUERY_TERM_WEIGHT)
+    if " " in query_lower:
+        weights[query_lower] = QUERY_PHRASE_WEIGHT
+
+    # Longest alternatives first so "start dates" wins over "start date"
+    alternation = "|".join(re.escape(t) for t in sorted(weights, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternation})(?!\w)"), weights
+
+
+def score_chunk(text, matcher, weights):
+    """Sum of weights of the distinct terms found, dampened by term frequency."""
+    counts = {}
+    for m in matcher.finditer(text.lower()):
+        term = m.group(0)
+        counts[term] = counts.get(term, 0) + 1
+    return sum(weights[t] * (1.0 + math.log(c)) for t, c in counts.items())
+
+
+def rerank_chunks(items, query_text, keep):
+    """
+    Score every non-empty chunk and return the best `keep` as
+    (score, item) pairs, best first. Chunks matching no term are dropped.
+    """
+    matcher, weights = compile_scorer(query_text)
+    n = len(items)
+    scored = []
+    for rank, item in enumerate(items):
+        text = chunk_text(item)
+        if not text.strip():
+            continue
+        score = score_chunk(text, matcher, weights)
+        if score <= 0:
+            continue
+        score += RANK_PRIOR_WEIGHT * (n - rank) / n
+        scored.append((score, rank, item))
+
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    return [(round(score, 3), item) for score, _, item in scored[:keep]]
+
+
+# ---------------- Campus Filtering ----------------
+# Campus markers in source file names (…_for_NY.txt, cv_enrollment_packet_NJ.txt)
+# and chunk text. Letters-only boundaries so "_NY." matches but "any" doesn't.
+CAMPUS_PATTERNS = {
+    "new_york": re.compile(r"new[_\s-]?york|(?<![a-z])ny(?![a-z])|manhattan|1501 broadway"),
+    "new_jersey": re.compile(r"new[_\s-]?jersey|(?<![a-z])nj(?![a-z])|wayne|paramus|willowbrook"),
+}
+
+
+def chunk_campus(item):
+    """
+    Campus a chunk belongs to ("new_york" / "new_jersey"), or None when it
+    can't be told. The source file name decides first; otherwise the text
+    must mention one campus clearly more than the other.
+    """
+    source = (item.get("sourceUri") or item.get("sourceDisplayName") or "").lower()
+    source_hits = [campus for campus, pattern in CAMPUS_PATTERNS.items() if pattern.search(source)]
+    if len(source_hits) == 1:
+        return source_hits[0]
+
+    text = chunk_text(item).lower()
+    ny = len(CAMPUS_PATTERNS["new_york"].findall(text))
+    nj = len(CAMPUS_PATTERNS["new_jersey"].findall(text))
+    if ny and ny >= 2 * nj:
+        return "new_york"
+    if nj and nj >= 2 * ny:
+        return "new_jersey"
+    return None
+
+
+def filter_chunks_by_campus(items, locations):
+    """
+    Drop chunks that clearly belong to a campus outside `locations`.
+    Chunks of unknown campus are kept. With no single campus to filter for
+    (program unknown, or programs at both campuses) nothing is dropped.
+    Returns (kept_items, removed_count).
+    """
+    if len(set(locations)) != 1:
+        return items, 0
+    kept = [item for item in items if chunk_campus(item) in (None, locations[0])]
+    return kept, len(items) - len(kept)
+
+
+# ---------------- Near-Duplicate Detection ----------------
+SHINGLE_WORDS = 5
+MINHASH_SIZE = 64        # bottom-k sketch size
+DEDUP_THRESHOLD = 0.7    # estimated Jaccard similarity treated as duplicate
+
+
+def minhash_signature(text, k=MINHASH_SIZE):
+    """
+    Bottom-k MinHash sketch of a chunk's word 5-gram shingles: the k smallest
+    shingle hashes. One hash per shingle keeps it cheap for 2-3 KB chunks.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = {zlib.crc32(s.encode("utf-8")) for s in shingles}
+    return frozenset(heapq.nsmallest(k, hashes))
+
+
+def estimate_similarity(sig_a, sig_b, k=MINHASH_SIZE):
+    """Jaccard similarity estimated from two bottom-k sketches."""
+    if not sig_a or not sig_b:
+        return 0.0
+    union_sketch = heapq.nsmallest(k, sig_a | sig_b)
+    shared = sum(1 for h in union_sketch if h in sig_a and h in sig_b)
+    return shared / len(union_sketch)
+
+
+def dedupe_chunks(ranked, threshold=DEDUP_THRESHOLD):
+    """
+    Keep the first (best-ranked) copy of each near-duplicate group.
+    `ranked` is a list of (score, item); returns (kept, dropped) in the same shape.
+    """
+    kept, dropped, signatures = [], [], []
+    for score, item in ranked:
+        sig = minhash_signature(chunk_text(item))
+        if any(estimate_similarity(sig, other) >= threshold for other in signatures):
+            dropped.append((score, item))
+            continue
+        signatures.append(sig)
+        kept.append((score, item))
+    return kept, dropped
+
+
+# ---------------- Token-Budget Packing ----------------
+MIN_PARTIAL_TOKENS = 120  # don't bother with a trailing fragment smaller than this
+
+
+def pack_snippets(ranked, budget_tokens, max_snippets):
+    """
+    Fill `budget_tokens` with whole snippets in rank order; the first one that
+    doesn't fit is truncated into the remaining space (if worthwhile) and
+    packing stops. Returns (packed, used_tokens) with packed as (text, item).
+    """
+    packed, used = [], 0
+    for _, item in ranked:
+        if len(packed) >= max_snippets:
+            break
+        text = chunk_text(item).strip()
+        tokens = estimate_tokens(text)
+        remaining = budget_tokens - used
+        if tokens <= remaining:
+            packed.append((text, item))
+            used += tokens
+            continue
+        if remaining >= MIN_PARTIAL_TOKENS:
+            text = truncate_to_tokens(text, remaining)
+            packed.append((text, item))
+            used += estimate_tokens(text)
+        break
+    return packed, used
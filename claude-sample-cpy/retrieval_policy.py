@@ -0,0 +1,126 @@
+"""
+Decide whether a turn needs RAG retrieval at all.
+
+Many turns carry no knowledge need: contact details ("anisha b, ani@b.com,
+678-..."), greetings, or one-word confirmations. The classifier combines the
+conversation stage with cheap query features and answers one of:
+
+    retrieve - run retrieval as usual
+    reuse    - reuse the previous turn's snippets for this thread
+    skip     - send no RAG context
+"""
+import re
+import threading
+
+from rag_cache import TTLLRUCache
+
+RETRIEVE = "retrieve"
+REUSE = "reuse"
+SKIP = "skip"
+
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+PHONE_RE = re.compile(r"\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+GREETINGS = frozenset([
+    "hi", "hello", "hey", "hiya", "good morning", "good afternoon", "good evening",
+    "hola", "buenos dias", "buenos días", "buenas tardes", "buenas noches", "buenas",
+])
+CONFIRMATIONS = frozenset([
+    "yes", "yeah", "yep", "yup", "sure", "ok", "okay", "k", "cool", "great", "perfect",
+    "sounds good", "looks good", "that's correct", "thats correct", "correct", "right",
+    "no", "nope", "thanks", "thank you", "got it", "awesome",
+    "si", "sí", "claro", "perfecto", "gracias", "muchas gracias", "está bien", "esta bien",
+    "de acuerdo", "correcto", "vale",
+])
+KNOWLEDGE_TERMS = re.compile(
+    r"\b(program|course|class|schedule|start|date|price|cost|tuition|fee|pay|payment|aid|"
+    r"esthetic|aesthetic|nail|wax|makeup|barber|skin|cosmetolog|manicure|teach|cidesco|"
+    r"campus|location|hours|license|requirement|diploma|ged|visa|housing|"
+    r"programa|curso|clase|horario|precio|costo|pago|uñas|maquillaje|estetica|estética|requisito)",
+    re.IGNORECASE,
+)
+QUESTION_WORDS = re.compile(
+    r"\b(what|when|where|how|which|why|who|can|do|does|is|are|qué|que|cuándo|cuando|dónde|donde|cómo|como|cuál|cual|cuánto|cuanto)\b",
+    re.IGNORECASE,
+)
+
+
+def query_features(user_query):
+    """Cheap lexical features of the current query."""
+    text = (user_query or "").strip()
+    lowered = " ".join(text.lower().replace("!", " ").replace(".", " ").replace(",", " ").split())
+    stripped = EMAIL_RE.sub(" ", PHONE_RE.sub(" ", text))
+    leftover_words = WORD_RE.findall(stripped)
+    return {
+        "has_contact": bool(EMAIL_RE.search(text) or PHONE_RE.search(text)),
+        "leftover_words": len(leftover_words),
+        "is_greeting": lowered in GREETINGS,
+        "is_confirmation": lowered in CONFIRMATIONS,
+        "has_question": "?" in text or "¿" in text or bool(QUESTION_WORDS.match(lowered)),
+        "has_knowledge_terms": bool(KNOWLEDGE_TERMS.search(text)),
+    }
+
+
+def classify_retrieval_need(conversation_stage, user_query):
+    """Return (decision, reason) for this turn."""
+    if conversation_stage == "completion":
+        return SKIP, "completion_stage"
+
+    f = query_features(user_query)
+    if f["has_knowledge_terms"] or f["has_question"]:
+        return RETRIEVE, "knowledge_request"
+    # Name + email + phone and little else
+    if f["has_contact"] and f["leftover_words"] <= 6:
+        return SKIP, "contact_details"
+    if f["is_greeting"]:
+        return SKIP, "greeting"
+    if f["is_confirmation"]:
+        # "yes" to "want the evening schedule?" still needs last turn's facts
+        return REUSE, "confirmation"
+    if conversation_stage in ("post_enrollment", "enrollment_ready") and f["leftover_words"] <= 4:
+        return REUSE, "short_followup"
+    return RETRIEVE, "default"
+
+
+class RetrievalDecisionStats:
+    """Per-stage counters of retrieve/reuse/skip decisions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, conversation_stage, decision):
+        with self._lock:
+            stage_counts = self._counts.setdefault(conversation_stage, {RETRIEVE: 0, REUSE: 0, SKIP: 0})
+            stage_counts[decision] += 1
+            return self._rates(stage_counts)
+
+    @staticmethod
+    def _rates(stage_counts):
+        total = sum(stage_counts.values())
+        return {
+            **stage_counts,
+            "skip_rate": round(stage_counts[SKIP] / total, 3),
+            "reuse_rate": round(stage_counts[REUSE] / total, 3),
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: self._rates(counts) for stage, counts in self._counts.items()}
+
+
+class ThreadSnippetStore:
+    """Last turn's (snippets, sources) per thread, for REUSE decisions."""
+
+    def __init__(self, maxsize=4096, ttl=3600):
+        self._cache = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, thread_id):
+        if not thread_id or thread_id == "unknown":
+            return None
+        return self._cache.get(thread_id)
+
+    def set(self, thread_id, snippets, sources):
+        if thread_id and thread_id != "unknown" and snippets:
+            self._cache.set(thread_id, (snippets, sources))
@@ -0,0 +1,225 @@
+"""
+Columnar index over the course schedules.
+
+The schedules are nested month -> category -> language -> [class] dicts with
+ISO date strings. ScheduleIndex flattens them into start-sorted columns, once
+per data generation (get_schedule_index()):
+
+    start, end      date ordinals (array "l"; end 0 when missing)
+    variant         schedule variant id: (campus, category, language, program name)
+    campus, language  small ids, as in the variant table
+    weekday         start date's weekday, 0 = Monday
+    label           id of the row's own weekday/schedule label
+
+Each variant also keeps its own start-sorted posting list, so "next 2
+Esthetics evening starts in Spanish after D" is a binary search per matching
+variant and a merge of at most a few rows, not a walk over every month.
+
+check() reports inconsistent rows (bad dates, end before start, a weekday
+label that doesn't match the start date, duplicates).
+"""
+import heapq
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date
+from itertools import islice
+
+from data_store import data_store
+
+# Campus -> the schedule datasets for it
+SCHEDULE_DATASETS = {
+    "new_york": ("course_schedule_new_york", "course_schedule_for_new_york_makeup"),
+    "new_jersey": ("course_schedule_for_new_jersey",),
+}
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+Variant = namedtuple("Variant", "campus category language program")
+ScheduleIssue = namedtuple("ScheduleIssue", "campus program start_date problem")
+
+
+def _years(schedule):
+    # A campus schedule is one year dict or a sequence of them
+    return [schedule] if isinstance(schedule, dict) else list(schedule)
+
+
+def iter_schedule_rows(datasets):
+    """(campus, category, language, class dict) for every class, in file order."""
+    for campus, names in SCHEDULE_DATASETS.items():
+        for schedule in (datasets[name] for name in names):
+            for year in _years(schedule):
+                for month in year["months"]:
+                    for category, by_language in month["categories"].items():
+                        for language, classes in by_language.items():
+                            for row in classes:
+                                yield campus, category, language.lower(), row
+
+
+def _ordinal(iso_date):
+    return date.fromisoformat(iso_date).toordinal()
+
+
+def _iso(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+class ScheduleIndex:
+    """Start-sorted columnar schedule rows with per-variant posting lists."""
+
+    def __init__(self, rows):
+        self.issues = []
+        variant_ids, label_ids = {}, {}
+        seen = set()
+
+        parsed = []
+        for campus, category, language, row in rows:
+            if not row.get("start_date"):
+                continue
+            try:
+                start = _ordinal(row["start_date"])
+                end = _ordinal(row["end_date"]) if row.get("end_date") else 0
+            except ValueError as e:
+                self.issues.append(ScheduleIssue(campus, row.get("program"), row.get("start_date"), f"bad date: {e}"))
+                continue
+            variant = Variant(campus, category, language, row["program"])
+            if (variant, start) in seen:
+                self.issues.append(ScheduleIssue(campus, variant.program, row["start_date"], "duplicate row"))
+                continue
+            seen.add((variant, start))
+            variant_id = variant_ids.setdefault(variant, len(variant_ids))
+            label_id = label_ids.setdefault(row.get("weekday") or "", len(label_ids))
+            parsed.append((start, len(parsed), end, variant_id, label_id))
+        self.variants = list(variant_ids)
+        self.labels = list(label_ids)
+        self._program_lower = [v.program.lower() for v in self.variants]
+        self._by_category = {}
+        for i, v in enumerate(self.variants):
+            self._by_category.setdefault(v.category.lower(), []).append(i)
+        self.campuses = sorted({v.campus for v in self.variants})
+        self.languages = sorted({v.language for v in self.variants})
+        campus_ids = {c: i for i, c in enumerate(self.campuses)}
+        language_ids = {lang: i for i, lang in enumerate(self.languages)}
+
+        # Ties on the start date keep file order
+        parsed.sort()
+        self.start = array("l", (p[0] for p in parsed))
+        self.end = array("l", (p[2] for p in parsed))
+        self.variant = array("H", (p[3] for p in parsed))
+        self.label = array("H", (p[4] for p in parsed))
+        self.weekday = array("b", (date.fromordinal(s).weekday() for s in self.start))
+        self.campus = array("B", (campus_ids[self.variants[v].campus] for v in self.variant))
+        self.language = array("B", (language_ids[self.variants[v].language] for v in self.variant))
+
+        postings = {}
+        for position, variant_id in enumerate(self.variant):
+            postings.setdefault(variant_id, array("l")).append(position)
+        self._postings = {
+            variant_id: (array("l", (self.start[p] for p in positions)), positions)
+            for variant_id, positions in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.start)
+
+    def variant_ids(self, predicate=None, category=None, campus=None, language=None, keyword=None):
+        """Ids of variants matching the exact filters (category case-insensitive) and `predicate(variant)`."""
+        candidates = self._by_category.get(category.lower(), []) if category else range(len(self.variants))
+        keyword = keyword.lower() if keyword else None
+        return [
+            i for i in candidates
+            if (campus is None or self.variants[i].campus == campus)
+            and (language is None or self.variants[i].language == language)
+            and (keyword is None or keyword in self._program_lower[i])
+            and (predicate is None or predicate(self.variants[i]))
+        ]
+
+    def next_starts(self, variant_ids, after, count):
+        """Positions of the next `count` rows starting after ISO date `after`, soonest first."""
+        after = _ordinal(after)
+        heads = []
+        for variant_id in variant_ids:
+            starts, positions = self._postings[variant_id]
+            i = bisect_right(starts, after)
+            heads.append(positions[i:i + count])
+        return list(islice(heapq.merge(*heads), count))
+
+    def count_after(self, variant_ids, after):
+        """How many rows of these variants start after `after`."""
+        after = _ordinal(after)
+        return sum(len(starts) - bisect_right(starts, after) for starts, _ in map(self._postings.get, variant_ids))
+
+    def campuses_after(self, variant_ids, after):
+        """Campuses with at least one of these variants starting after `after`."""
+        after = _ordinal(after)
+        return sorted({
+            self.variants[v].campus for v in variant_ids
+            if bisect_right(self._postings[v][0], after) < len(self._postings[v][0])
+        })
+
+    def row(self, position):
+        """The row at `position` as the dict the tools return."""
+        variant = self.variants[self.variant[position]]
+        row = {
+            "program": variant.program,
+            "start_date": _iso(self.start[position]),
+            "end_date": _iso(self.end[position]) if self.end[position] else "",
+        }
+        if self.labels[self.label[position]]:
+            row["weekday"] = self.labels[self.label[position]]
+        row["campus"] = variant.campus
+        return row
+
+    def check(self):
+        """Load-time issues plus end-before-start and weekday-label mismatches."""
+        issues = list(self.issues)
+        for position in range(len(self)):
+            variant = self.variants[self.variant[position]]
+            start = _iso(self.start[position])
+            if self.end[position] and self.end[position] < self.start[position]:
+                issues.append(ScheduleIssue(variant.campus, variant.program, start,
+                                            f"ends {_iso(self.end[position])}, before it starts"))
+            # "Monday" or "Monday and Tuesday": the start must fall on a named day
+            label = self.labels[self.label[position]]
+            label_days = [day for day in WEEKDAYS if day in label]
+            if label_days and WEEKDAYS[self.weekday[position]] not in label_days:
+                issues.append(ScheduleIssue(variant.campus, variant.program, start,
+                                            f"labelled {label} but starts on a {WEEKDAYS[self.weekday[position]]}"))
+        return issues
+
+    def stats(self):
+        return {
+            "rows": len(self),
+            "variants": len(self.variants),
+            "first_start": _iso(self.start[0]) if len(self) else None,
+            "last_start": _iso(self.start[-1]) if len(self) else None,
+            "bytes": sum(col.itemsize * len(col) for col in (
+                self.start, self.end, self.variant, self.label, self.weekday, self.campus, self.language
+            )),
+        }
+
+
+def get_schedule_index(snapshot=None):
+    """The ScheduleIndex for `snapshot` (default: the current data), built once per generation."""
+    snapshot = snapshot or data_store.snapshot()
+    return snapshot.derive("schedule_index", lambda snap: ScheduleIndex(iter_schedule_rows(snap.datasets)))
+
+
+if __name__ == "__main__":
+    index = get_schedule_index()
+    print("index:", index.stats())
+    for issue in index.check():
+        print("issue:", issue)
+
+    after = "2025-09-01"
+    queries = [
+        dict(category="Esthetics", keyword="evening", language="english"),
+        dict(category="Esthetics", language="spanish"),
+        dict(category="Skin Care", keyword="evening", language="spanish"),
+        dict(category="Barbering", campus="new_jersey"),
+    ]
+    for query in queries:
+        variants = index.variant_ids(**query)
+        rows = [index.row(p) for p in index.next_starts(variants, after, 2)]
+        assert [r["start_date"] for r in rows] == sorted(r["start_date"] for r in rows)
+        assert all(r["start_date"] > after for r in rows)
+        print(query, index.count_after(variants, after), rows)
@@ -0,0 +1,252 @@
+"""
+Per-turn schedule selection for PROMPT_DATA_MODE=selected.
+
+Instead of pasting every month of the three schedule dicts (past dates
+included) into the prompt and asking Claude to filter them, this picks the
+rows that matter for the turn:
+
+- the program(s) the conversation is about (current query first, else the
+  most recent user message that names one), their campus, and the class
+  language (asked for explicitly, else the conversation's language);
+- for each, the next start dates of every schedule variant after today;
+- when no program is known yet, a one-line "next start" digest per program
+  (limited to a campus if the user named one).
+
+The upcoming rows and the digest are precomputed once per day and data
+generation; a turn only
+looks them up and joins them into the **UPCOMING START DATES** section of
+the dynamic suffix.
+"""
+import re
+import time
+from collections import namedtuple
+from data_store import data_store
+from schedule_tools import PROGRAM_ALIASES, matches_program, normalize_name, program_term, schedule_rows
+from systemprompt import PROGRAM_LOCATION_MAP, PROMPT_DATA_MODE, get_static_sophia_prompt
+from token_budget import estimate_tokens
+
+SCHEDULE_SELECTION_ENABLED = PROMPT_DATA_MODE == "selected"
+NEXT_STARTS_PER_VARIANT = 2
+CAMPUS_NAMES = {"new_york": "New York", "new_jersey": "New Jersey"}
+
+_CAMPUS_RES = {
+    "new_york": re.compile(r"\b(new york|ny|nyc|manhattan|broadway)\b"),
+    "new_jersey": re.compile(r"\b(new jersey|nj|wayne|jersey)\b"),
+}
+_CLASS_LANGUAGE_RES = {
+    "spanish": re.compile(r"\b(spanish|espanol|en espanol)\b"),
+    "english": re.compile(r"\b(english|ingles|en ingles)\b"),
+}
+
+# categories: [(campus, category)]; rows: how many schedule rows the section lists
+Selection = namedtuple("Selection", "categories campus language rows section")
+
+
+def _categories(snapshot):
+    return snapshot.derive("schedule_categories", lambda snap: sorted(
+        {(row["campus"], row["category"]) for row in schedule_rows(snap)}
+    ))
+
+
+def _program_matcher(snapshot):
+    """(regex over program mentions, {mention: [(campus, category), ...]})."""
+    return snapshot.derive("program_matcher", _build_program_matcher)
+
+
+def _build_program_matcher(snapshot):
+    categories = _categories(snapshot)
+    mentions = {}
+    for mention in set(PROGRAM_LOCATION_MAP) | set(PROGRAM_ALIASES) | {normalize_name(c) for _, c in categories}:
+        mention = normalize_name(mention)
+        term = program_term(mention)
+        matched = [key for key in categories if matches_program(term, (normalize_name(key[1]),))]
+        if matched:
+            mentions[mention] = matched
+    # Longest first so "teacher training" wins over "teacher"
+    pattern = re.compile(r"\b(" + "|".join(re.escape(m) for m in sorted(mentions, key=len, reverse=True)) + r")\b")
+    return pattern, mentions
+
+
+def _user_texts(history, user_query):
+    """Normalized current query, then earlier user messages, newest first."""
+    yield normalize_name(user_query)
+    for msg in reversed(history or []):
+        if msg.get("role") == "user" and msg.get("content"):
+            yield normalize_name(msg["content"][0].get("text", ""))
+
+
+def detect_categories(history, user_query):
+    """Schedule categories named in the query, else in the latest user message naming any."""
+    pattern, mentions = _program_matcher(data_store.snapshot())
+    for text in _user_texts(history, user_query):
+        found = []
+        for match in pattern.finditer(text):
+            found += [key for key in mentions[match.group(1)] if key not in found]
+        if found:
+            return found
+    return []
+
+
+def _first_match(patterns, history, user_query):
+    for text in _user_texts(history, user_query):
+        for name, pattern in patterns.items():
+            if pattern.search(text):
+                return name
+    return None
+
+
+def detect_campus(history, user_query):
+    return _first_match(_CAMPUS_RES, history, user_query)
+
+
+def detect_class_language(history, user_query, conversation_language):
+    """Class language the user asked for, else the language they write in."""
+    return _first_match(_CLASS_LANGUAGE_RES, history, user_query) or conversation_language
+
+
+def _row_line(row):
+    end = f" to {row['end_date']}" if row.get("end_date") else ""
+    weekday = f" ({row['weekday']})" if row.get("weekday") else ""
+    return f"- {row['program']}: {row['start_date']}{end}{weekday}"
+
+
+def _today():
+    return time.strftime("%Y-%m-%d")
+
+
+class ScheduleSelector:
+    """Picks the upcoming schedule rows for a turn from per-day precomputed blocks."""
+
+    def __init__(self, store=data_store, today=_today, per_variant=NEXT_STARTS_PER_VARIANT):
+        self._store = store
+        self._today = today
+        self.per_variant = per_variant
+        self._daily = (None, None)
+
+    def _build_day(self, today, snapshot):
+        # (campus, category, language) -> next rows of each variant, soonest first
+        upcoming = {}
+        per_variant = {}
+        for row in schedule_rows(snapshot):
+            if row["start_date"] <= today:
+                continue
+            variant = (row["campus"], row["category"], row["language"], row["program"])
+            if per_variant.get(variant, 0) >= self.per_variant:
+                continue
+            per_variant[variant] = per_variant.get(variant, 0) + 1
+            upcoming.setdefault(variant[:3], []).append(row)
+
+        blocks = {key: "\n".join(_row_line(row) for row in rows) for key, rows in upcoming.items()}
+
+        digest = {}
+        for campus_filter in (None, *CAMPUS_NAMES):
+            lines = []
+            for campus, category in _categories(snapshot):
+                if campus_filter and campus != campus_filter:
+                    continue
+                starts = [
+                    f"{upcoming[(campus, category, language)][0]['start_date']} {language.capitalize()}"
+                    for language in ("english", "spanish")
+                    if (campus, category, language) in upcoming
+                ]
+                lines.append(f"- {category} ({CAMPUS_NAMES[campus]}): {', '.join(starts) or 'none scheduled'}")
+            digest[campus_filter] = (
+                f"\n\n**UPCOMING START DATES** (next start per program after {today}; "
+                "ask which program they want before giving exact dates):\n" + "\n".join(lines) + "\n"
+            )
+        return {"upcoming": upcoming, "blocks": blocks, "digest": digest}
+
+    def _day(self):
+        key, data = self._daily
+        snapshot = self._store.snapshot()
+        today = self._today()
+        # Rebuilt when the date changes or the schedule files are reloaded
+        if key != (today, snapshot.generation):
+            data = self._build_day(today, snapshot)
+            self._daily = ((today, snapshot.generation), data)
+        return today, data
+
+    def select(self, history, user_query, conversation_language="english"):
+        """Selection (with the prompt section to append) for this turn."""
+        today, data = self._day()
+        categories = detect_categories(history, user_query)
+        campus = detect_campus(history, user_query)
+        language = detect_class_language(history, user_query, conversation_language)
+
+        if not categories:
+            return Selection([], campus, language, 0, data["digest"][campus])
+
+        if campus and any(c == campus for c, _ in categories):
+            categories = [key for key in categories if key[0] == campus]
+
+        pieces = [f"\n\n**UPCOMING START DATES** (after {today}, soonest first):"]
+        rows = 0
+        other = "english" if language == "spanish" else "spanish"
+        for campus_key, category in categories:
+            heading = f"\n{category} - {CAMPUS_NAMES[campus_key]}"
+            if (campus_key, category, language) in data["blocks"]:
+                key, note = (campus_key, category, language), f"{language.capitalize()} classes"
+            elif (campus_key, category, other) in data["blocks"]:
+                key, note = (campus_key, category, other), f"no {language.capitalize()} classes scheduled; {other.capitalize()} classes"
+            else:
+                pieces.append(f"{heading}:\n- No upcoming start dates on file. Request current information; never guess dates.")
+                continue
+            pieces.append(f"{heading} ({note}):\n{data['blocks'][key]}")
+            rows += len(data["upcoming"][key])
+        pieces.append("\n")
+        campuses = {key[0] for key in categories}
+        return Selection(categories, campuses.pop() if len(campuses) == 1 else campus, language, rows, "".join(pieces))
+
+
+def embedded_static_tokens():
+    """Token estimate of the static prompt with every schedule pasted in."""
+    return data_store.snapshot().derive(
+        "embedded_static_tokens", lambda snapshot: estimate_tokens(get_static_sophia_prompt("embedded"))
+    )
+
+
+def selection_metrics(selection, static_prefix, dynamic_suffix):
+    """
+    Log fields for a selection: prompt tokens with the full schedules embedded
+    (before) vs. with only the selected rows (after). dynamic_suffix is the
+    suffix without the selection's section.
+    """
+    suffix_tokens = estimate_tokens(dynamic_suffix)
+    return {
+        "schedule_categories": [category for _, category in selection.categories],
+        "schedule_campus": selection.campus,
+        "schedule_language": selection.language,
+        "schedule_rows": selection.rows,
+        "schedule_tokens": estimate_tokens(selection.section),
+        "prompt_tokens_before_selection": embedded_static_tokens() + suffix_tokens,
+        "prompt_tokens_after_selection": estimate_tokens(static_prefix) + suffix_tokens + estimate_tokens(selection.section),
+    }
+
+
+if __name__ == "__main__":
+    def m(role, text):
+        return {"role": role, "content": [{"text": text}]}
+
+    AFTER = "2025-09-01"
+    selector = ScheduleSelector(today=lambda: AFTER)
+    static = get_static_sophia_prompt("selected")
+    turns = [
+        ([], "hi", "english", []),
+        ([], "what programs do you have in NJ?", "english", []),
+        ([], "when does esthetics start?", "english", ["Esthetics"]),
+        ([m("user", "I'm interested in barbering")], "what are the start dates?", "english", ["Barbering"]),
+        ([], "¿cuándo empieza el curso de maquillaje en español?", "spanish", ["Makeup/Clinic"]),
+        ([], "nails and waxing evening classes", "english", ["Nails", "Waxing"]),
+        ([], "teacher training dates", "english", ["Teaching Training"]),
+    ]
+    for history, query, language, expected in turns:
+        start = time.perf_counter()
+        selection = selector.select(history, query, language)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        assert [category for _, category in selection.categories] == expected, (query, selection.categories)
+        metrics = selection_metrics(selection, static, "")
+        print(f"{query!r:55} {str(expected):30} rows={selection.rows:<3} "
+              f"tokens {metrics['prompt_tokens_before_selection']} -> {metrics['prompt_tokens_after_selection']} "
+              f"{elapsed_us:7.1f} us")
+    print(selector.select([], "skin care en español", "english").section)
+    print(selector.select([], "hello", "english").section)
@@ -0,0 +1,241 @@
+"""
+Schedule and pricing lookups exposed to Claude as tools.
+
+With PROMPT_DATA_MODE=tools the schedule and pricing dicts are left out of the
+system prompt; Claude calls these tools instead and gets back only the rows it
+needs (e.g. the next two start dates for one program). The tool loop runs in
+process: a tool_use reply is answered locally and sent back until Claude
+produces its final text, with each tool call timed.
+"""
+import json
+import os
+import re
+import time
+from datetime import date
+from types import SimpleNamespace
+
+from data_store import data_store
+from schedule_index import get_schedule_index
+from systemprompt import PROMPT_DATA_MODE
+
+TOOLS_ENABLED = PROMPT_DATA_MODE == "tools"
+MAX_TOOL_ROUNDS = int(os.environ.get("MAX_TOOL_ROUNDS", "3"))
+MAX_START_DATES = 6
+
+CAMPUSES = ("new_york", "new_jersey")
+PRICING_DATASETS = {"new_york": "pricing_for_new_york", "new_jersey": "pricing_for_new_jersey"}
+
+# What users say -> the word the schedule/pricing category starts with
+PROGRAM_ALIASES = {
+    "skincare": "skin care", "skin": "skin care", "esthetic": "esthetics", "aesthetic": "esthetics",
+    "aesthetics": "esthetics", "estetica": "esthetics", "nail": "nails", "unas": "nails",
+    "wax": "waxing", "depilacion": "waxing", "make up": "makeup", "maquillaje": "makeup",
+    "barber": "barbering", "hair": "cosmetology", "hairstyling": "cosmetology", "cosmetologia": "cosmetology",
+    "teacher": "teach", "teacher training": "teach", "teaching training": "teach", "manicura": "manicure",
+    "instructor": "teach", "barberia": "barbering", "mani": "manicure", "cosmo": "cosmetology",
+}
+
+SCHEDULE_TOOL = {
+    "name": "get_course_start_dates",
+    "description": (
+        "Upcoming course start dates from Christine Valmy's official schedule. Returns the next "
+        "`count` classes for a program (soonest first), each with program name, start and end "
+        "date, weekday and campus. NY programs: Esthetics, Nails, Waxing, CIDESCO, Makeup. "
+        "NJ programs: Skin Care, Cosmetology, Manicure, Teacher Training, Barbering."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "program": {"type": "string", "description": "Program name, e.g. \"esthetics\", \"barbering\", \"makeup\"."},
+            "campus": {"type": "string", "enum": list(CAMPUSES), "description": "Leave out to use the program's campus."},
+            "language": {"type": "string", "enum": ["english", "spanish"], "description": "Class language. Defaults to english."},
+            "count": {"type": "integer", "minimum": 1, "maximum": MAX_START_DATES, "description": "How many dates. Defaults to 2."},
+            "schedule_keyword": {"type": "string", "description": "Optional filter on the class name, e.g. \"evening\", \"full time\", \"weekend\"."},
+        },
+        "required": ["program"],
+    },
+}
+
+PRICING_TOOL = {
+    "name": "get_program_pricing",
+    "description": (
+        "Official tuition and fee breakdown for a program: hours, total cost and each fee "
+        "(registration, kit/books, tuition...). Only use when the user asked about price."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "program": {"type": "string", "description": "Program name, e.g. \"nails\", \"cosmetology\"."},
+            "campus": {"type": "string", "enum": list(CAMPUSES), "description": "Leave out to search both campuses."},
+        },
+        "required": ["program"],
+    },
+}
+
+TOOLS = [SCHEDULE_TOOL, PRICING_TOOL]
+
+
+def normalize_name(text):
+    """Lowercase, accents stripped, punctuation collapsed to single spaces."""
+    text = (text or "").lower()
+    for accented, plain in (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"), ("ñ", "n")):
+        text = text.replace(accented, plain)
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", text).split())
+
+
+def program_term(program):
+    """The word a user's program name should match, aliases resolved."""
+    term = normalize_name(program)
+    if term in PROGRAM_ALIASES:
+        return PROGRAM_ALIASES[term]
+    for alias, canonical in PROGRAM_ALIASES.items():
+        if re.search(rf"\b{alias}\b", term):
+            return canonical
+    return term
+
+
+def _build_schedule_rows(snapshot):
+    index = get_schedule_index(snapshot)
+    rows = []
+    for position in range(len(index)):
+        variant = index.variants[index.variant[position]]
+        rows.append({"category": variant.category, "language": variant.language, **index.row(position)})
+    return tuple(rows)
+
+
+def schedule_rows(snapshot=None):
+    """Every schedule row as a dict, sorted by start date (from the schedule index)."""
+    return (snapshot or data_store.snapshot()).derive("schedule_rows", _build_schedule_rows)
+
+
+def _variant_names(snapshot):
+    """Normalized (category, program) name of each index variant."""
+    return snapshot.derive("variant_names", lambda snap: [
+        (normalize_name(v.category), normalize_name(v.program)) for v in get_schedule_index(snap).variants
+    ])
+
+
+def matches_program(term, normalized_names):
+    return any(name.startswith(term) or f" {term}" in name for name in normalized_names)
+
+
+def get_course_start_dates(program, campus=None, language="english", count=2, schedule_keyword=None, after=None):
+    """Next `count` start dates after `after` (default today) for a program."""
+    if campus is not None and campus not in CAMPUSES:
+        raise ValueError(f"unknown campus {campus!r}, expected one of {', '.join(CAMPUSES)}")
+    term = program_term(program)
+    after = after or date.today().isoformat()
+    count = max(1, min(int(count), MAX_START_DATES))
+    keyword = normalize_name(schedule_keyword) if schedule_keyword else None
+    snapshot = data_store.snapshot()
+    index, names = get_schedule_index(snapshot), _variant_names(snapshot)
+    variants = [
+        i for i in index.variant_ids(campus=campus, language=language or "english")
+        if matches_program(term, names[i]) and (keyword is None or keyword in names[i][1])
+    ]
+    return {
+        "program": program,
+        "after": after,
+        "campus": campus or index.campuses_after(variants, after),
+        "upcoming_total": index.count_after(variants, after),
+        "dates": [index.row(position) for position in index.next_starts(variants, after, count)],
+    }
+
+
+def get_program_pricing(program, campus=None):
+    """Pricing entries whose category matches the program."""
+    term = program_term(program)
+    datasets = data_store.snapshot().datasets
+    matches = [
+        {"campus": c, **entry}
+        for c in (CAMPUSES if campus is None else (campus,))
+        for entry in datasets[PRICING_DATASETS[c]]["programs"]
+        if matches_program(term, (normalize_name(entry["category"]),))
+    ]
+    return {"program": program, "matches": matches}
+
+
+TOOL_FUNCTIONS = {
+    "get_course_start_dates": get_course_start_dates,
+    "get_program_pricing": get_program_pricing,
+}
+
+
+def run_tool(name, tool_input):
+    """Run one tool; returns (json_text, is_error)."""
+    fn = TOOL_FUNCTIONS.get(name)
+    if fn is None:
+        return json.dumps({"error": f"unknown tool {name}"}), True
+    try:
+        return json.dumps(fn(**tool_input), ensure_ascii=False), False
+    except (KeyError, TypeError, ValueError) as e:
+        return json.dumps({"error": f"{type(e).__name__}: {e}"}), True
+
+
+def tool_result_blocks(content, metrics):
+    """tool_result blocks answering every tool_use block in `content`."""
+    from token_budget import estimate_tokens
+
+    results = []
+    for block in content:
+        if getattr(block, "type", None) != "tool_use":
+            continue
+        start = time.perf_counter()
+        text, is_error = run_tool(block.name, block.input or {})
+        metrics.setdefault("tool_calls", []).append({
+            "name": block.name,
+            "input": block.input,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+            "result_tokens": estimate_tokens(text),
+            "error": is_error,
+        })
+        results.append({"type": "tool_result", "tool_use_id": block.id, "content": text, "is_error": is_error})
+    return results
+
+
+def continue_with_tool_results(messages, response, metrics):
+    """Messages for the next round: Claude's tool_use turn plus our results."""
+    return messages + [
+        {"role": "assistant", "content": response.content},
+        {"role": "user", "content": tool_result_blocks(response.content, metrics)},
+    ]
+
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+
+def add_usage(total, usage):
+    """Sum token usage across tool rounds (total may be None)."""
+    total = total or SimpleNamespace(**{field: 0 for field in USAGE_FIELDS})
+    for field in USAGE_FIELDS:
+        setattr(total, field, getattr(total, field) + (getattr(usage, field, None) or 0))
+    return total
+
+
+def tool_round_params(round_number):
+    """
+    Tool parameters for this round. The last round keeps the tool
+    definitions (same cached prefix) but forbids calling them, so Claude
+    answers in text instead of ending the turn on a tool_use with no reply.
+    """
+    if round_number >= MAX_TOOL_ROUNDS:
+        return {"tools": TOOLS, "tool_choice": {"type": "none"}}
+    return {"tools": TOOLS}
+
+
+def create_with_tools(create, messages, metrics, **kwargs):
+    """
+    Call `create(messages=..., tools=TOOLS, **kwargs)` and answer tool_use
+    replies in process, up to MAX_TOOL_ROUNDS rounds, then require a text
+    answer. Returns (final_response, summed_usage); tool timings go to
+    metrics["tool_calls"].
+    """
+    usage = None
+    for round_number in range(MAX_TOOL_ROUNDS + 1):
+        resp = create(messages=messages, **tool_round_params(round_number), **kwargs)
+        usage = add_usage(usage, resp.usage)
+        if resp.stop_reason != "tool_use" or round_number == MAX_TOOL_ROUNDS:
+            break
+        messages = continue_with_tool_results(messages, resp, metrics)
+    metrics["tool_rounds"] = round_number
+    return resp, usage
@@ -0,0 +1,189 @@
+"""
+Scripted replies that need no model call.
+
+Some stages have their reply fixed word for word by the script in
+systemprompt.py. In those stages Claude only copies a template, so the reply
+is built here in microseconds instead:
+
+    completion                - the closing message
+    enrollment_ready          - the contact-details confirmation summary
+    enrollment_collection     - the "maximum attempts reached" hand-off
+
+A script only fires when the user's turn can't change the reply: no question,
+no knowledge request, no new contact details. The closing message and the
+confirmation summary need more: a plain acknowledgement, since a question can
+follow enrollment and any other text may correct a name. Anything else goes
+to Claude as before.
+"""
+import re
+import threading
+
+from retrieval_policy import query_features
+from systemprompt import (
+    COMPLETION_MESSAGES,
+    ENROLLMENT_CONFIRMATION_TEMPLATES,
+    ENROLLMENT_MAX_ATTEMPTS_MESSAGES,
+    MAX_ENROLLMENT_ATTEMPTS,
+    check_location_confirmed,
+    count_enrollment_attempts,
+    detect_language,
+    extract_contact_info,
+    get_missing_enrollment_info,
+)
+
+# Scripts that end the conversation (the widget closes the chat)
+CLOSING_SCRIPTS = frozenset(["completion"])
+
+COMPLETION_SIGNALS = frozenset([
+    "thanks", "thank you", "nope", "no", "sounds good", "that's correct",
+    "im good", "i'm good", "that's all", "nothing else", "looks good",
+    "perfect", "ok", "okay", "cool", "great", "awesome", "yep", "yes that's correct"
+])
+
+# Turns that confirm the details on file without changing them ("no" doesn't)
+ACKNOWLEDGEMENTS = (COMPLETION_SIGNALS - {"no", "nope", "nothing else"}) | frozenset([
+    "yes", "yeah", "yep", "correct", "that's right", "right", "all good", "confirmed",
+    "si", "sí", "correcto", "esta bien", "está bien", "vale", "gracias", "listo",
+])
+# Turns that end a conversation once enrollment is done
+CLOSING_PHRASES = COMPLETION_SIGNALS | ACKNOWLEDGEMENTS | frozenset([
+    "nada", "nada más", "nada mas", "perfecto", "eso es todo", "no gracias",
+])
+_ACK_PUNCTUATION_RE = re.compile(r"[^\w\s']+")
+
+
+def ultra_fast_completion_check(user_query, history):
+    """
+    Ultra-fast completion detection with minimal processing
+    """
+    user_query_lower = user_query.lower().strip()
+
+    # Remove topic prefix if present
+    if user_query_lower.startswith("[topic:"):
+        user_query_lower = user_query_lower.split("]", 1)[1].strip() if "]" in user_query_lower else user_query_lower
+
+    # Fast exact match check
+    if user_query_lower in COMPLETION_SIGNALS:
+        # Quick scan for contact info in last 8 messages (much faster than full history)
+        recent_messages = history[-8:] if len(history) > 8 else history
+        recent_text = " ".join([
+            msg.get("content", [{}])[0].get("text", "")[:200]  # Only check first 200 chars
+            for msg in recent_messages if msg.get("content")
+        ])
+
+        # Fast contact detection
+        has_email = "@" in recent_text
+        has_digits = sum(1 for c in recent_text if c.isdigit()) >= 7
+        has_enrollment = "enrollment" in recent_text.lower()
+
+        return has_email and has_digits and has_enrollment
+
+    return False
+
+
+def _language(user_query, history):
+    return "spanish" if detect_language(user_query, history) == "spanish" else "english"
+
+
+def _is_passive_turn(user_query):
+    """True when the turn asks nothing and adds no contact details."""
+    f = query_features(user_query)
+    return not (f["has_question"] or f["has_knowledge_terms"] or f["has_contact"])
+
+
+def _is_acknowledgement(user_query, phrases=ACKNOWLEDGEMENTS):
+    """True when the turn is only an acknowledgement like "ok" or "yes, correct"."""
+    words = _ACK_PUNCTUATION_RE.sub(" ", user_query.lower()).split()
+    text = " ".join(words)
+    return bool(words) and (text in phrases or all(word in phrases for word in words))
+
+
+def scripted_reply(conversation_stage, history, user_query):
+    """
+    Return (script_name, reply_text) when this turn's reply is fully
+    determined by the script, else None.
+    """
+    # The completion stage is matched on substrings ("no" in "know"), so a
+    # question asked after enrollment still goes to the model
+    if (conversation_stage == "completion" and _is_acknowledgement(user_query, CLOSING_PHRASES)) or \
+            ultra_fast_completion_check(user_query, history):
+        return "completion", COMPLETION_MESSAGES[_language(user_query, history)]
+
+    # Only a plain acknowledgement: "Bhatt" or "actually my last name is Bhatt"
+    # corrects the details, which the history alone doesn't show yet
+    if conversation_stage == "enrollment_ready" and _is_acknowledgement(user_query):
+        first_name, last_name, email, phone = extract_contact_info(history)
+        if first_name and last_name and email and phone:
+            template = ENROLLMENT_CONFIRMATION_TEMPLATES[_language(user_query, history)]
+            return "enrollment_confirmation", template.format(
+                first_name=first_name, last_name=last_name, email=email, phone=phone
+            )
+
+    if conversation_stage == "enrollment_collection" and _is_passive_turn(user_query):
+        if count_enrollment_attempts(history) >= MAX_ENROLLMENT_ATTEMPTS:
+            contact = extract_contact_info(history)
+            if get_missing_enrollment_info(*contact, check_location_confirmed(history)):
+                return "enrollment_max_attempts", ENROLLMENT_MAX_ATTEMPTS_MESSAGES[_language(user_query, history)]
+
+    return None
+
+
+class ScriptedReplyStats:
+    """Per-stage counts of scripted vs. model replies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, conversation_stage, scripted):
+        with self._lock:
+            stage_counts = self._counts.setdefault(conversation_stage, {"scripted": 0, "model": 0})
+            stage_counts["scripted" if scripted else "model"] += 1
+            return self._rates(stage_counts)
+
+    @staticmethod
+    def _rates(stage_counts):
+        total = stage_counts["scripted"] + stage_counts["model"]
+        return {**stage_counts, "bypass_rate": round(stage_counts["scripted"] / total, 3)}
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: self._rates(counts) for stage, counts in self._counts.items()}
+
+
+if __name__ == "__main__":
+    import time
+
+    def m(role, text):
+        return {"role": role, "content": [{"text": text}]}
+
+    interested = [m("user", "I'm interested in esthetics")]
+    contact = [m("user", "anisha b, ani@b.com, 678-9386850")]
+    shared = [m("assistant", "Our enrollment advisor will contact you soon.")]
+    asked = [m("assistant", "I need to collect some details")] * MAX_ENROLLMENT_ATTEMPTS
+    turns = [
+        ("completion", interested + contact + shared, "nope"),
+        ("completion", interested + contact + shared, "nada, perfecto"),
+        ("enrollment_ready", interested + contact, "ok"),
+        ("enrollment_ready", interested + contact, "what are the start dates?"),
+        ("enrollment_collection", interested + asked, "maybe later"),
+        ("enrollment_collection", interested, "maybe later"),
+        ("active", interested, "how much is the nails program?"),
+    ]
+    # A correction of the details on file goes to the model
+    for correction in ("actually my last name is Bhatt", "Bhatt", "It's Anisha Bhatt"):
+        assert scripted_reply("enrollment_ready", interested + contact, correction) is None, correction
+    assert scripted_reply("enrollment_ready", interested + contact, "no") is None
+    for acknowledgement in ("ok", "Yes, correct!", "sí, gracias"):
+        assert scripted_reply("enrollment_ready", interested + contact, acknowledgement), acknowledgement
+    # Questions after enrollment don't close the conversation
+    for question in ("Do you know when the nails classes start?", "Can I bring a friend? Is that not allowed?"):
+        assert scripted_reply("completion", interested + contact, question) is None, question
+    assert scripted_reply("completion", interested + contact, "nope")[0] == "completion"
+
+    for stage, history, query in turns:
+        start = time.perf_counter()
+        result = scripted_reply(stage, history, query)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        name = result[0] if result else "-> model"
+        print(f"{stage:22} {query!r:30} {name:26} {elapsed_us:8.1f} us")
@@ -0,0 +1,64 @@
+"""
+Helpers for the opt-in streaming mode of the `app` endpoint.
+
+Claude's text arrives in small deltas, but md_to_plaintext needs whole
+markdown blocks (a list or a paragraph split mid-way renders wrong). The
+`PlaintextBlockStream` buffers deltas and converts each block as soon as a
+blank line closes it, outside fenced code, so the widget gets plain text
+paragraph by paragraph. Events are sent as server-sent events.
+"""
+import json
+
+FENCE = "```"
+
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class PlaintextBlockStream:
+    """Incremental markdown -> plaintext conversion, one block at a time."""
+
+    def __init__(self, convert):
+        self._convert = convert
+        self._buffer = ""
+        self.parts = []  # converted blocks, in order
+
+    def _split_point(self):
+        """Index just past the last blank line that is outside a code fence."""
+        split, in_fence, pos = -1, False, 0
+        for line in self._buffer.splitlines(keepends=True):
+            pos += len(line)
+            if line.lstrip().startswith(FENCE):
+                in_fence = not in_fence
+            elif not in_fence and not line.strip():
+                split = pos
+        return split
+
+    def _emit(self, markdown_text):
+        text = self._convert(markdown_text.strip())
+        if text:
+            self.parts.append(text)
+        return text
+
+    def feed(self, delta):
+        """Add a text delta; return plaintext for any blocks it completed ("" if none)."""
+        self._buffer += delta
+        if "\n" not in delta:
+            return ""
+        split = self._split_point()
+        if split <= 0:
+            return ""
+        ready, self._buffer = self._buffer[:split], self._buffer[split:]
+        return self._emit(ready) if ready.strip() else ""
+
+    def flush(self):
+        """Convert whatever is left once the stream ends."""
+        ready, self._buffer = self._buffer, ""
+        return self._emit(ready) if ready.strip() else ""
+
+    @property
+    def text(self):
+        """Full plaintext answer, as md_to_plaintext would join the blocks."""
+        return "\n\n".join(self.parts)
@@ -0,0 +1,108 @@
+"""
+RAG-shaped context built from the in-repo schedule and pricing data.
+
+Used when the managed RAG dependency is unavailable (circuit open): the
+`course_schedule_*` and `pricing_for_*` datasets (data_store.py) are
+rendered into short retrieveContexts-style chunks so the normal campus
+filtering, reranking and packing still apply.
+"""
+import time
+
+from data_store import data_store
+from systemprompt import detect_conversation_locations
+
+CAMPUS_NAMES = {"new_york": "New York", "new_jersey": "New Jersey"}
+
+# (campus, dataset name) for every schedule dataset
+SCHEDULE_SOURCES = [
+    ("new_york", "course_schedule_new_york"),
+    ("new_york", "course_schedule_for_new_york_makeup"),
+    ("new_jersey", "course_schedule_for_new_jersey"),
+]
+PRICING_SOURCES = [
+    ("new_york", "pricing_for_new_york"),
+    ("new_jersey", "pricing_for_new_jersey"),
+]
+
+FALLBACK_DATES_PER_PROGRAM = 4
+
+
+def _year_blocks(data):
+    """Schedule datasets are a single year block or a list/tuple of them."""
+    return [data] if isinstance(data, dict) else list(data)
+
+
+def iter_schedule_entries():
+    """
+    Flatten every schedule dataset into entry dicts with campus, dataset,
+    category and language alongside the original entry fields.
+    """
+    datasets = data_store.snapshot().datasets
+    for campus, dataset in SCHEDULE_SOURCES:
+        for block in _year_blocks(datasets[dataset]):
+            for month in block.get("months", []):
+                for category, languages in month.get("categories", {}).items():
+                    for language, entries in languages.items():
+                        for entry in entries:
+                            yield {
+                                "campus": campus,
+                                "dataset": dataset,
+                                "category": category,
+                                "language": language,
+                                **entry,
+                            }
+
+
+def _schedule_contexts(campuses, today):
+    upcoming = {}
+    for entry in iter_schedule_entries():
+        if entry["campus"] in campuses and entry.get("start_date", "") > today:
+            key = (entry["campus"], entry["dataset"], entry["category"], entry["language"])
+            upcoming.setdefault(key, []).append(entry)
+
+    contexts = []
+    for (campus, dataset, category, language), entries in sorted(upcoming.items()):
+        entries.sort(key=lambda e: e["start_date"])
+        lines = [
+            f"- {e['program']}: from {e['start_date']} to {e['end_date']} ({e.get('weekday', '')})"
+            for e in entries[:FALLBACK_DATES_PER_PROGRAM]
+        ]
+        contexts.append({
+            "sourceUri": f"structured://{dataset}",
+            "text": (
+                f"{CAMPUS_NAMES[campus]} campus {category} course schedule ({language}), "
+                f"upcoming start dates:\n" + "\n".join(lines)
+            ),
+        })
+    return contexts
+
+
+def _pricing_contexts(campuses):
+    contexts = []
+    datasets = data_store.snapshot().datasets
+    for campus, dataset in PRICING_SOURCES:
+        if campus not in campuses:
+            continue
+        for program in datasets[dataset].get("programs", []):
+            breakdown = ", ".join(
+                f"{name.replace('_', ' ')} {' / '.join(value) if isinstance(value, list) else value}"
+                for name, value in program.get("breakdown", {}).items()
+            )
+            contexts.append({
+                "sourceUri": f"structured://{dataset}",
+                "text": (
+                    f"{CAMPUS_NAMES[campus]} campus pricing: {program['category']}, "
+                    f"{program.get('hours')} hours, total cost {program.get('total_cost')} ({breakdown})"
+                ),
+            })
+    return contexts
+
+
+def build_structured_contexts(query_text, history=None, today=None):
+    """
+    Build retrieveContexts-shaped chunks of upcoming schedules and pricing
+    for the campus the conversation is about (both campuses if unknown).
+    """
+    today = today or time.strftime("%Y-%m-%d")
+    campuses = set(detect_conversation_locations(query_text, history)) or set(CAMPUS_NAMES)
+    return _schedule_contexts(campuses, today) + _pricing_contexts(campuses)
@@ -0,0 +1,168 @@
+"""
+Per-thread rolling conversation summaries.
+
+Once a thread outgrows its history token budget, the messages that age out
+of the window are folded into a stored summary instead of being re-summarized on
+every request. Each record remembers the last message it covers (by a
+fingerprint of the last two messages, since the widget only sends a sliding
+window of history), so the request path can tell which aged-out messages are
+already summarized and which are still pending. Updates run in the background
+after the response; the request path only reads.
+
+Backends: an in-memory LRU (per instance) and a local SQLite file, chosen with
+SUMMARY_STORE=memory|sqlite.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from rag_cache import TTLLRUCache
+
+# ---------------- Store Config ----------------
+SUMMARY_STORE = os.environ.get("SUMMARY_STORE", "memory")
+SUMMARY_STORE_SIZE = int(os.environ.get("SUMMARY_STORE_SIZE", "4096"))
+SUMMARY_STORE_TTL = float(os.environ.get("SUMMARY_STORE_TTL", str(7 * 24 * 3600)))
+SUMMARY_DB_PATH = os.environ.get("SUMMARY_DB_PATH", "/tmp/conversation_summaries.db")
+
+
+@dataclass
+class SummaryRecord:
+    summary: str
+    last_hash: str      # fingerprint of the last two covered messages
+    covered: int        # messages folded in so far (for metrics)
+    updated_at: float
+
+
+def _message_text(message):
+    content = message.get("content") or [{}]
+    return content[0].get("text", "") if isinstance(content[0], dict) else ""
+
+
+def messages_fingerprint(messages):
+    """Fingerprint of the last two messages of a list ("" for an empty list)."""
+    if not messages:
+        return ""
+    h = hashlib.sha1()
+    for m in messages[-2:]:
+        h.update((m.get("role") or "").encode("utf-8"))
+        h.update(b"\x00")
+        h.update(_message_text(m).encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+def pending_messages(older, record, recent=()):
+    """
+    Aged-out messages not yet covered by `record`: everything in `older` after
+    the last covered message. If the summary already reaches into `recent`
+    (the history budget let more messages in this turn), nothing is pending.
+    With no record, or when the covered boundary has slid out of the history
+    window, all of `older` is pending.
+    """
+    if record is None:
+        return older
+    window = list(older) + list(recent)
+    for end in range(len(window), 0, -1):
+        if messages_fingerprint(window[:end]) == record.last_hash:
+            return older[end:] if end < len(older) else []
+    return older
+
+
+class MemorySummaryStore:
+    """Per-instance LRU of SummaryRecords."""
+
+    def __init__(self, maxsize=SUMMARY_STORE_SIZE, ttl=SUMMARY_STORE_TTL):
+        self._cache = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, thread_id):
+        return self._cache.get(thread_id)
+
+    def set(self, thread_id, record):
+        self._cache.set(thread_id, record)
+
+
+class SqliteSummaryStore:
+    """SummaryRecords in a local SQLite file; survives instance restarts on a persistent disk."""
+
+    def __init__(self, path=SUMMARY_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " thread_id TEXT PRIMARY KEY, summary TEXT NOT NULL, last_hash TEXT NOT NULL,"
+                " covered INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def get(self, thread_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, last_hash, covered, updated_at FROM summaries WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchone()
+        return SummaryRecord(*row) if row else None
+
+    def set(self, thread_id, record):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (thread_id, summary, last_hash, covered, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (thread_id, record.summary, record.last_hash, record.covered, record.updated_at),
+            )
+
+
+def get_summary_store(kind=SUMMARY_STORE):
+    if kind == "sqlite":
+        return SqliteSummaryStore()
+    return MemorySummaryStore()
+
+
+class RollingSummarizer:
+    """
+    Reads and incrementally updates thread summaries in `store`.
+    `summarize(previous_summary, new_messages)` returns the updated summary
+    text; it is only called from `update`, which runs off the request path.
+    """
+
+    def __init__(self, store, summarize):
+        self.store = store
+        self.summarize = summarize
+        self._lock = threading.Lock()
+        self._in_flight = set()
+
+    def read(self, thread_id, older, recent=()):
+        """(summary or None, pending aged-out messages) for the request path."""
+        record = self.store.get(thread_id) if thread_id and thread_id != "unknown" else None
+        return (record.summary if record else None), pending_messages(older, record, recent)
+
+    def update(self, thread_id, older, recent=()):
+        """
+        Fold the pending aged-out messages into the thread's summary. Returns
+        the number of messages folded in (0 if nothing to do or another update
+        for the thread is already running).
+        """
+        if not thread_id or thread_id == "unknown" or not older:
+            return 0
+        with self._lock:
+            if thread_id in self._in_flight:
+                return 0
+            self._in_flight.add(thread_id)
+        try:
+            record = self.store.get(thread_id)
+            pending = pending_messages(older, record, recent)
+            if not pending:
+                return 0
+            summary = self.summarize(record.summary if record else None, pending)
+            self.store.set(thread_id, SummaryRecord(
+                summary=summary,
+                last_hash=messages_fingerprint(older),
+                covered=(record.covered if record else 0) + len(pending),
+                updated_at=time.time(),
+            ))
+            return len(pending)
+        finally:
+            with self._lock:
+                self._in_flight.discard(thread_id)
@@ -0,0 +1,68 @@
+"""
+Fast local token estimates for budgeting prompt content.
+
+Claude's tokenizer isn't available offline, so budgets use a character-ratio
+approximation. CHARS_PER_TOKEN can be tuned from the estimated vs. actual
+input tokens that main.py logs.
+"""
+import math
+import os
+
+CHARS_PER_TOKEN = float(os.environ.get("CHARS_PER_TOKEN", "3.6"))
+MESSAGE_OVERHEAD_TOKENS = 4  # role and turn delimiters per message
+
+
+def estimate_tokens(text):
+    """Approximate Claude token count of a string."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cut text to roughly max_tokens, backing off to the last sentence or
+    whitespace boundary so snippets don't end mid-word.
+    """
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < max_chars // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() if boundary > 0 else cut
+
+
+def message_tokens(message):
+    """Approximate tokens of one chat message ({"role", "content": [blocks]})."""
+    return MESSAGE_OVERHEAD_TOKENS + sum(
+        estimate_tokens(block.get("text", "")) for block in message.get("content") or [] if isinstance(block, dict)
+    )
+
+
+def pack_history(messages, budget_tokens, max_messages=None):
+    """
+    Split history into (older, recent, used_tokens): `recent` is the longest
+    run of newest messages that fits `budget_tokens` (and `max_messages`),
+    `older` is everything before it. The newest message is always kept,
+    truncated to the budget if it alone is too long.
+    """
+    used, start = 0, len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        if max_messages is not None and len(messages) - i > max_messages:
+            break
+        tokens = message_tokens(messages[i])
+        if used + tokens > budget_tokens:
+            break
+        used += tokens
+        start = i
+
+    recent = list(messages[start:])
+    if not recent and messages:
+        newest = messages[-1]
+        text = " ".join(b.get("text", "") for b in newest.get("content") or [] if isinstance(b, dict))
+        truncated = {"role": newest.get("role"), "content": [{"type": "text", "text": truncate_to_tokens(text, max(budget_tokens - MESSAGE_OVERHEAD_TOKENS, 1))}]}
+        recent, start = [truncated], len(messages) - 1
+        used = message_tokens(truncated)
+    return list(messages[:start]), recent, used